@@ -0,0 +1,122 @@
+"""
+Reg Replace.
+
+An on-disk cache of sequence results, so that batch runs can skip files
+they have already processed.
+
+Entries map a key (built from the file content, the rules, and the plugin
+sources) to the hash of the content the rules produced.  The cache is a
+SQLite database, so any number of threads and processes can share it, and
+it is kept to about `max_entries` by evicting the least recently used entries.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 100000
+# The size is checked every time this fraction of the limit has been stored,
+# and entries above the limit are then evicted down to 90% of it.
+CHECK_FRACTION = 0.01
+EVICT_FRACTION = 0.1
+BUSY_TIMEOUT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    used REAL NOT NULL
+)
+'''
+
+
+def digest(data):
+    """Hash bytes, or anything JSON can serialize."""
+
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+class ResultCache(object):
+    """Least recently used cache of result hashes in a SQLite database."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        """Open (or create) the database."""
+
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_entries = max(int(max_entries), 1)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.check_every = max(int(self.max_entries * CHECK_FRACTION), 1)
+        folder = os.path.dirname(self.path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with self.connect() as conn:
+            conn.execute(SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+
+    def connect(self):
+        """Get the connection of the current thread (connections cannot be shared between threads)."""
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Get the result hash stored for a key, or `None`."""
+
+        conn = self.connect()
+        row = conn.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, result):
+        """Store the result hash of a key."""
+
+        conn = self.connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (key, result, time.time()))
+        with self.lock:
+            self.stored += 1
+            check = self.stored % self.check_every == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries if the cache is over its limit."""
+
+        conn = self.connect()
+        with conn:
+            count = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries + int(self.max_entries * EVICT_FRACTION)
+                conn.execute(
+                    'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)', (excess,)
+                )
+
+    def __len__(self):
+        """Get the number of entries."""
+
+        return self.connect().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        """Close the connection of the current thread."""
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
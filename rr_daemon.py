@@ -0,0 +1,682 @@
+"""
+Reg Replace.
+
+Apply RegReplace sequences outside of Sublime Text.
+
+`serve` keeps the settings, compiled rules, and plugins loaded and answers
+requests on a Unix socket from a pool of worker processes.  `apply` is a thin
+client for it, and `run` does the same work in-process without a server.
+
+    python rr_daemon.py serve [--socket PATH] [--workers N] [--packages DIR] [--settings FILE]
+    python rr_daemon.py apply [-s SEQUENCE ...] [--multi-pass] [--check] [--git-diff [--staged]] [FILE ...]
+    python rr_daemon.py run [-s SEQUENCE ...] [--packages DIR] [--settings FILE] [FILE ...]
+    python rr_daemon.py find -s RULE [-s RULE ...] [--index DB] [-l] [FOLDER ...]
+    python rr_daemon.py ping|reload|stop
+
+Without `-s`, each file gets the `on_save_sequences` that match it.  With
+`--git-diff`, only the lines changed in the work tree (or index) are changed.
+
+Requests and responses are JSON objects, one per line.  A request is
+`{"sequence": [...], "text": "..."}` or `{"sequence": [...], "file": PATH, "write": true}`,
+with optional `multi_pass`, `route` (instead of `sequence`), `lines` (a list
+of [first line, line count]), and `id` (echoed back), or `{"command": "ping"}`,
+`{"command": "reload"}`, or `{"command": "stop"}`.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+DEFAULT_WORKERS = 4
+DEFAULT_CACHE_SIZE = 100000
+ACCEPT_TIMEOUT = 0.2
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+RE_NEWLINE = re.compile(r'\r\n?|\n')
+
+plugin_digests = {}
+# The configuration a worker process last loaded, and its result cache (see `worker_apply`)
+worker_state = {'config': None, 'cache': None}
+
+# Part of the result cache keys; change it when the engine changes results
+CACHE_VERSION = 1
+
+EXIT_OK = 0
+EXIT_CHANGED = 1
+EXIT_ERROR = 2
+
+
+def default_socket():
+    """Get the default socket path for the current user."""
+
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, 'regreplace-%d.sock' % os.getuid())
+
+
+def register_package():
+    """Register this folder as the `RegReplace` package."""
+
+    if 'RegReplace' not in sys.modules:
+        package = types.ModuleType('RegReplace')
+        package.__path__ = [PACKAGE_PATH]
+        sys.modules['RegReplace'] = package
+
+
+def load_headless():
+    """Get the headless `sublime` module."""
+
+    register_package()
+    from RegReplace import rr_headless
+    return rr_headless
+
+
+def split_newlines(text):
+    """Convert all line endings to newlines, as Sublime does, and get the line ending the text used."""
+
+    m = RE_NEWLINE.search(text)
+    newline = m.group(0) if m else '\n'
+    return (text.replace('\r\n', '\n').replace('\r', '\n') if '\r' in text else text), newline
+
+
+def join_newlines(text, newline):
+    """Restore the line endings of the text."""
+
+    return text if newline == '\n' else text.replace('\n', newline)
+
+
+def read_file(path):
+    """Read a file."""
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_text(path):
+    """Read a UTF-8 text file and normalize its line endings, or get `None` if it is not text."""
+
+    try:
+        data = read_file(path)
+    except (IOError, OSError):
+        return None
+    if b'\0' in data:
+        return None
+    try:
+        return split_newlines(data.decode('utf-8'))[0]
+    except UnicodeDecodeError:
+        return None
+
+
+def walk_files(root):
+    """Get the files under a folder, as the index sees them."""
+
+    from RegReplace.rr_trigram import SKIP_DIRS
+
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            yield os.path.join(folder, name)
+
+
+def write_file(path, text):
+    """Replace the file with the text, keeping its permissions."""
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=folder, prefix='.rr-')
+    try:
+        with open(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        shutil.copymode(path, temp)
+        os.replace(temp, path)
+    except Exception:
+        os.remove(temp)
+        raise
+
+
+def plugin_digest(module_name):
+    """Get the hash of a plugin's source (remembered until the plugins are reloaded)."""
+
+    from RegReplace.rr_cache import digest
+    from RegReplace.rr_plugin import Plugin
+
+    if module_name not in plugin_digests:
+        try:
+            plugin_digests[module_name] = digest(Plugin.source(module_name).encode('utf-8'))
+        except Exception:
+            plugin_digests[module_name] = None
+    return plugin_digests[module_name]
+
+
+def rules_digest(passes, lines):
+    """Get the hash of everything besides the text that decides the result of a request."""
+
+    from RegReplace import rr_headless
+    from RegReplace.rr_cache import digest
+
+    settings = rr_headless.load_settings(rr_headless.SETTINGS_FILE)
+    rules = settings.get('replacements', {})
+    spec = []
+    plugins = {}
+    for sequence, multi_pass in passes:
+        spec.append([[rules.get(name) for name in sequence], multi_pass])
+        for name in sequence:
+            plugin = rules.get(name, {}).get('plugin')
+            if plugin is not None:
+                plugins[plugin] = plugin_digest(plugin)
+    return digest([
+        CACHE_VERSION, spec, lines, plugins,
+        settings.get('extended_back_references', False), settings.get('multi_pass_max_sweeps')
+    ])
+
+
+def apply_request(request, cache=None):
+    """
+    Apply the sequence of a request to its text or file and build the response.
+
+    Without a sequence, the file is routed by `on_save_sequences` (`route`).
+    With `lines`, only those (first line, line count) ranges are changed.
+    With `check`, only whether the text would change is reported.  If a
+    cache is given, requests it knows the outcome of are answered from it,
+    without decoding or scanning the text.  A changed result is stored as
+    one that needs no changes, as a sequence is expected to leave its own
+    output alone (like a sequence run on every save).
+    """
+
+    from RegReplace import rr_headless
+    from RegReplace.rr_cache import digest
+    from RegReplace.rr_git import line_regions
+
+    start = time.perf_counter()
+    path = request.get('file')
+    if path is not None:
+        data = read_file(path)
+    elif request.get('text') is not None:
+        data = request['text'].encode('utf-8')
+    else:
+        raise ValueError('no text or file')
+    file_name = path or request.get('file_name')
+    check = request.get('check', False)
+
+    if request.get('route', False):
+        if file_name is None:
+            raise ValueError('routing needs a file name')
+        passes = rr_headless.on_save_passes(file_name)
+    else:
+        sequence = request.get('sequence')
+        if isinstance(sequence, str):
+            sequence = [sequence]
+        if not isinstance(sequence, list) or not sequence:
+            raise ValueError('no sequence')
+        passes = [(sequence, bool(request.get('multi_pass', False)))]
+    lines = request.get('lines')
+
+    if cache is not None:
+        content = digest(data)
+        key = digest([content, rules_digest(passes, lines)])
+        known = cache.get(key)
+        # A file that stays the same can be skipped; one that changes still has to be processed to be written
+        if known is not None and (known == content or check):
+            response = {'ok': True, 'changed': known != content, 'results': None, 'cached': True}
+            if not check and not (path is not None and request.get('write', False)):
+                response['text'] = data.decode('utf-8')
+            response['time'] = time.perf_counter() - start
+            return response
+
+    text, newline = split_newlines(data.decode('utf-8'))
+    view = rr_headless.View(text, file_name)
+    if lines is not None:
+        view.sel().add_all(rr_headless.Region(a, b) for a, b in line_regions(text, lines))
+        if not len(view.sel()):
+            passes = []
+    messages = []
+    for sequence, multi_pass in passes:
+        message = rr_headless.run_sequence(view, sequence, multi_pass, 'daemon')
+        if message:
+            messages.append(message)
+    result = view.text
+    changed = result != text
+    output = join_newlines(result, newline) if changed else None
+    if cache is not None:
+        if changed:
+            # The result is known to need no changes too, so it is answered from the cache when sent back
+            result_content = digest(output.encode('utf-8'))
+            cache.put(key, result_content)
+            cache.put(digest([result_content, rules_digest(passes, lines)]), result_content)
+        else:
+            cache.put(key, content)
+
+    response = {'ok': True, 'changed': changed, 'results': ''.join(messages) or None}
+    if path is not None and request.get('write', False):
+        if changed:
+            write_file(path, output)
+    elif not check:
+        response['text'] = output if changed else data.decode('utf-8')
+    response['time'] = time.perf_counter() - start
+    return response
+
+
+def worker_load(config):
+    """
+    Load the settings and plugins in a worker process of the server.
+
+    `config` is (packages folder, settings files, cache path, cache size,
+    generation).  A worker loads them the first time it is used, and again
+    whenever the generation changes (after a `reload`), and keeps them, along
+    with the rules it has compiled, between requests.
+    """
+
+    if worker_state['config'] == config:
+        return
+    packages, settings_files, cache_path, cache_size, generation = config
+    rr_headless = load_headless()
+    if sys.modules.get('sublime') is not rr_headless:
+        rr_headless.install(PACKAGE_PATH, packages, settings_files)
+    else:
+        rr_headless.reload_settings(settings_files)
+
+    from RegReplace.rr_plugin import Plugin
+
+    # Plugins are only reloaded on request
+    Plugin.keep = True
+    Plugin.purge(force=True)
+    plugin_digests.clear()
+    worker_state['cache'] = None
+    if cache_path is not None:
+        from RegReplace.rr_cache import ResultCache
+        worker_state['cache'] = ResultCache(cache_path, cache_size)
+    worker_state['config'] = config
+
+
+def worker_apply(config, request):
+    """Apply a request in a worker process of the server."""
+
+    worker_load(config)
+    return apply_request(request, worker_state['cache'])
+
+
+class Server(object):
+    """
+    Answer requests on a Unix socket from a pool of worker processes.
+
+    The regex work is CPU bound, so the workers are processes: threads would
+    take turns running Python.  Each worker keeps its own compiled rules and
+    loaded plugins, and they share the result cache database.
+    """
+
+    def __init__(self, path, workers=DEFAULT_WORKERS, settings_files=(), cache=None):
+        """Initialize."""
+
+        from concurrent.futures import ProcessPoolExecutor
+        from RegReplace import rr_headless
+
+        self.path = path
+        self.settings_files = tuple(settings_files)
+        self.config = (
+            rr_headless.paths['packages'], self.settings_files,
+            cache.path if cache is not None else None, cache.max_entries if cache is not None else None, 0
+        )
+        self.pool = ProcessPoolExecutor(max(workers, 1))
+        self.running = False
+        self.sock = None
+
+    def bind(self):
+        """Listen on the socket, replacing a stale socket file."""
+
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.remove(self.path)
+            else:
+                raise RuntimeError('a server is already listening on %s' % self.path)
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # The socket file is created with only the owner's permissions, so no one else can ever connect
+        umask = os.umask(0o077)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.sock.listen(64)
+        self.sock.settimeout(ACCEPT_TIMEOUT)
+
+    def serve(self):
+        """Accept connections until stopped."""
+
+        self.bind()
+        # Start the workers from this thread (a pool started from a connection
+        # thread can stall), and have one load the settings to catch errors early
+        self.pool.submit(worker_load, self.config).result()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    conn = self.sock.accept()[0]
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                thread = threading.Thread(target=self.handle, args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.pool.shutdown(wait=True)
+            self.sock.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stop(self):
+        """Stop accepting connections (requests in progress are finished)."""
+
+        self.running = False
+
+    def reload(self):
+        """Make the workers reload the settings and plugins before their next request."""
+
+        self.config = self.config[:-1] + (self.config[-1] + 1,)
+
+    def dispatch(self, request):
+        """Handle a request other than `apply`."""
+
+        command = request.get('command')
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        elif command == 'reload':
+            self.reload()
+            return {'ok': True}
+        elif command == 'stop':
+            self.stop()
+            return {'ok': True}
+        raise ValueError('unknown command: %s' % command)
+
+    def handle(self, conn):
+        """Read the requests of a connection and answer each as soon as it is done."""
+
+        lock = threading.Condition()
+        pending = [0]
+
+        def answer(request, response):
+            if 'id' in request:
+                response['id'] = request['id']
+            data = (json.dumps(response) + '\n').encode('utf-8')
+            with lock:
+                conn.sendall(data)
+
+        def done(request, future):
+            try:
+                try:
+                    response = future.result()
+                except Exception as err:
+                    response = {'ok': False, 'error': str(err)}
+                answer(request, response)
+            finally:
+                with lock:
+                    pending[0] -= 1
+                    lock.notify()
+
+        try:
+            with conn.makefile('rb') as reader:
+                for line in reader:
+                    if not line.strip():
+                        continue
+                    request = {}
+                    try:
+                        request = json.loads(line.decode('utf-8'))
+                        if not isinstance(request, dict):
+                            request = {}
+                            raise ValueError('request is not an object')
+                        if request.get('command', 'apply') == 'apply':
+                            with lock:
+                                pending[0] += 1
+                            future = self.pool.submit(worker_apply, self.config, request)
+                            future.add_done_callback(functools.partial(done, request))
+                            continue
+                        response = self.dispatch(request)
+                    except Exception as err:
+                        response = {'ok': False, 'error': str(err)}
+                    answer(request, response)
+        except Exception:
+            pass
+        finally:
+            with lock:
+                while pending[0]:
+                    lock.wait()
+            conn.close()
+
+
+def send(path, requests):
+    """Send requests over one connection and get the responses in the order of the requests."""
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    try:
+        for index, request in enumerate(requests):
+            request = dict(request, id=index)
+            sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        responses = [None] * len(requests)
+        with sock.makefile('rb') as reader:
+            for line in reader:
+                response = json.loads(line.decode('utf-8'))
+                responses[response.pop('id')] = response
+    finally:
+        sock.close()
+    for index, response in enumerate(responses):
+        if response is None:
+            responses[index] = {'ok': False, 'error': 'no response'}
+    return responses
+
+
+def build_requests(args, stdin_text):
+    """Build the apply requests of the command line and get the names to report them under."""
+
+    base = {'multi_pass': args.multi_pass, 'check': args.check}
+    if args.sequence:
+        base['sequence'] = args.sequence
+    else:
+        base['route'] = True
+    if args.git_diff:
+        register_package()
+        from RegReplace.rr_git import changed_lines
+
+        hunks, skipped = changed_lines('.', args.staged, args.files)
+        for path in skipped:
+            sys.stderr.write('%s: skipped (has unstaged changes)\n' % path)
+        names = list(hunks.keys())
+        requests = [dict(base, file=path, lines=lines, write=not args.check) for path, lines in hunks.items()]
+    elif args.files:
+        names = args.files
+        requests = [dict(base, file=os.path.abspath(name), write=not args.check) for name in args.files]
+    else:
+        names = ['-']
+        requests = [dict(base, text=stdin_text)]
+    return names, requests
+
+
+def report(args, names, responses):
+    """Print the outcome of the apply requests and get the exit code."""
+
+    code = EXIT_OK
+    for name, response in zip(names, responses):
+        if not response.get('ok'):
+            sys.stderr.write('%s: error: %s\n' % (name, response.get('error')))
+            code = EXIT_ERROR
+            continue
+        if name == '-' and not args.check:
+            sys.stdout.write(response['text'])
+        if response['changed']:
+            if args.check and code == EXIT_OK:
+                code = EXIT_CHANGED
+            sys.stderr.write('%s: %s\n' % (name, response.get('results') or 'changed'))
+        elif args.verbose:
+            sys.stderr.write('%s: unchanged%s\n' % (name, ' (cached)' if response.get('cached') else ''))
+    return code
+
+
+def find(args):
+    """Count the matches of rules across folders, only opening the files the trigram index says can match."""
+
+    from RegReplace import rr_headless
+    from RegReplace.rr_trigram import TrigramIndex, rule_query
+
+    rr_headless.check_sequence(args.sequence)
+    rules = rr_headless.load_settings(rr_headless.SETTINGS_FILE).get('replacements', {})
+    queries = [rule_query(rules[name]) for name in args.sequence]
+    index = TrigramIndex(args.index) if args.index else None
+    scanned = indexed = matches = matched_files = 0
+    try:
+        for root in args.roots or ['.']:
+            root = os.path.abspath(root)
+            if os.path.isfile(root):
+                candidates = [root]
+            elif index is not None:
+                indexed += index.update(root, read_text)
+                candidates = index.candidates(root, queries)
+            else:
+                candidates = walk_files(root)
+            for path in candidates:
+                text = read_text(path)
+                if text is None:
+                    continue
+                scanned += 1
+                view = rr_headless.View(text, path)
+                counts = [(name, count) for name, count in rr_headless.count_sequence(view, args.sequence) if count]
+                if not counts:
+                    continue
+                matched_files += 1
+                matches += sum(count for name, count in counts)
+                if args.files_only:
+                    sys.stdout.write(path + '\n')
+                else:
+                    sys.stdout.write('%s: %s\n' % (path, ' '.join('%s: %d matches;' % c for c in counts)))
+    finally:
+        if index is not None:
+            index.close()
+    if args.verbose:
+        sys.stderr.write(
+            'scanned %d files (%d indexed); %d matches in %d files\n' % (scanned, indexed, matches, matched_files)
+        )
+    return EXIT_OK if matches else EXIT_CHANGED
+
+
+def parse_args(argv):
+    """Parse the command line."""
+
+    parser = argparse.ArgumentParser(prog='rr_daemon', description='Apply RegReplace sequences outside of Sublime.')
+    commands = parser.add_subparsers(dest='command')
+
+    def add_apply(name, description):
+        command = commands.add_parser(name, help=description)
+        command.add_argument(
+            '-s', '--sequence', action='append',
+            help='rule to apply, in order (default: the on_save_sequences that match each file)'
+        )
+        command.add_argument('--multi-pass', action='store_true', help='repeat the sequence until nothing changes')
+        command.add_argument('--check', action='store_true', help='do not write files; exit 1 if any would change')
+        command.add_argument('--git-diff', action='store_true', help='only change the lines git reports as changed')
+        command.add_argument('--staged', action='store_true', help='with --git-diff, use the staged changes')
+        command.add_argument('-v', '--verbose', action='store_true', help='also report unchanged files')
+        command.add_argument('files', nargs='*', help='files to update in place (stdin to stdout if none)')
+        return command
+
+    def add_socket(command):
+        command.add_argument('--socket', default=default_socket(), help='server socket path')
+        return command
+
+    def add_settings(command):
+        command.add_argument('--packages', help='Sublime Packages folder (for User settings and plugins)')
+        command.add_argument('--settings', action='append', default=[], help='extra settings file')
+        return command
+
+    def add_cache(command):
+        command.add_argument('--cache', help='result cache database (skip files already processed with the same rules)')
+        command.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='result cache entries')
+
+    serve = add_socket(commands.add_parser('serve', help='run the server'))
+    serve.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes')
+    add_cache(add_settings(serve))
+    add_cache(add_settings(add_apply('run', 'apply without a server')))
+    add_socket(add_apply('apply', 'apply with the server'))
+    search = commands.add_parser('find', help='count matches across folders (exit 1 if there are none)')
+    search.add_argument('-s', '--sequence', action='append', required=True, help='rule to count')
+    search.add_argument('--index', help='trigram index database (created and updated as needed)')
+    search.add_argument('-l', '--files-only', action='store_true', help='only list the files with matches')
+    search.add_argument('-v', '--verbose', action='store_true', help='report how many files were scanned')
+    search.add_argument('roots', nargs='*', help='folders or files to search (default: the current folder)')
+    add_settings(search)
+    for name in ('ping', 'reload', 'stop'):
+        add_socket(commands.add_parser(name, help='%s the server' % name))
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('a command is required')
+    if args.command in ('run', 'apply') and not args.sequence and not (args.files or args.git_diff):
+        parser.error('routing by on_save_sequences needs files')
+    return args
+
+
+def main(argv=None):
+    """Run the command line."""
+
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    cache = None
+    if args.command in ('serve', 'run', 'find'):
+        load_headless().install(PACKAGE_PATH, args.packages, args.settings)
+        if getattr(args, 'cache', None):
+            from RegReplace.rr_cache import ResultCache
+            cache = ResultCache(args.cache, args.cache_size)
+
+    if args.command == 'serve':
+        import signal
+
+        server = Server(args.socket, args.workers, args.settings, cache)
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+        return EXIT_OK
+
+    try:
+        if args.command == 'find':
+            return find(args)
+        if args.command in ('ping', 'reload', 'stop'):
+            response = send(args.socket, [{'command': args.command}])[0]
+            if not response.get('ok'):
+                sys.stderr.write('error: %s\n' % response.get('error'))
+                return EXIT_ERROR
+            return EXIT_OK
+
+        stdin_text = None if args.files or args.git_diff else sys.stdin.read()
+        names, requests = build_requests(args, stdin_text)
+        if args.command == 'apply':
+            responses = send(args.socket, requests)
+        else:
+            responses = []
+            for request in requests:
+                try:
+                    responses.append(apply_request(request, cache))
+                except Exception as err:
+                    responses.append({'ok': False, 'error': str(err)})
+        return report(args, names, responses)
+    except (ValueError, subprocess.CalledProcessError) as err:
+        sys.stderr.write('error: %s\n' % err)
+        return EXIT_ERROR
+    except socket.error as err:
+        sys.stderr.write('error: cannot reach the server at %s: %s\n' % (args.socket, err))
+        return EXIT_ERROR
+
+
+if __name__ == '__main__':
+    sys.exit(main())
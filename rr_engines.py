@@ -0,0 +1,185 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import re
+from abc import ABCMeta, abstractmethod
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+DEFAULT_ENGINE = 're'
+EXTENDED_ENGINE = 'bre'
+# `\d`, `\w`, and `\b` only agree with `re` when `re` is limited to ASCII
+RE2_ASCII_CATEGORIES = frozenset([
+    sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_DIGIT, sre_parse.CATEGORY_WORD, sre_parse.CATEGORY_NOT_WORD
+])
+RE2_ASCII_ANCHORS = frozenset([sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY])
+
+
+class UnsupportedError(Exception):
+    """The engine does not support the pattern."""
+
+
+class RegexEngine(metaclass=ABCMeta):
+    """
+    Regex engine interface.
+
+    `compile` returns a pattern that provides `finditer(string)`,
+    `subn(repl, string, count=0)`, `groups`, and `groupindex`, and whose
+    matches provide `group`, `start`, `end`, `span`, and `expand(template)`,
+    as `re` patterns and matches do.  If the engine cannot handle a pattern,
+    `compile` raises `UnsupportedError` and `re` is used instead.
+    """
+
+    @abstractmethod
+    def compile(self, find, flags):
+        """Compile a search pattern."""
+
+
+class ReEngine(RegexEngine):
+    """Python's `re`."""
+
+    def compile(self, find, flags):
+        """Compile a search pattern."""
+
+        return re.compile(find, flags)
+
+
+class BreEngine(RegexEngine):
+    """Backrefs' wrapper around `re` for extended back references."""
+
+    def compile(self, find, flags):
+        """Compile a search pattern."""
+
+        # Only load backrefs when extended back references are actually used
+        from backrefs import bre
+        return bre.compile_search(find, flags)
+
+
+class LinearEngine(RegexEngine):
+    """Pure Python engine that runs in time linear in the length of the text."""
+
+    def compile(self, find, flags):
+        """Compile a search pattern."""
+
+        from RegReplace.rr_linear import LinearPattern
+        try:
+            return LinearPattern(find, flags)
+        except re.error as err:
+            # Leave reporting bad patterns to `re`
+            raise UnsupportedError(str(err))
+
+
+def re2_difference(find, flags):
+    r"""
+    Find a construct that RE2 does not interpret the way `re` does.
+
+    RE2 compiles some patterns that it then matches differently: its `\d`,
+    `\w`, and `\b` are ASCII only, its `\s` does not match `\v`, its `$`
+    (without multi-line) does not match before a final newline, and its case
+    folding is not the same for non-ASCII characters.  Returns a description
+    of the first such construct, or `None` if there is none.
+    """
+
+    parsed = sre_parse.parse(find, flags)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    flags = state.flags
+    stack = [parsed]
+    while stack:
+        for op, av in stack.pop():
+            if op is sre_parse.IN:
+                items = av
+            elif op is sre_parse.CATEGORY:
+                items = [(op, av)]
+            else:
+                items = []
+            for item_op, item_av in items:
+                if item_op is sre_parse.CATEGORY:
+                    if item_av in RE2_ASCII_CATEGORIES and flags & re.ASCII:
+                        continue
+                    return 'character class escapes'
+                elif item_op is sre_parse.LITERAL and item_av >= 128 and flags & re.IGNORECASE:
+                    return 'case insensitive non-ASCII characters'
+            if op is sre_parse.LITERAL and av >= 128 and flags & re.IGNORECASE:
+                return 'case insensitive non-ASCII characters'
+            elif op is sre_parse.AT:
+                if av in RE2_ASCII_ANCHORS and not flags & re.ASCII:
+                    return 'word boundaries'
+                elif av is sre_parse.AT_END and not flags & re.MULTILINE:
+                    return '$ without multi-line'
+            elif op is sre_parse.BRANCH:
+                stack.extend(av[1])
+            elif op is sre_parse.SUBPATTERN:
+                if len(av) == 4 and (av[1] or av[2]):
+                    return 'scoped flags'
+                stack.append(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                stack.append(av[2])
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                stack.append(av[1])
+    return None
+
+
+class Re2Engine(RegexEngine):
+    """
+    Google's RE2 (linear time), if a `re2` module is installed.
+
+    Patterns that RE2 would match differently from `re` are left to `re`
+    (see `re2_difference`).
+    """
+
+    def compile(self, find, flags):
+        """Compile a search pattern."""
+
+        try:
+            import re2
+        except ImportError:
+            raise UnsupportedError('re2 is not installed')
+        try:
+            difference = re2_difference(find, flags)
+        except re.error as err:
+            # Leave reporting bad patterns to `re`
+            raise UnsupportedError(str(err))
+        if difference is not None:
+            raise UnsupportedError('re2 matches %s differently' % difference)
+        try:
+            return re2.compile(find, flags)
+        except Exception as err:
+            raise UnsupportedError(str(err))
+
+
+ENGINES = {
+    're': ReEngine(),
+    'bre': BreEngine(),
+    'linear': LinearEngine(),
+    're2': Re2Engine()
+}
+
+
+def register_engine(name, engine):
+    """Make an engine available to rules under the given name."""
+
+    ENGINES[name] = engine
+
+
+def compile_search(find, flags, engine=None, extend=False):
+    """
+    Compile a search pattern with the requested engine.
+
+    Falls back to `re` when no engine is requested, the engine is unknown,
+    or it does not support the pattern.  Extended back references always
+    use backrefs.
+    """
+
+    if extend:
+        return ENGINES[EXTENDED_ENGINE].compile(find, flags)
+    if engine is not None and engine != DEFAULT_ENGINE and engine in ENGINES:
+        try:
+            return ENGINES[engine].compile(find, flags)
+        except UnsupportedError:
+            pass
+    return ENGINES[DEFAULT_ENGINE].compile(find, flags)
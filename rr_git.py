@@ -0,0 +1,117 @@
+"""
+Reg Replace.
+
+Find the lines changed in a git work tree, so that sequences can be limited
+to them (for instance in a pre-commit hook).
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import os
+import re
+import subprocess
+from collections import OrderedDict
+
+RE_NEW_FILE = re.compile(r'^\+\+\+ (.*?)\t?$')
+RE_HUNK = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+RE_ESCAPE = re.compile(r'\\([0-7]{3}|.)')
+ESCAPES = {'a': 7, 'b': 8, 't': 9, 'n': 10, 'v': 11, 'f': 12, 'r': 13}
+
+
+def unquote(path):
+    """
+    Undo git's quoting of unusual file names.
+
+    Quoted names use C style escapes, with octal escapes for the bytes of
+    UTF-8 sequences; other characters (non-ASCII ones when `core.quotepath`
+    is off) are left as they are.
+    """
+
+    if not path.startswith('"'):
+        return path
+    data = bytearray()
+    for index, part in enumerate(RE_ESCAPE.split(path[1:-1])):
+        if index % 2 == 0:
+            data.extend(part.encode('utf-8'))
+        elif len(part) == 3:
+            data.append(int(part, 8))
+        else:
+            data.append(ESCAPES.get(part, ord(part)))
+    return bytes(data).decode('utf-8', 'surrogateescape')
+
+
+def parse_hunks(diff):
+    """
+    Get the changed lines of each file in the output of `git diff --unified=0`.
+
+    The new file paths must have the `b/` prefix (see `changed_lines`).
+    Returns an ordered mapping of the new file paths (relative to the top of
+    the repository) to lists of (first line, line count).  Hunks that only
+    remove lines have no new lines and are left out, as are deleted files.
+    """
+
+    hunks = OrderedDict()
+    current = None
+    for line in diff.splitlines():
+        m = RE_NEW_FILE.match(line)
+        if m:
+            path = unquote(m.group(1))
+            if path == '/dev/null':
+                current = None
+            else:
+                current = hunks.setdefault(path[2:], [])
+            continue
+        m = RE_HUNK.match(line)
+        if m and current is not None:
+            count = 1 if m.group(2) is None else int(m.group(2))
+            if count:
+                current.append((int(m.group(1)), count))
+    return OrderedDict((path, lines) for path, lines in hunks.items() if lines)
+
+
+def git(cwd, *args):
+    """Run git and get its output (with non-ASCII paths left unquoted)."""
+
+    return subprocess.check_output(
+        ('git', '-c', 'core.quotepath=false') + args, cwd=cwd
+    ).decode('utf-8')
+
+
+def changed_lines(cwd='.', staged=False, paths=()):
+    """
+    Get the changed lines of the work tree (or the index if `staged`) by absolute path.
+
+    With `staged`, files that also have unstaged changes are returned in the
+    second value and left out, as the staged line numbers do not match the
+    file on disk.
+    """
+
+    top = git(cwd, 'rev-parse', '--show-toplevel').strip()
+    # Fixed prefixes, whatever `diff.noprefix` or `diff.mnemonicPrefix` say
+    args = (
+        'diff', '--unified=0', '--no-color', '--no-ext-diff', '--diff-filter=ACMR', '--src-prefix=a/', '--dst-prefix=b/'
+    )
+    if staged:
+        args += ('--cached',)
+    args += ('--',) + tuple(os.path.abspath(p) for p in paths)
+    hunks = parse_hunks(git(top, *args))
+    skipped = []
+    if staged and hunks:
+        unstaged = set(unquote(p) for p in git(top, 'diff', '--name-only', '--no-ext-diff').splitlines())
+        skipped = [os.path.join(top, p) for p in hunks if p in unstaged]
+        hunks = OrderedDict((p, lines) for p, lines in hunks.items() if p not in unstaged)
+    return OrderedDict((os.path.join(top, p), lines) for p, lines in hunks.items()), skipped
+
+
+def line_regions(text, lines):
+    """Convert (first line, line count) ranges to (begin, end) offsets covering the whole lines."""
+
+    starts = [0]
+    starts.extend(m.end() for m in re.finditer('\n', text))
+    regions = []
+    for first, count in lines:
+        if count <= 0 or first < 1 or first > len(starts):
+            continue
+        last = first - 1 + count
+        regions.append((starts[first - 1], starts[last] if last < len(starts) else len(text)))
+    return regions
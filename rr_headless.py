@@ -0,0 +1,655 @@
+"""
+Reg Replace.
+
+A minimal stand-in for the `sublime` and `sublime_plugin` modules, so that
+the engine can run on plain text outside of Sublime Text.
+
+There is no syntax engine, so scopes never match, and no windows or panels.
+Status messages and errors are captured per thread, so that concurrent
+callers each get their own.  Nothing happens on import; call `install`.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import json
+import os
+import re
+import sys
+import threading
+import types
+import itertools
+
+PACKAGE_NAME = 'RegReplace'
+SETTINGS_FILE = 'reg_replace.sublime-settings'
+
+DRAW_EMPTY_AS_OVERWRITE = 1
+DRAW_OUTLINED = 2
+DRAW_NO_FILL = 32
+DRAW_NO_OUTLINE = 256
+DRAW_SOLID_UNDERLINE = 512
+DRAW_SQUIGGLY_UNDERLINE = 2048
+HIDE_ON_MINIMAP = 1024
+LITERAL = 1
+IGNORECASE = 2
+
+# Settings that only make sense with a real view
+HEADLESS_SETTINGS = {
+    'find_backend': 'python',
+    'results_in_panel': False,
+    'lazy_highlights': False,
+    'use_sub_notify': False
+}
+
+RE_JSON_COMMENTS = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*[\s\S]*?\*/')
+RE_JSON_COMMAS = re.compile(r'"(?:\\.|[^"\\])*"|,(\s*[\]}])')
+
+settings_store = {}
+paths = {'package': '', 'packages': '', 'cache': ''}
+captured = threading.local()
+view_ids = itertools.count(1)
+
+
+def strip_json(text):
+    """Remove the comments and trailing commas Sublime allows in JSON files."""
+
+    text = RE_JSON_COMMENTS.sub(lambda m: m.group(0) if m.group(0).startswith('"') else '', text)
+    return RE_JSON_COMMAS.sub(lambda m: m.group(0) if m.group(1) is None else m.group(1), text)
+
+
+def read_settings(path):
+    """Read a Sublime settings file."""
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.loads(strip_json(f.read()))
+
+
+class Region(object):
+    """Region."""
+
+    def __init__(self, a, b=None):
+        """Initialize."""
+
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        """Get the start point."""
+
+        return min(self.a, self.b)
+
+    def end(self):
+        """Get the end point."""
+
+        return max(self.a, self.b)
+
+    def size(self):
+        """Get the size."""
+
+        return abs(self.b - self.a)
+
+    def empty(self):
+        """See if region is empty."""
+
+        return self.a == self.b
+
+    def contains(self, x):
+        """See if the point or region is contained in the region."""
+
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def cover(self, other):
+        """Get a region covering both regions."""
+
+        return Region(min(self.begin(), other.begin()), max(self.end(), other.end()))
+
+    def __len__(self):
+        """Get the size."""
+
+        return self.size()
+
+    def __eq__(self, other):
+        """Compare."""
+
+        return isinstance(other, Region) and (self.a, self.b) == (other.a, other.b)
+
+    def __ne__(self, other):
+        """Compare."""
+
+        return not self == other
+
+    def __repr__(self):
+        """Representation."""
+
+        return '(%d, %d)' % (self.a, self.b)
+
+
+class Settings(object):
+    """Settings object."""
+
+    def __init__(self, values=None):
+        """Initialize."""
+
+        self.values = dict(values or {})
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        """Get a setting."""
+
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        """Set a setting."""
+
+        self.values[key] = value
+
+    def has(self, key):
+        """See if setting exists."""
+
+        return key in self.values
+
+    def erase(self, key):
+        """Remove a setting."""
+
+        self.values.pop(key, None)
+
+    def add_on_change(self, key, callback):
+        """Add a change callback."""
+
+        self.callbacks[key] = callback
+
+    def clear_on_change(self, key):
+        """Remove a change callback."""
+
+        self.callbacks.pop(key, None)
+
+    def update(self, values):
+        """Replace all of the settings and run the change callbacks."""
+
+        self.values = dict(values)
+        for callback in list(self.callbacks.values()):
+            callback()
+
+
+class Selection(object):
+    """View selection."""
+
+    def __init__(self):
+        """Initialize."""
+
+        self.regions = []
+
+    def __len__(self):
+        """Get number of selections."""
+
+        return len(self.regions)
+
+    def __getitem__(self, index):
+        """Get a selection."""
+
+        return self.regions[index]
+
+    def __iter__(self):
+        """Iterate the selections."""
+
+        return iter(list(self.regions))
+
+    def clear(self):
+        """Clear the selections."""
+
+        self.regions = []
+
+    def add(self, region):
+        """Add a selection, merging it with the selections it overlaps or touches."""
+
+        if not isinstance(region, Region):
+            region = Region(region)
+        regions = []
+        for r in self.regions:
+            if r.end() < region.begin() or region.end() < r.begin():
+                regions.append(r)
+            else:
+                region = region.cover(r)
+        regions.append(region)
+        regions.sort(key=lambda r: (r.begin(), r.end()))
+        self.regions = regions
+
+    def add_all(self, regions):
+        """Add multiple selections."""
+
+        for region in regions:
+            self.add(region)
+
+    def shift(self, begin, end, size):
+        """Adjust the selections after `begin`-`end` is replaced with text of the given size."""
+
+        delta = size - (end - begin)
+
+        def move(pt):
+            if pt >= end:
+                return pt + delta
+            if pt > begin:
+                # Points inside of the replaced text move to the end of the new text
+                return begin + size
+            return pt
+
+        regions = []
+        for r in self.regions:
+            region = Region(move(r.a), move(r.b))
+            if regions and region.begin() <= regions[-1].end():
+                regions[-1] = regions[-1].cover(region)
+            else:
+                regions.append(region)
+        self.regions = regions
+
+
+class View(object):
+    """A text buffer without a syntax or a window."""
+
+    def __init__(self, text='', file_name=None):
+        """Initialize."""
+
+        self.view_id = next(view_ids)
+        self.text = text
+        self.name = file_name
+        self.selection = Selection()
+        self.view_settings = Settings()
+        self.changes = 0
+
+    def id(self):
+        """Get view id."""
+
+        return self.view_id
+
+    def buffer_id(self):
+        """Get buffer id."""
+
+        return self.view_id
+
+    def file_name(self):
+        """Get file name."""
+
+        return self.name
+
+    def window(self):
+        """Get the view's window."""
+
+        return None
+
+    def change_count(self):
+        """Get the change count."""
+
+        return self.changes
+
+    def size(self):
+        """Get the size of the buffer."""
+
+        return len(self.text)
+
+    def substr(self, x):
+        """Get the text of a region or the character at a point."""
+
+        if isinstance(x, Region):
+            return self.text[x.begin():x.end()]
+        return self.text[x:x + 1]
+
+    def replace(self, edit, region, text):
+        """Replace a region."""
+
+        begin, end = region.begin(), region.end()
+        self.text = self.text[:begin] + text + self.text[end:]
+        self.changes += 1
+        self.selection.shift(begin, end, len(text))
+
+    def insert(self, edit, pt, text):
+        """Insert text."""
+
+        self.replace(edit, Region(pt), text)
+        return len(text)
+
+    def erase(self, edit, region):
+        """Erase a region."""
+
+        self.replace(edit, region, '')
+
+    def sel(self):
+        """Get the selection."""
+
+        return self.selection
+
+    def settings(self):
+        """Get the view settings."""
+
+        return self.view_settings
+
+    def score_selector(self, pt, selector):
+        """Score the selector at a point (there are no scopes)."""
+
+        return 0
+
+    def scope_name(self, pt):
+        """Get the scope name at a point."""
+
+        return ''
+
+    def find_by_selector(self, selector):
+        """Find all regions matching the selector (there are no scopes)."""
+
+        return []
+
+    def rowcol(self, pt):
+        """Get row and column of a point."""
+
+        row = self.text.count('\n', 0, pt)
+        return row, pt - (self.text.rfind('\n', 0, pt) + 1)
+
+    def visible_region(self):
+        """Get the visible region (everything)."""
+
+        return Region(0, len(self.text))
+
+    def show(self, x, show_surrounds=True):
+        """Scroll to a point or region."""
+
+    def add_regions(self, key, regions, scope='', icon='', flags=0):
+        """Add highlight regions."""
+
+    def get_regions(self, key):
+        """Get highlight regions."""
+
+        return []
+
+    def erase_regions(self, key):
+        """Erase highlight regions."""
+
+    def fold(self, regions):
+        """Fold regions."""
+
+    def unfold(self, regions):
+        """Unfold regions."""
+
+    def is_read_only(self):
+        """See if view is read only."""
+
+        return False
+
+    def is_dirty(self):
+        """See if the view is dirty."""
+
+        return self.changes > 0
+
+
+def capture():
+    """Start capturing the status and error messages of the current thread."""
+
+    captured.status = None
+    captured.errors = []
+
+
+def captured_status():
+    """Get the last status message of the current thread."""
+
+    return getattr(captured, 'status', None)
+
+
+def captured_errors():
+    """Get the error messages of the current thread."""
+
+    return list(getattr(captured, 'errors', []))
+
+
+def status_message(message):
+    """Show a status message."""
+
+    captured.status = message
+
+
+def error_message(message):
+    """Show an error message."""
+
+    if not hasattr(captured, 'errors'):
+        captured.errors = []
+    captured.errors.append(message)
+
+
+def message_dialog(message):
+    """Show a message dialog."""
+
+    status_message(message)
+
+
+def set_timeout(callback, delay=0):
+    """Run a callback after the delay (milliseconds)."""
+
+    if delay <= 0:
+        callback()
+        return
+    timer = threading.Timer(delay / 1000.0, callback)
+    timer.daemon = True
+    timer.start()
+
+
+set_timeout_async = set_timeout
+
+
+def run_command(name, args=None):
+    """Run an application command (there are none)."""
+
+
+def active_window():
+    """Get the active window."""
+
+    return None
+
+
+def windows():
+    """Get the windows."""
+
+    return []
+
+
+def platform():
+    """Get the platform."""
+
+    if sys.platform.startswith('win'):
+        return 'windows'
+    return 'osx' if sys.platform == 'darwin' else 'linux'
+
+
+def version():
+    """Get the version."""
+
+    return '3000'
+
+
+def packages_path():
+    """Get the packages path."""
+
+    return paths['packages']
+
+
+def cache_path():
+    """Get the cache path."""
+
+    return paths['cache']
+
+
+def load_settings(name):
+    """Load settings."""
+
+    if name not in settings_store:
+        settings_store[name] = Settings()
+    return settings_store[name]
+
+
+def load_resource(name):
+    """Load a resource from `Packages/`."""
+
+    name = name.replace('\\', '/')
+    prefix = 'Packages/%s/' % PACKAGE_NAME
+    if name.startswith(prefix):
+        path = os.path.join(paths['package'], name[len(prefix):])
+    elif name.startswith('Packages/'):
+        path = os.path.join(paths['packages'], name[len('Packages/'):])
+    else:
+        raise IOError('resource not found: %s' % name)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def default_packages_path():
+    """Get the `Packages` folder of a default Sublime Text 3 install."""
+
+    system = platform()
+    if system == 'windows':
+        base = os.path.join(os.environ.get('APPDATA', ''), 'Sublime Text 3')
+    elif system == 'osx':
+        base = os.path.expanduser('~/Library/Application Support/Sublime Text 3')
+    else:
+        base = os.path.expanduser('~/.config/sublime-text-3')
+    return os.path.join(base, 'Packages')
+
+
+def reload_settings(extra=()):
+    """
+    Load the package settings, the user's settings, and any extra settings files.
+
+    Top level keys of later files replace those of earlier ones, as in Sublime.
+    """
+
+    values = {}
+    for path in (
+        os.path.join(paths['package'], SETTINGS_FILE),
+        os.path.join(paths['packages'], 'User', SETTINGS_FILE)
+    ) + tuple(extra):
+        if os.path.exists(path):
+            values.update(read_settings(path))
+    values.update(HEADLESS_SETTINGS)
+    load_settings(SETTINGS_FILE).update(values)
+
+
+class TextCommand(object):
+    """Text command."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+
+
+class WindowCommand(object):
+    """Window command."""
+
+    def __init__(self, window):
+        """Initialize."""
+
+        self.window = window
+
+
+class ApplicationCommand(object):
+    """Application command."""
+
+
+class EventListener(object):
+    """Event listener."""
+
+
+def install(package_path, packages=None, settings_files=()):
+    """
+    Install this module as `sublime` and register `package_path` as the `RegReplace` package.
+
+    Settings are loaded and the engine's `plugin_loaded` is run, so rules
+    start compiling right away.  Must not be used inside of Sublime Text.
+    """
+
+    if 'sublime' in sys.modules and sys.modules['sublime'] is not sys.modules[__name__]:
+        raise RuntimeError('a sublime module is already loaded')
+    paths['package'] = package_path
+    paths['packages'] = packages if packages is not None else default_packages_path()
+    paths['cache'] = os.path.join(os.path.dirname(paths['packages']), 'Cache')
+    sys.modules['sublime'] = sys.modules[__name__]
+    plugin = types.ModuleType('sublime_plugin')
+    plugin.TextCommand = TextCommand
+    plugin.WindowCommand = WindowCommand
+    plugin.ApplicationCommand = ApplicationCommand
+    plugin.EventListener = EventListener
+    sys.modules['sublime_plugin'] = plugin
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [package_path]
+        sys.modules[PACKAGE_NAME] = package
+    reload_settings(settings_files)
+
+    from RegReplace import rr_sequencer
+    rr_sequencer.plugin_loaded()
+
+
+def check_sequence(sequence):
+    """Raise `ValueError` if a rule of the sequence is unknown or needs a syntax engine."""
+
+    rules = load_settings(SETTINGS_FILE).get('replacements', {})
+    unknown = [name for name in sequence if name not in rules]
+    if unknown:
+        raise ValueError('unknown rules: %s' % ', '.join(unknown))
+    scoped = [name for name in sequence if rules[name].get('scope') or rules[name].get('scope_filter')]
+    if scoped:
+        raise ValueError('rules need a syntax: %s' % ', '.join(scoped))
+
+
+def on_save_passes(file_name):
+    """Get the sequences `on_save_sequences` routes the file to, as (sequence, multi_pass) pairs."""
+
+    from RegReplace.rr_sequencer import on_save_items
+
+    return [
+        (item['sequence'], bool(item.get('multi_pass', False))) for item in on_save_items(file_name)
+        if 'action' not in item and not item.get('highlight', False)
+    ]
+
+
+def run_sequence(view, sequence, multi_pass=False, trigger='headless'):
+    """
+    Apply a sequence of rules to a view.
+
+    If the view has selections, only the text under them is changed, as with
+    `selection_only`.  Returns the results message.  Unknown rules and rules
+    that rely on scopes raise `ValueError`, as there is no syntax to qualify
+    them with.
+    """
+
+    from RegReplace.rr_sequencer import RegReplaceCommand
+    from RegReplace.rr_stats import ViewStats
+
+    check_sequence(sequence)
+    capture()
+    try:
+        RegReplaceCommand(view).run(
+            None, replacements=list(sequence), multi_pass=multi_pass,
+            selection_only=len(view.sel()) > 0, trigger=trigger
+        )
+    finally:
+        ViewStats.forget(view.id())
+    errors = captured_errors()
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return captured_status()
+
+
+def count_sequence(view, sequence):
+    """Count the matches of each rule of a sequence in a view, as (name, count) pairs."""
+
+    from RegReplace.rr_replacer import FindReplace
+
+    check_sequence(sequence)
+    rules = load_settings(SETTINGS_FILE).get('replacements', {})
+    capture()
+    replace_obj = FindReplace(view, None, False, False, False, 1, None)
+    try:
+        counts = [(name, replace_obj.count(rules[name], False, name)) for name in sequence]
+    finally:
+        replace_obj.close()
+    errors = captured_errors()
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return counts
@@ -0,0 +1,469 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import re
+import sys
+from RegReplace.rr_template import parse_template
+from RegReplace.rr_engines import UnsupportedError
+try:
+    from re import _parser as sre_parse
+    from re import _compiler as sre_compile
+except ImportError:
+    import sre_parse
+    import sre_compile
+
+# Python 3.7 allows an empty match right after a non-empty one.
+MUST_ADVANCE = sys.version_info >= (3, 7)
+EMPTY_NON_BOUNDARY = re.search(r'\B', '') is not None
+MAX_PROGRAM = 5000
+
+LIT = 0
+PRED = 1
+SPLIT = 2
+JMP = 3
+SAVE = 4
+ASSERT = 5
+MATCH = 6
+
+CHAR_OPS = frozenset([sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN])
+ANCHORS = frozenset([
+    sre_parse.AT_BEGINNING, sre_parse.AT_END, sre_parse.AT_BEGINNING_STRING,
+    sre_parse.AT_END_STRING, sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY
+])
+
+
+class Program(object):
+    """
+    Compile a parsed pattern into instructions for the Pike VM.
+
+    Characters are tested with single character patterns compiled by `re`
+    itself (memoized per character), so classes, categories, and case
+    folding behave exactly as they do in `re`.
+    """
+
+    def __init__(self, parsed, flags):
+        """Compile."""
+
+        self.flags = flags
+        self.ops = []
+        self.args = []
+        self.args2 = []
+        self.state = getattr(parsed, 'state', None) or parsed.pattern
+        self.emit(SAVE, 0)
+        self.compile(parsed)
+        self.emit(SAVE, 1)
+        self.emit(MATCH)
+
+    def emit(self, op, arg=None, arg2=None):
+        """Add an instruction and return its address."""
+
+        if len(self.ops) >= MAX_PROGRAM:
+            raise UnsupportedError('pattern is too large')
+        self.ops.append(op)
+        self.args.append(arg)
+        self.args2.append(arg2)
+        return len(self.ops) - 1
+
+    def predicate(self, op, av):
+        """Get a memoized test for a single character item."""
+
+        try:
+            match = sre_compile.compile(sre_parse.SubPattern(self.state, [(op, av)]), self.flags).match
+        except Exception:
+            raise UnsupportedError('character item')
+        return ({}, match)
+
+    def compile(self, items):
+        """Compile a sequence of parsed items."""
+
+        for op, av in items:
+            if op is sre_parse.LITERAL and not self.flags & re.IGNORECASE:
+                self.emit(LIT, chr(av))
+            elif op in CHAR_OPS:
+                self.emit(PRED, self.predicate(op, av))
+            elif op is sre_parse.AT and av in ANCHORS:
+                self.emit(ASSERT, av)
+            elif op is sre_parse.BRANCH:
+                self.compile_branch(av[1])
+            elif op is sre_parse.SUBPATTERN:
+                group, p = av[0], av[-1]
+                if len(av) == 4 and (av[1] or av[2]):
+                    raise UnsupportedError('scoped inline flags')
+                if group is not None:
+                    self.emit(SAVE, group * 2)
+                self.compile(p)
+                if group is not None:
+                    self.emit(SAVE, group * 2 + 1)
+            elif op is sre_parse.MAX_REPEAT or op is sre_parse.MIN_REPEAT:
+                self.compile_repeat(av[0], av[1], av[2], op is sre_parse.MIN_REPEAT)
+            else:
+                raise UnsupportedError(str(op))
+
+    def compile_branch(self, alternatives):
+        """Compile alternatives: each split prefers the earlier alternative."""
+
+        jumps = []
+        for index, alternative in enumerate(alternatives):
+            if index < len(alternatives) - 1:
+                split = self.emit(SPLIT)
+                self.args[split] = split + 1
+                self.compile(alternative)
+                jumps.append(self.emit(JMP))
+                self.args2[split] = len(self.ops)
+            else:
+                self.compile(alternative)
+        for jump in jumps:
+            self.args[jump] = len(self.ops)
+
+    def compile_repeat(self, low, high, body, lazy):
+        """Compile a repeat by unrolling the required and optional copies."""
+
+        unbounded = high == sre_parse.MAXREPEAT
+        if body.getwidth()[0] == 0 and (unbounded or high > 1):
+            # Backtracking engines have special rules for repeated empty matches
+            raise UnsupportedError('repeat of a possibly empty pattern')
+        for _ in range(low):
+            self.compile(body)
+        if unbounded:
+            split = self.emit(SPLIT)
+            self.compile(body)
+            self.emit(JMP, split)
+            self.set_split(split, split + 1, len(self.ops), lazy)
+        else:
+            splits = []
+            for _ in range(high - low):
+                splits.append(self.emit(SPLIT))
+                self.compile(body)
+            for split in splits:
+                self.set_split(split, split + 1, len(self.ops), lazy)
+
+    def set_split(self, split, body, out, lazy):
+        """Point a split at the body and the way out, in order of preference."""
+
+        self.args[split], self.args2[split] = (out, body) if lazy else (body, out)
+
+
+class LinearMatch(object):
+    """Match object with the parts of the `re` match interface that RegReplace and plugins use."""
+
+    def __init__(self, pattern, string, regs, lastindex):
+        """Store the match."""
+
+        self.re = pattern
+        self.string = string
+        self.pos = 0
+        self.endpos = len(string)
+        self.regs = regs
+        self.lastindex = lastindex
+        self.lastgroup = None
+        if lastindex is not None:
+            for name, index in pattern.groupindex.items():
+                if index == lastindex:
+                    self.lastgroup = name
+
+    def index(self, group):
+        """Get the index of a group by number or name."""
+
+        if group in self.re.groupindex:
+            group = self.re.groupindex[group]
+        if not isinstance(group, int) or not 0 <= group < len(self.regs):
+            raise IndexError('no such group')
+        return group
+
+    def span(self, group=0):
+        """Get the span of a group."""
+
+        return self.regs[self.index(group)]
+
+    def start(self, group=0):
+        """Get the start of a group."""
+
+        return self.span(group)[0]
+
+    def end(self, group=0):
+        """Get the end of a group."""
+
+        return self.span(group)[1]
+
+    def group(self, *groups):
+        """Get one or more groups."""
+
+        if not groups:
+            groups = (0,)
+        values = []
+        for group in groups:
+            begin, end = self.span(group)
+            values.append(self.string[begin:end] if begin >= 0 else None)
+        return values[0] if len(values) == 1 else tuple(values)
+
+    def __getitem__(self, group):
+        """Get a group."""
+
+        return self.group(group)
+
+    def groups(self, default=None):
+        """Get all groups."""
+
+        return tuple(default if g is None else g for g in (self.group(i) for i in range(1, len(self.regs))))
+
+    def groupdict(self, default=None):
+        """Get the named groups."""
+
+        values = {}
+        for name, index in self.re.groupindex.items():
+            value = self.group(index)
+            values[name] = default if value is None else value
+        return values
+
+    def expand(self, template):
+        """Expand a replace template."""
+
+        parts = parse_template(self.re, template)
+        text = []
+        for part in parts or []:
+            if isinstance(part, int):
+                value = self.group(part)
+                if value is None:
+                    parts = None
+                    break
+                text.append(value)
+            else:
+                text.append(part)
+        if parts is None:
+            # Let `re` handle unmatched groups and the less common escapes.
+            # For supported patterns, it finds this very same match.
+            return self.re.fallback().match(self.string, self.start()).expand(template)
+        return ''.join(text)
+
+    def __repr__(self):
+        """Represent the match."""
+
+        return '<LinearMatch span=%r match=%r>' % (self.span(), self.group())
+
+
+class LinearPattern(object):
+    """
+    Pattern matched by a Pike VM in time linear in the length of the text.
+
+    Supports characters, classes, anchors, groups, alternation, and repeats.
+    Back references, lookarounds, conditionals, and repeats of patterns that
+    can match empty raise `UnsupportedError`.  Matches are the same as `re`
+    finds: threads are kept in order of preference, so the first thread to
+    match is the one a backtracking engine would have found.
+    """
+
+    def __init__(self, find, flags=0):
+        """Compile the pattern."""
+
+        parsed = sre_parse.parse(find, flags)
+        flags = (getattr(parsed, 'state', None) or parsed.pattern).flags
+        if flags & re.LOCALE:
+            raise UnsupportedError('locale')
+        program = Program(parsed, flags)
+        self.pattern = find
+        self.flags = flags
+        self.groups = program.state.groups - 1
+        self.groupindex = dict(program.state.groupdict)
+        self.ops = program.ops
+        self.args = program.args
+        self.args2 = program.args2
+        self.word = re.compile(r'\w', flags & (re.ASCII | re.IGNORECASE)).match
+        self.word_cache = {}
+        self.prefix = ''
+        if not flags & re.IGNORECASE:
+            for op, av in parsed:
+                if op is not sre_parse.LITERAL:
+                    break
+                self.prefix += chr(av)
+        self.compiled = None
+
+    def fallback(self):
+        """Get the pattern compiled by `re`."""
+
+        if self.compiled is None:
+            self.compiled = re.compile(self.pattern, self.flags)
+        return self.compiled
+
+    def is_word(self, string, pt):
+        """Check if the character at a point is a word character."""
+
+        if pt < 0 or pt >= len(string):
+            return False
+        c = string[pt]
+        word = self.word_cache.get(c)
+        if word is None:
+            word = self.word_cache[c] = self.word(c) is not None
+        return word
+
+    def check(self, anchor, string, pt):
+        """Check an anchor at a point."""
+
+        multiline = self.flags & re.MULTILINE
+        if anchor is sre_parse.AT_BEGINNING:
+            return pt == 0 or (multiline and string[pt - 1] == '\n')
+        elif anchor is sre_parse.AT_END:
+            size = len(string)
+            if pt == size:
+                return True
+            return string[pt] == '\n' and (multiline or pt == size - 1)
+        elif anchor is sre_parse.AT_BEGINNING_STRING:
+            return pt == 0
+        elif anchor is sre_parse.AT_END_STRING:
+            return pt == len(string)
+        elif anchor is sre_parse.AT_BOUNDARY:
+            return self.is_word(string, pt - 1) != self.is_word(string, pt)
+        if not string:
+            return EMPTY_NON_BOUNDARY
+        return self.is_word(string, pt - 1) == self.is_word(string, pt)
+
+    def add(self, threads, visited, pc, caps, sp, string):
+        """Add a thread, following jumps, splits, saves, and anchors in order of preference."""
+
+        ops = self.ops
+        args = self.args
+        stack = [(pc, caps)]
+        while stack:
+            pc, caps = stack.pop()
+            if pc in visited:
+                continue
+            visited.add(pc)
+            op = ops[pc]
+            if op == JMP:
+                stack.append((args[pc], caps))
+            elif op == SPLIT:
+                stack.append((self.args2[pc], caps))
+                stack.append((args[pc], caps))
+            elif op == SAVE:
+                caps = caps[:]
+                slot = args[pc]
+                caps[slot] = sp
+                if slot & 1 and slot > 1:
+                    caps[-1] = slot >> 1
+                stack.append((pc + 1, caps))
+            elif op == ASSERT:
+                if self.check(args[pc], string, sp):
+                    stack.append((pc + 1, caps))
+            else:
+                threads.append((pc, caps))
+
+    def search_at(self, string, pos, must_advance=False):
+        """Find the first match at or after `pos`; an empty match at `pos` is skipped if `must_advance`."""
+
+        ops = self.ops
+        args = self.args
+        size = len(string)
+        prefix = self.prefix
+        initial = [-1] * (self.groups * 2 + 2) + [None]
+        threads = []
+        visited = set()
+        matched = None
+        sp = pos
+        while True:
+            if matched is None:
+                if not threads and prefix:
+                    # Skip ahead to where a match can start
+                    found = string.find(prefix, sp)
+                    if found < 0:
+                        return None
+                    if found != sp:
+                        sp = found
+                        visited = set()
+                self.add(threads, visited, 0, initial, sp, string)
+            if not threads and (matched is not None or sp >= size):
+                break
+            c = string[sp] if sp < size else None
+            following = []
+            following_visited = set()
+            for pc, caps in threads:
+                op = ops[pc]
+                if op == MATCH:
+                    if must_advance and sp == pos:
+                        continue
+                    matched = caps
+                    break
+                elif c is None:
+                    continue
+                elif op == LIT:
+                    if c == args[pc]:
+                        self.add(following, following_visited, pc + 1, caps, sp + 1, string)
+                else:
+                    cache, test = args[pc]
+                    ok = cache.get(c)
+                    if ok is None:
+                        ok = cache[c] = test(c) is not None
+                    if ok:
+                        self.add(following, following_visited, pc + 1, caps, sp + 1, string)
+            if sp >= size:
+                break
+            threads = following
+            visited = following_visited
+            sp += 1
+            if matched is not None and not threads:
+                break
+        if matched is None:
+            return None
+        regs = tuple((matched[i], matched[i + 1]) for i in range(0, len(matched) - 1, 2))
+        return LinearMatch(self, string, regs, matched[-1])
+
+    def search(self, string):
+        """Find the first match."""
+
+        return self.search_at(string, 0)
+
+    def finditer(self, string):
+        """Find all matches, stepping past empty matches as `re` does."""
+
+        pos = 0
+        must_advance = False
+        size = len(string)
+        while pos <= size:
+            m = self.search_at(string, pos, must_advance)
+            if m is None:
+                break
+            yield m
+            begin, end = m.span()
+            if MUST_ADVANCE:
+                pos = end
+                must_advance = begin == end
+            else:
+                pos = end + 1 if begin == end else end
+
+    def subn(self, repl, string, count=0):
+        """Replace matches and return the new string and the number of replacements."""
+
+        if callable(repl):
+            expand = repl
+        elif '\\' not in repl:
+            def expand(m):
+                return repl
+        else:
+            # Check the template up front, as `re` does.
+            self.fallback().sub(repl, '')
+
+            def expand(m):
+                return m.expand(repl)
+
+        parts = []
+        last = 0
+        replaced = 0
+        for m in self.finditer(string):
+            if count and replaced >= count:
+                break
+            begin, end = m.span()
+            if not MUST_ADVANCE and begin == end == last and replaced:
+                # Before Python 3.7, empty matches next to a previous match are not replaced.
+                continue
+            parts.append(string[last:begin])
+            parts.append(expand(m))
+            last = end
+            replaced += 1
+        parts.append(string[last:])
+        return ''.join(parts), replaced
+
+    def sub(self, repl, string, count=0):
+        """Replace matches."""
+
+        return self.subn(repl, string, count)[0]
@@ -0,0 +1,215 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import re
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+BACKEND_PYTHON = 'python'
+BACKEND_NATIVE = 'native'
+
+# Flags that `convert_search` knows how to carry over
+SUPPORTED_FLAGS = re.IGNORECASE | re.DOTALL | re.MULTILINE | re.UNICODE | re.VERBOSE
+
+# Requirements on the buffer text and a Sublime regex that finds text that breaks them.
+# `lines`: `.`, `^`, and `$` only agree when `\n` is the only line separator.
+# `ascii`: `\w`, `\d`, `\s`, `\b`, and case folding only agree on ASCII text.
+TEXT_CHECKS = {
+    'lines': '[\\r\\f\\v\\x{85}\\x{2028}\\x{2029}]',
+    'ascii': '[^\\t\\n\\x{20}-\\x{7e}]'
+}
+
+CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: '\\d',
+    sre_parse.CATEGORY_NOT_DIGIT: '\\D',
+    sre_parse.CATEGORY_SPACE: '\\s',
+    sre_parse.CATEGORY_NOT_SPACE: '\\S',
+    sre_parse.CATEGORY_WORD: '\\w',
+    sre_parse.CATEGORY_NOT_WORD: '\\W'
+}
+
+ANCHORS = {
+    sre_parse.AT_BEGINNING: ('^', 'lines'),
+    sre_parse.AT_END: ('$', 'lines'),
+    sre_parse.AT_BEGINNING_STRING: ('\\A', None),
+    sre_parse.AT_END_STRING: ('\\z', None),
+    sre_parse.AT_BOUNDARY: ('\\b', 'ascii'),
+    sre_parse.AT_NON_BOUNDARY: ('\\B', 'ascii')
+}
+
+
+class IncompatibleError(Exception):
+    """The pattern uses something the native engine may interpret differently."""
+
+
+class NativeRule(object):
+    """A search pattern and format string for Sublime's `find_all`."""
+
+    def __init__(self, pattern, fmt, needs):
+        """Store the converted rule."""
+
+        self.pattern = pattern
+        self.format = fmt
+        self.needs = needs
+
+
+def escape_char(c):
+    """Escape a character so Sublime's regex engine reads it literally."""
+
+    if c < 128 and chr(c).isalnum():
+        return chr(c)
+    if 32 < c < 127:
+        return '\\' + chr(c)
+    return '\\x{%x}' % c
+
+
+class SearchConverter(object):
+    """
+    Rewrite a parsed Python pattern in the syntax of Sublime's regex engine.
+
+    Only constructs both engines are known to interpret identically are
+    accepted; anything else raises `IncompatibleError`.  The groups that take
+    part in every match are tracked, as an unmatched group in a replace
+    template is handled differently by the two engines.
+    """
+
+    def __init__(self):
+        """Initialize."""
+
+        self.needs = set()
+        self.required = set([0])
+
+    def convert(self, subpattern, required=True):
+        """Convert a sequence of parsed items."""
+
+        return ''.join(self.convert_item(op, av, required) for op, av in subpattern)
+
+    def convert_class(self, items):
+        """Convert a character class."""
+
+        parts = []
+        for op, av in items:
+            if op is sre_parse.NEGATE:
+                parts.insert(0, '^')
+            elif op is sre_parse.LITERAL:
+                parts.append(escape_char(av))
+            elif op is sre_parse.RANGE:
+                parts.append('%s-%s' % (escape_char(av[0]), escape_char(av[1])))
+            elif op is sre_parse.CATEGORY and av in CATEGORIES:
+                self.needs.add('ascii')
+                parts.append(CATEGORIES[av])
+            else:
+                raise IncompatibleError(str(op))
+        return '[%s]' % ''.join(parts)
+
+    def convert_item(self, op, av, required):
+        """Convert a parsed item."""
+
+        if op is sre_parse.LITERAL:
+            return escape_char(av)
+        elif op is sre_parse.NOT_LITERAL:
+            return '[^%s]' % escape_char(av)
+        elif op is sre_parse.ANY:
+            self.needs.add('lines')
+            return '.'
+        elif op is sre_parse.IN:
+            return self.convert_class(av)
+        elif op is sre_parse.AT and av in ANCHORS:
+            anchor, need = ANCHORS[av]
+            if need is not None:
+                self.needs.add(need)
+            return anchor
+        elif op is sre_parse.BRANCH:
+            return '(?:%s)' % '|'.join(self.convert(p, False) for p in av[1])
+        elif op is sre_parse.SUBPATTERN:
+            group, p = av[0], av[-1]
+            if len(av) == 4 and (av[1] or av[2]):
+                raise IncompatibleError('scoped inline flags')
+            if group is None:
+                return '(?:%s)' % self.convert(p, required)
+            if required:
+                self.required.add(group)
+            return '(%s)' % self.convert(p, required)
+        elif op is sre_parse.MAX_REPEAT or op is sre_parse.MIN_REPEAT:
+            low, high, p = av
+            text = '(?:%s){%d,%s}' % (
+                self.convert(p, required and low > 0), low, '' if high == sre_parse.MAXREPEAT else str(high)
+            )
+            return text + '?' if op is sre_parse.MIN_REPEAT else text
+        elif op is sre_parse.GROUPREF:
+            return '\\g{%d}' % av
+        elif op is sre_parse.ASSERT:
+            return '(?%s%s)' % ('<=' if av[0] < 0 else '=', self.convert(av[1], required))
+        elif op is sre_parse.ASSERT_NOT:
+            return '(?%s%s)' % ('<!' if av[0] < 0 else '!', self.convert(av[1], False))
+        raise IncompatibleError(str(op))
+
+
+def convert_search(find, flags):
+    """
+    Convert a Python search pattern for Sublime's `find_all`.
+
+    Returns the pattern, the groups that always take part in a match, and the
+    requirements on the buffer text.  Raises `IncompatibleError` if the pattern is
+    outside of the subset both engines interpret identically.
+    """
+
+    parsed = sre_parse.parse(find, flags)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    flags = state.flags
+    if flags & ~SUPPORTED_FLAGS:
+        raise IncompatibleError('flags')
+    if not flags & re.MULTILINE:
+        raise IncompatibleError('^ and $ always match at lines')
+    if parsed.getwidth()[0] == 0:
+        # The engines step past empty matches differently
+        raise IncompatibleError('empty match')
+    converter = SearchConverter()
+    pattern = converter.convert(parsed)
+    if flags & re.IGNORECASE:
+        # Case folding only agrees on ASCII text
+        converter.needs.add('ascii')
+    prefix = '(?%s%s)' % ('i' if flags & re.IGNORECASE else '', 's' if flags & re.DOTALL else '-s')
+    return prefix + pattern, converter.required, converter.needs
+
+
+def convert_format(template, required):
+    """
+    Convert a compiled replace template to a format string for `find_all`.
+
+    Raises `IncompatibleError` if the template cannot be expressed or refers to a
+    group that may not take part in a match.
+    """
+
+    if template.constant is not None:
+        parts = [template.constant]
+    elif template.parts is not None:
+        parts = template.parts
+    else:
+        raise IncompatibleError('template')
+    fmt = []
+    for part in parts:
+        if isinstance(part, int):
+            if part not in required:
+                raise IncompatibleError('optional group %d' % part)
+            fmt.append('${%d}' % part)
+        else:
+            for c in part:
+                fmt.append('\\' + c if c in '\\$&()?:' else c)
+    return ''.join(fmt)
+
+
+def convert_rule(template, find, flags, literal):
+    """Convert a rule for Sublime's `find_all`, or return `None` if it must use the Python engine."""
+
+    try:
+        search, required, needs = convert_search(re.escape(find) if literal else find, flags)
+        fmt = convert_format(template, required)
+    except IncompatibleError:
+        return None
+    return NativeRule(search, fmt, needs)
@@ -24,11 +24,14 @@ class Plugin(object):
     """Load plugins for RegReplace."""
 
     loaded = []
+    # Keep plugins loaded between runs (a long running process reloads them explicitly)
+    keep = False
 
     @classmethod
-    def purge(cls):
+    def purge(cls, force=False):
         """Purge list of loaded plugins."""
-        cls.loaded = []
+        if force or not cls.keep:
+            cls.loaded = []
 
     @classmethod
     def get_module(cls, module_name, path_name):
@@ -58,19 +61,32 @@ class Plugin(object):
         return module
 
     @classmethod
-    def load(cls, module_name):
-        """Load module."""
+    def resource_path(cls, module_name):
+        """Get the resource path of a plugin module."""
 
         if module_name.startswith("rr_modules."):
             path_name = join("Packages", "RegReplace", normpath(module_name.replace('.', '/')))
         else:
             path_name = join("Packages", normpath(module_name.replace('.', '/')))
-        path_name += ".py"
+        return path_name + ".py"
+
+    @classmethod
+    def source(cls, module_name):
+        """Get the source of a plugin module."""
+
+        return sublime.load_resource(sublime_format_path(cls.resource_path(module_name)))
+
+    @classmethod
+    def load(cls, module_name):
+        """Load module."""
+
+        path_name = cls.resource_path(module_name)
         module = None
         if module_name in cls.loaded:
             module = cls.get_module(module_name, path_name)
         else:
             module = cls.load_module(module_name, path_name)
+            cls.loaded.append(module_name)
         return module
 
     @classmethod
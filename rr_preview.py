@@ -0,0 +1,147 @@
+"""
+Reg Replace.
+
+Live preview of a rule that is being edited.
+
+A rule is written as `/find/replace/flags` (any character can stand in for
+the slash).  Matches near the viewport are found first, straight from a
+snapshot of the buffer that is kept between keystrokes, and the rest of the
+buffer is searched in the background.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import re
+import sublime
+from RegReplace.rr_regions import RegionSet
+from RegReplace.rr_rules import search_flags
+from RegReplace.rr_template import ReplaceTemplate
+from RegReplace import rr_engines
+
+DEFAULT_PREVIEW_DELAY = 150
+# How far (in characters) the background search gets between checks for a newer rule
+CANCEL_SPAN = 4096
+RULE_FLAGS = {
+    'i': ('case', False),
+    's': ('dotall', True),
+    'l': ('literal', True)
+}
+
+
+def parse_rule(text):
+    """
+    Parse `/find/replace/flags` into a rule definition.
+
+    The delimiter can be escaped with a backslash.  Flags are `i` (ignore
+    case), `s` (dot matches newlines), and `l` (literal find).  Returns `None`
+    while there is no find pattern, and raises `ValueError` on unknown flags.
+    """
+
+    if len(text) < 2:
+        return None
+    delimiter = text[0]
+    parts = []
+    current = []
+    index = 1
+    while index < len(text):
+        c = text[index]
+        if c == '\\' and text[index + 1:index + 2] == delimiter:
+            current.append(delimiter)
+            index += 2
+            continue
+        if c == delimiter:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(c)
+        index += 1
+    parts.append(''.join(current))
+    if len(parts) > 3:
+        raise ValueError('too many %s separated parts' % delimiter)
+    if not parts[0]:
+        return None
+
+    rule = {'find': parts[0]}
+    if len(parts) > 1:
+        rule['replace'] = parts[1]
+    for flag in parts[2] if len(parts) > 2 else '':
+        if flag not in RULE_FLAGS:
+            raise ValueError('unknown flag %s' % flag)
+        key, value = RULE_FLAGS[flag]
+        rule[key] = value
+    return rule
+
+
+class Preview(object):
+    """The state of the preview of a view, kept between keystrokes."""
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+        self.generation = 0
+        self.snapshot = None
+        self.compiled = None
+
+    def touch(self):
+        """Note a new edit of the rule, making any search in progress stale."""
+
+        self.generation += 1
+        return self.generation
+
+    def text(self):
+        """Get the buffer text, only copying it again if the buffer has changed."""
+
+        change_count = self.view.change_count()
+        if self.snapshot is None or self.snapshot[0] != change_count:
+            self.snapshot = (change_count, self.view.substr(sublime.Region(0, self.view.size())))
+        return self.snapshot
+
+    def compile(self, rule, extend=False):
+        """
+        Get the compiled search pattern and replace template of a rule.
+
+        The template is `None` if the rule has no replace.  Only the last rule
+        is kept: the patterns typed on the way to a rule are not worth keeping
+        in the shared rule table.
+        """
+
+        literal = bool(rule.get('literal', False))
+        extend = extend and not literal
+        key = (rule['find'], rule.get('replace'), search_flags(rule), literal, extend)
+        if self.compiled is None or self.compiled[0] != key:
+            find = re.escape(rule['find']) if literal else rule['find']
+            pattern = rr_engines.compile_search(find, key[2], extend=extend)
+            template = None
+            if 'replace' in rule:
+                template = ReplaceTemplate(pattern, rule['replace'], extend)
+            self.compiled = (key, pattern, template)
+        return self.compiled[1:]
+
+    def find(self, pattern, text, begin=0, end=None, generation=None):
+        """
+        Find the non-empty matches in a span of the text.
+
+        The text after the span is not searched, so a match that reaches the
+        end of the span may have been cut short and is left out (unless the
+        span runs to the end of the text).  With a `generation`, the search
+        gives up (returning `None`) once the rule is edited again; the rule is
+        checked after each match that is far enough past the last check.
+        """
+
+        if end is None or end >= len(text):
+            end = len(text)
+            limit = end + 1
+        else:
+            limit = end
+        regions = RegionSet()
+        check = begin + CANCEL_SPAN
+        for m in pattern.finditer(text, begin, end):
+            start, stop = m.span(0)
+            if stop > start and stop < limit:
+                regions.add(start, stop)
+            if generation is not None and start >= check:
+                if generation != self.generation:
+                    return None
+                check = start + CANCEL_SPAN
+        return regions
@@ -0,0 +1,64 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import cProfile
+import io
+import os
+import pstats
+
+DEFAULT_LIMIT = 20
+
+
+def plugin_totals(stats, modules):
+    """
+    Total the calls and time spent in each plugin module.
+
+    Plugins are compiled with their module name as the file name,
+    so their functions can be picked out of the stats by file name.
+    """
+
+    totals = dict((module, [0, 0.0]) for module in modules)
+    for (file_name, line, name), entry in stats.stats.items():
+        if file_name in totals:
+            totals[file_name][0] += entry[1]
+            totals[file_name][1] += entry[2]
+    return totals
+
+
+def profile_call(func, path=None, limit=DEFAULT_LIMIT, modules=()):
+    """
+    Run the function under `cProfile` and return a report.
+
+    The raw stats are dumped to `path` (if given) for use with `pstats` or other viewers.
+    The report lists the top `limit` functions by cumulative time, and the time spent in
+    each of the given plugin modules.
+    """
+
+    profiler = cProfile.Profile()
+    profiler.runcall(func)
+
+    stream = io.StringIO()
+    if path:
+        try:
+            folder = os.path.dirname(path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            profiler.dump_stats(path)
+            stream.write('Stats written to: %s\n' % path)
+        except Exception as err:
+            stream.write('Could not write stats: %s\n' % str(err))
+
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+
+    if modules:
+        stream.write('Plugins\n\n')
+        stream.write('%-40s %9s %12s\n' % ('module', 'calls', 'tottime (ms)'))
+        totals = plugin_totals(stats, modules)
+        for module in sorted(totals.keys()):
+            calls, seconds = totals[module]
+            stream.write('%-40s %9d %12.2f\n' % (module, calls, seconds * 1000))
+    return stream.getvalue()
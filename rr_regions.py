@@ -0,0 +1,200 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import sublime
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class RegionSet(object):
+    """
+    Compact, sorted set of regions.
+
+    Regions are stored as begin and end offsets in two `array('q')` buffers
+    (16 bytes per region) sorted by their begin offset.  Regions are only
+    converted to `sublime.Region` objects when they are handed to the Sublime API.
+    """
+
+    def __init__(self, regions=None):
+        """Initialize."""
+
+        self.begins = array('q')
+        self.ends = array('q')
+        self.max_size = 0
+        if regions is not None:
+            self.extend(regions)
+
+    def __len__(self):
+        """Get the number of regions."""
+
+        return len(self.begins)
+
+    def __getitem__(self, index):
+        """Get the region at the given index as a (begin, end) tuple."""
+
+        return self.begins[index], self.ends[index]
+
+    def __iter__(self):
+        """Iterate the regions as (begin, end) tuples."""
+
+        return zip(self.begins, self.ends)
+
+    def __reversed__(self):
+        """Iterate the regions in reverse as (begin, end) tuples."""
+
+        return zip(reversed(self.begins), reversed(self.ends))
+
+    def __iadd__(self, regions):
+        """Add regions."""
+
+        self.extend(regions)
+        return self
+
+    def clear(self):
+        """Remove all regions."""
+
+        self.begins = array('q')
+        self.ends = array('q')
+        self.max_size = 0
+
+    def add(self, begin, end):
+        """Insert a region keeping the set sorted."""
+
+        if end < begin:
+            begin, end = end, begin
+        if end - begin > self.max_size:
+            self.max_size = end - begin
+        if not self.begins or begin >= self.begins[-1]:
+            self.begins.append(begin)
+            self.ends.append(end)
+        else:
+            index = bisect_right(self.begins, begin)
+            self.begins.insert(index, begin)
+            self.ends.insert(index, end)
+
+    def add_region(self, region):
+        """Insert a `sublime.Region`."""
+
+        self.add(region.begin(), region.end())
+
+    def extend(self, regions):
+        """
+        Add multiple regions.
+
+        Accepts other region sets, `sublime.Region` objects, or (begin, end) tuples.
+        Regions are appended, and the set is only re-sorted if they arrived out of order.
+        """
+
+        if isinstance(regions, RegionSet):
+            pairs = regions
+        else:
+            pairs = (r if isinstance(r, tuple) else (r.begin(), r.end()) for r in regions)
+
+        count = len(self.begins)
+        in_order = True
+        last = self.begins[-1] if count else None
+        for begin, end in pairs:
+            if end < begin:
+                begin, end = end, begin
+            if last is not None and begin < last:
+                in_order = False
+            last = begin
+            if end - begin > self.max_size:
+                self.max_size = end - begin
+            self.begins.append(begin)
+            self.ends.append(end)
+
+        if not in_order:
+            self.sort()
+
+    def sort(self):
+        """Sort the regions by begin (and end) offset."""
+
+        pairs = sorted(zip(self.begins, self.ends))
+        self.begins = array('q', (p[0] for p in pairs))
+        self.ends = array('q', (p[1] for p in pairs))
+
+    def merged(self):
+        """Get a new set where overlapping and adjacent regions are merged."""
+
+        merged = RegionSet()
+        begins = merged.begins
+        ends = merged.ends
+        for begin, end in self:
+            if ends and begin <= ends[-1]:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                begins.append(begin)
+                ends.append(end)
+        for begin, end in merged:
+            if end - begin > merged.max_size:
+                merged.max_size = end - begin
+        return merged
+
+    def contains(self, begin, end=None):
+        """See if the given point (or region) is contained in one of the regions."""
+
+        if end is None:
+            end = begin
+        index = bisect_right(self.begins, begin) - 1
+        # Only regions whose begin is within the largest region size can reach the target.
+        floor = begin - self.max_size
+        while index >= 0 and self.begins[index] >= floor:
+            if self.ends[index] >= end:
+                return True
+            index -= 1
+        return False
+
+    def span(self, begin, end):
+        """
+        Get the index range of the regions that may overlap or touch the given span.
+
+        Leading regions that end before the span are skipped, but the range can
+        still include a few regions in the middle that do not reach the span.
+        """
+
+        lo = bisect_left(self.begins, begin - self.max_size)
+        hi = bisect_right(self.begins, end)
+        while lo < hi and self.ends[lo] < begin:
+            lo += 1
+        return lo, hi
+
+    def to_regions(self, lo=0, hi=None):
+        """Convert the regions (or an index range of them) to `sublime.Region` objects."""
+
+        if hi is None:
+            hi = len(self.begins)
+        begins = self.begins
+        ends = self.ends
+        return [sublime.Region(begins[i], ends[i]) for i in range(lo, hi)]
+
+
+class ScopeCache(object):
+    """
+    Cache of `view.find_by_selector` results for one run.
+
+    Results are keyed by selector and the view's change count.  Any edit can
+    change the syntax scopes (removing a quote ends a string, for instance),
+    so cached regions are only reused while the view is unchanged; shifting
+    them through the engine's own edits would keep scopes that are gone.
+    """
+
+    def __init__(self, view):
+        """Initialize."""
+
+        self.view = view
+        self.entries = {}
+
+    def find_by_selector(self, selector):
+        """Get the regions of the given selector."""
+
+        change_count = self.view.change_count()
+        entry = self.entries.get(selector)
+        if entry is None or entry[0] != change_count:
+            entry = (change_count, RegionSet(self.view.find_by_selector(selector)))
+            self.entries[selector] = entry
+        return entry[1]
@@ -6,37 +6,21 @@ Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
 """
 import sublime
 import re
+from bisect import bisect_right
 from RegReplace.rr_plugin import Plugin
-from backrefs import bre
+from RegReplace.rr_rules import RuleTable
+from RegReplace.rr_native import BACKEND_PYTHON, BACKEND_NATIVE, TEXT_CHECKS
+from RegReplace.rr_engines import DEFAULT_ENGINE
+from RegReplace.rr_regions import RegionSet, ScopeCache
 import traceback
 from RegReplace.rr_notify import error
-
-
-class ScopeRepl(object):
-    """
-    Replace object for scopes.
-
-    Call on_replace event if there is a plugin to run.
-    """
-
-    def __init__(self, has_plugin, replace, expand, replace_event):
-        """Initialize."""
-
-        self.has_plugin = has_plugin
-        self.replace = replace
-        self.expand = expand
-        self.replace_event = replace_event
-
-    def repl(self, m):
-        """Apply replace."""
-
-        return self.replace_event(m) if self.has_plugin else self.expand(m, self.replace)
+from RegReplace.rr_stats import RunStats, clock
 
 
 class FindReplace(object):
     """Find and replace using regex."""
 
-    def __init__(self, view, edit, find_only, full_file, selection_only, max_sweeps, action):
+    def __init__(self, view, edit, find_only, full_file, selection_only, max_sweeps, action, settings=None):
         """Initialize find replace object."""
 
         Plugin.purge()
@@ -47,10 +31,26 @@ class FindReplace(object):
         self.selection_only = selection_only
         self.max_sweeps = max_sweeps
         self.action = action
-        self.target_regions = []
+        self.target_regions = RegionSet()
+        self.scope_cache = ScopeCache(view)
+        self.stats = RunStats()
         self.plugin = None
-        settings = sublime.load_settings('reg_replace.sublime-settings')
+        self.engine = None
+        if settings is None:
+            settings = sublime.load_settings('reg_replace.sublime-settings')
         self.extend = bool(settings.get("extended_back_references", False))
+        self.backend = settings.get("find_backend", BACKEND_PYTHON)
+        self.text_checks = {}
+        # (change count, text) of the last copy of the buffer
+        self.text = None
+
+    def buffer(self):
+        """Get the text of the buffer, copying it only if it has changed since the last copy."""
+
+        change_count = self.view.change_count()
+        if self.text is None or self.text[0] != change_count:
+            self.text = (change_count, self.view.substr(sublime.Region(0, self.view.size())))
+        return self.text[1]
 
     def view_replace(self, region, replacement):
         """
@@ -59,12 +59,27 @@ class FindReplace(object):
         Account for tab settings that can interfere with the replace.
         """
 
+        start = clock()
         tabs_to_spaces = self.view.settings().get('translate_tabs_to_spaces', False)
         if tabs_to_spaces:
             self.view.settings().set('translate_tabs_to_spaces', False)
         self.view.replace(self.edit, region, replacement)
         if tabs_to_spaces:
             self.view.settings().set('translate_tabs_to_spaces', True)
+        self.stats.add('write', clock() - start)
+
+    def write_back(self, changes):
+        """
+        Write modified regions back to the view.
+
+        `changes` is a list of (region, text) in descending order, so each replace
+        leaves the regions still to be written where they were.  Only the changed
+        regions are replaced: the text between them is never rewritten, so the
+        selections, folds, and regions of other plugins there are not moved.
+        """
+
+        for region, text in changes:
+            self.view_replace(region, text)
 
     def close(self):
         """Clean up for the object.  Mainly clean up the tracked loaded plugins."""
@@ -74,30 +89,40 @@ class FindReplace(object):
     def on_replace(self, m):
         """Run the associated plugin on the replace event."""
 
+        start = clock()
         try:
             module = Plugin.load(self.plugin)
             text = module.replace(m, **self.plugin_args)
         except Exception:
             text = m.group(0)
             print(str(traceback.format_exc()))
+        self.stats.add('plugin', clock() - start)
         return text
 
     def filter_by_selection(self, regions, extractions=None):
-        """Filter results by what is included in selected region."""
+        """
+        Filter results by what is included in selected region.
 
-        new_regions = []
-        new_extractions = []
-        idx = 0
-        sels = self.view.sel()
-        for region in regions:
-            for sel in sels:
-                if region.begin() >= sel.begin() and region.end() <= sel.end():
-                    new_regions.append(region)
-                    if extractions is not None:
-                        new_extractions.append(extractions[idx])
-                        break
-            idx += 1
-        return (new_regions, new_extractions) if extractions is not None else (new_regions, None)
+        Selections are sorted and do not overlap, so the only selection that can
+        contain a region is the last one that starts at or before it.
+        """
+
+        new_regions = RegionSet()
+        new_extractions = [] if extractions is not None else None
+        sel_begins = []
+        sel_ends = []
+        for sel in self.view.sel():
+            sel_begins.append(sel.begin())
+            sel_ends.append(sel.end())
+
+        for idx, region in enumerate(regions):
+            begin, end = region if isinstance(region, tuple) else (region.begin(), region.end())
+            index = bisect_right(sel_begins, begin) - 1
+            if index >= 0 and end <= sel_ends[index]:
+                new_regions.add(begin, end)
+                if extractions is not None:
+                    new_extractions.append(extractions[idx])
+        return new_regions, new_extractions
 
     def get_sel_point(self):
         """See if there is a cursor and get the first selections starting point."""
@@ -106,55 +131,58 @@ class FindReplace(object):
         pt = None if len(sel) == 0 else sel[0].begin()
         return pt
 
-    def qualify_by_scope(self, region, pattern):
+    def qualify_by_scope(self, begin, end, pattern):
         """Qualify the match with scopes."""
 
-        for entry in pattern:
-            # Is there something to qualify?
-            if len(entry) > 0:
-                # Initialize qualification parameters
-                qualify = True
-                pt = region.begin()
-                end = region.end()
-
-                # Disqualify if entirely of scope
-                if entry.startswith('-!'):
-                    entry = entry.lstrip('-!')
-                    qualify = False
-                    while pt < end:
-                        if self.view.score_selector(pt, entry) == 0:
-                            qualify = True
-                            break
-                        pt += 1
-                # Disqualify if one or more instances of scope
-                elif entry.startswith('-'):
-                    entry = entry.lstrip('-')
-                    while pt < end:
-                        if self.view.score_selector(pt, entry):
-                            qualify = False
-                            break
-                        pt += 1
-                # Qualify if entirely of scope
-                elif entry.startswith('!'):
-                    entry = entry.lstrip('!')
-                    while pt < end:
-                        if self.view.score_selector(pt, entry) == 0:
-                            qualify = False
-                            break
-                        pt += 1
-                # Qualify if one or more instances of scope
-                else:
-                    qualify = False
-                    while pt < end:
-                        if self.view.score_selector(pt, entry):
-                            qualify = True
-                            break
-                        pt += 1
-                # If qualificatin of one fails, bail
-                if qualify is False:
-                    return qualify
-        # Qualification completed successfully
-        return True
+        start = clock()
+        try:
+            for entry in pattern:
+                # Is there something to qualify?
+                if len(entry) > 0:
+                    # Initialize qualification parameters
+                    qualify = True
+                    pt = begin
+
+                    # Disqualify if entirely of scope
+                    if entry.startswith('-!'):
+                        entry = entry.lstrip('-!')
+                        qualify = False
+                        while pt < end:
+                            if self.view.score_selector(pt, entry) == 0:
+                                qualify = True
+                                break
+                            pt += 1
+                    # Disqualify if one or more instances of scope
+                    elif entry.startswith('-'):
+                        entry = entry.lstrip('-')
+                        while pt < end:
+                            if self.view.score_selector(pt, entry):
+                                qualify = False
+                                break
+                            pt += 1
+                    # Qualify if entirely of scope
+                    elif entry.startswith('!'):
+                        entry = entry.lstrip('!')
+                        while pt < end:
+                            if self.view.score_selector(pt, entry) == 0:
+                                qualify = False
+                                break
+                            pt += 1
+                    # Qualify if one or more instances of scope
+                    else:
+                        qualify = False
+                        while pt < end:
+                            if self.view.score_selector(pt, entry):
+                                qualify = True
+                                break
+                            pt += 1
+                    # If qualificatin of one fails, bail
+                    if qualify is False:
+                        return qualify
+            # Qualification completed successfully
+            return True
+        finally:
+            self.stats.add('scope', clock() - start)
 
     def greedy_replace(self, replace, regions, scope_filter):
         """Perform a greedy replace."""
@@ -162,20 +190,24 @@ class FindReplace(object):
         # Initialize replace
         replaced = 0
         count = len(regions) - 1
+        found = []
 
         # Step through all targets and qualify them for replacement
-        for region in reversed(regions):
+        for begin, end in reversed(regions):
             # Does the scope qualify?
-            qualify = self.qualify_by_scope(region, scope_filter) if scope_filter is not None else True
+            qualify = self.qualify_by_scope(begin, end, scope_filter) if scope_filter is not None else True
             if qualify:
                 replaced += 1
                 if self.find_only or self.action is not None:
                     # If "find only" or replace action is overridden, just track regions
-                    self.target_regions.append(region)
+                    found.append((begin, end))
                 else:
                     # Apply replace
-                    self.view_replace(region, replace[count])
+                    self.view_replace(sublime.Region(begin, end), replace[count])
             count -= 1
+
+        if found:
+            self.target_regions.extend(reversed(found))
         return replaced
 
     def non_greedy_replace(self, replace, regions, scope_filter):
@@ -194,7 +226,7 @@ class FindReplace(object):
         count = 0
         for region in regions:
             # Does the scope qualify?
-            qualify = self.qualify_by_scope(region, scope_filter) if scope_filter is not None else True
+            qualify = self.qualify_by_scope(region[0], region[1], scope_filter) if scope_filter is not None else True
             if qualify:
                 # Update as new replacement candidate
                 selected_region = region
@@ -210,9 +242,11 @@ class FindReplace(object):
             for region in reversed(regions):
                 # Make sure we are not checking previously checked regions
                 # And check if region contained after start of selection?
-                if reverse_count >= count and region.end() - 1 >= pt:
+                if reverse_count >= count and region[1] - 1 >= pt:
                     # Does the scope qualify?
-                    qualify = self.qualify_by_scope(region, scope_filter) if scope_filter is not None else True
+                    qualify = (
+                        self.qualify_by_scope(region[0], region[1], scope_filter) if scope_filter is not None else True
+                    )
                     if qualify:
                         # Update as new replacement candidate
                         selected_region = region
@@ -226,54 +260,92 @@ class FindReplace(object):
         if selected_region is not None:
             # Show Instance
             replaced += 1
-            self.view.show(selected_region.begin())
+            self.view.show(selected_region[0])
             if self.find_only or self.action is not None:
                 # If "find only" or replace action is overridden, just track regions
-                self.target_regions.append(selected_region)
+                self.target_regions.add(selected_region[0], selected_region[1])
             else:
                 # Apply replace
-                self.view_replace(selected_region, replace[selection_index])
+                self.view_replace(sublime.Region(selected_region[0], selected_region[1]), replace[selection_index])
         return replaced
 
-    def expand(self, m, replace):
-        """Apply replace."""
-
-        if self.extend:
-            return self.template(m)
-        else:
-            return m.expand(replace)
-
     def regex_findall(self, find, flags, replace, extractions, literal=False, sel=None):
         """Findall with regex."""
 
-        regions = []
+        regions = RegionSet()
         offset = 0
+        flags |= re.MULTILINE
+        start = clock()
+        pattern = RuleTable.compile_search(find, flags, literal, self.extend and not literal, self.engine)
+        template = RuleTable.compile_replace(pattern, replace, self.extend and not literal)
+        self.stats.add('compile', clock() - start)
+
+        mark = self.stats.mark()
         if sel is not None:
             offset = sel.begin()
             bfr = self.view.substr(sublime.Region(offset, sel.end()))
         else:
-            bfr = self.view.substr(sublime.Region(0, self.view.size()))
-        flags |= re.MULTILINE
-        if literal:
-            find = re.escape(find)
-        if self.extend and not literal:
-            pattern = bre.compile_search(find, flags)
-            self.template = bre.compile_replace(pattern, replace)
-        else:
-            pattern = re.compile(find, flags)
-        for m in pattern.finditer(bfr):
-            regions.append(sublime.Region(offset + m.start(0), offset + m.end(0)))
-            if self.plugin is not None:
+            bfr = self.buffer()
+        if self.plugin is not None:
+            for m in pattern.finditer(bfr):
+                regions.add(offset + m.start(0), offset + m.end(0))
                 extractions.append(self.on_replace(m))
-            else:
-                extractions.append(self.expand(m, replace))
+        elif template.constant is not None:
+            # Constant replace; no need to expand each match
+            for m in pattern.finditer(bfr):
+                regions.add(offset + m.start(0), offset + m.end(0))
+            extractions.extend([template.constant] * len(regions))
+        else:
+            for m in pattern.finditer(bfr):
+                regions.add(offset + m.start(0), offset + m.end(0))
+                extractions.append(template.expand(m))
+        self.stats.add_since('scan', mark)
+        self.stats.count(matches=len(regions))
+        return regions
+
+    def text_allows(self, needs):
+        """Check the buffer text meets the requirements of a native rule (one native search per requirement)."""
+
+        change_count = self.view.change_count()
+        for need in needs:
+            key = (need, change_count)
+            if key not in self.text_checks:
+                found = self.view.find(TEXT_CHECKS[need], 0)
+                self.text_checks[key] = found is None or found.begin() == -1
+            if not self.text_checks[key]:
+                return False
+        return True
+
+    def native_findall(self, find, flags, replace, extractions, literal=False):
+        """
+        Findall with Sublime's `find_all`.
+
+        The buffer is not copied and the matches and their replacements are found
+        natively.  If the rule or the buffer text is not compatible, `None` is
+        returned and the Python engine is used instead.
+        """
+
+        if self.extend and not literal:
+            return None
+        flags |= re.MULTILINE
+        start = clock()
+        native = RuleTable.compile_native(find, flags, literal, replace)
+        self.stats.add('compile', clock() - start)
+        if native is None or not self.text_allows(native.needs):
+            return None
+
+        mark = self.stats.mark()
+        regions = RegionSet()
+        regions.extend(self.view.find_all(native.pattern, 0, native.format, extractions))
+        self.stats.add_since('scan', mark)
+        self.stats.count(matches=len(regions))
         return regions
 
     def apply(self, pattern):
         """Normal find and replace."""
 
         # Initialize replacement variables
-        regions = []
+        regions = RegionSet()
         flags = 0
         replaced = 0
 
@@ -287,6 +359,9 @@ class FindReplace(object):
         scope_filter = pattern['scope_filter'] if 'scope_filter' in pattern else []
         self.plugin = pattern.get("plugin", None)
         self.plugin_args = pattern.get("args", {})
+        self.engine = pattern.get("engine", None)
+        native = pattern.get('find_backend', self.backend) == BACKEND_NATIVE
+        native = native and self.plugin is None and self.engine in (None, DEFAULT_ENGINE)
 
         # Ignore Case?
         if not case:
@@ -305,19 +380,22 @@ class FindReplace(object):
         # Find and format replacements
         extractions = []
         try:
-            # regions = self.view.find_all(find, flags, replace, extractions)
             if self.selection_only and not self.full_file:
                 for sel in sels:
                     regions += self.regex_findall(find, flags, replace, extractions, literal, sel)
             else:
-                regions = self.regex_findall(find, flags, replace, extractions, literal)
+                regions = self.native_findall(find, flags, replace, extractions, literal) if native else None
+                if regions is None:
+                    regions = self.regex_findall(find, flags, replace, extractions, literal)
         except Exception as err:
             print(str(traceback.format_exc()))
             error('REGEX ERROR: %s' % str(err))
             return replaced
 
         if self.selection_only and self.full_file:
+            start = clock()
             regions, extractions = self.filter_by_selection(regions, extractions)
+            self.stats.add('scope', clock() - start)
 
         # Where there any regions found?
         if len(regions) > 0:
@@ -341,35 +419,35 @@ class FindReplace(object):
 
         return replaced
 
-    def apply_scope_regex(self, string, re_find, replace, greedy_replace, multi):
+    def apply_scope_regex(self, string, pattern, repl, greedy_replace, multi):
         """Apply regex on a scope."""
 
         replaced = 0
         extraction = string
 
-        scope_repl = ScopeRepl(self.plugin, replace, self.expand, self.on_replace)
-        if self.extend:
-            pattern = bre.compile_search(re_find)
-            self.template = bre.compile_replace(pattern, replace)
-        else:
-            pattern = re.compile(re_find)
         if multi and not self.find_only and self.action is None:
             extraction, replaced = self.apply_multi_pass_scope_regex(
-                pattern, extraction, scope_repl.repl, greedy_replace
+                pattern, extraction, repl, greedy_replace
             )
         else:
             if greedy_replace:
-                extraction, replaced = pattern.subn(scope_repl.repl, string)
+                extraction, replaced = pattern.subn(repl, string)
             else:
-                extraction, replaced = pattern.subn(scope_repl.repl, string, 1)
+                extraction, replaced = pattern.subn(repl, string, 1)
         return extraction, replaced
 
     def apply_multi_pass_scope_regex(self, pattern, extraction, repl, greedy_replace):
-        """Use a multi-pass scope regex."""
+        """
+        Use a multi-pass scope regex.
+
+        Sweeps stop when nothing is replaced, or when the extraction returns to
+        a previous state (rewritten to itself, or cycling between states).
+        """
 
         multi_replaced = 0
         count = 0
         total_replaced = 0
+        states = {hash(extraction): 0}
         while count < self.max_sweeps:
             count += 1
             if greedy_replace:
@@ -379,33 +457,44 @@ class FindReplace(object):
             if multi_replaced == 0:
                 break
             total_replaced += multi_replaced
+            state = hash(extraction)
+            if state in states:
+                self.stats.cycle(count - states[state])
+                break
+            states[state] = count
         return extraction, total_replaced
 
-    def greedy_scope_literal_replace(self, regions, find, replace, greedy_replace):
+    def literal_scope_replace(self, extraction, find, replace, greedy_replace):
+        """Apply a literal replace on a scope."""
+
+        replaced = 0
+        if find in extraction:
+            replaced = 1
+            if greedy_replace:
+                extraction = extraction.replace(find, replace)
+            else:
+                extraction = extraction.replace(find, replace, 1)
+        return extraction, replaced
+
+    def greedy_scope_literal_replace(self, bfr, regions, find, replace, greedy_replace):
         """Greedy literal scope replace."""
 
         total_replaced = 0
+        changes = []
         for region in reversed(regions):
-            extraction = self.view.substr(region)
-            replaced = 0
-            try:
-                extraction.index(find)
-                replaced = 1
-                if greedy_replace:
-                    extraction = extraction.replace(find, replace)
-                else:
-                    extraction = extraction.replace(find, replace, 1)
-            except ValueError:
-                pass
+            extraction, replaced = self.literal_scope_replace(
+                bfr[region.begin():region.end()], find, replace, greedy_replace
+            )
             if replaced > 0:
                 total_replaced += 1
                 if self.find_only or self.action is not None:
-                    self.target_regions.append(region)
+                    self.target_regions.add_region(region)
                 else:
-                    self.view_replace(region, extraction)
+                    changes.append((region, extraction))
+        self.write_back(changes)
         return total_replaced
 
-    def non_greedy_scope_literal_replace(self, regions, find, replace, greedy_replace):
+    def non_greedy_scope_literal_replace(self, bfr, regions, find, replace, greedy_replace):
         """Non greedy literal scope replace."""
 
         # Initialize replace
@@ -421,20 +510,12 @@ class FindReplace(object):
         # Intialize with first qualifying region for wrapping and the case of no cursor in view
         count = 0
         for region in regions:
-            extraction = self.view.substr(region)
-            replaced = 0
-            try:
-                extraction.index(find)
-                replaced = 1
-                if greedy_replace:
-                    extraction = extraction.replace(find, replace)
-                else:
-                    extraction = extraction.replace(find, replace, 1)
-            except ValueError:
-                pass
+            extraction, replaced = self.literal_scope_replace(
+                bfr[region.begin():region.end()], find, replace, greedy_replace
+            )
             if replaced > 0:
                 selected_region = region
-                selected_extraction = extraction
+                selected_extraction = first_extraction = extraction
                 break
             else:
                 count += 1
@@ -446,22 +527,19 @@ class FindReplace(object):
             for region in reversed(regions):
                 # Make sure we are not checking previously checked regions
                 # And check if region contained after start of selection?
-                if reverse_count >= count and region.end() - 1 >= pt:
-                    extraction = self.view.substr(region)
-                    replaced = 0
-                    try:
-                        extraction.index(find)
-                        replaced = 1
-                        if greedy_replace:
-                            extraction = extraction.replace(find, replace)
-                        else:
-                            extraction = extraction.replace(find, replace, 1)
-                    except ValueError:
-                        pass
+                if reverse_count > count and region.end() - 1 >= pt:
+                    extraction, replaced = self.literal_scope_replace(
+                        bfr[region.begin():region.end()], find, replace, greedy_replace
+                    )
                     if replaced > 0:
                         selected_region = region
                         selected_extraction = extraction
                     reverse_count -= 1
+                elif reverse_count == count and region.end() - 1 >= pt:
+                    # Already evaluated in the first sweep
+                    selected_region = region
+                    selected_extraction = first_extraction
+                    break
                 else:
                     break
 
@@ -472,35 +550,38 @@ class FindReplace(object):
             self.view.show(selected_region.begin())
             if self.find_only or self.action is not None:
                 # If "find only" or replace action is overridden, just track regions
-                self.target_regions.append(selected_region)
+                self.target_regions.add_region(selected_region)
             else:
                 # Apply replace
                 self.view_replace(selected_region, selected_extraction)
         return total_replaced
 
-    def greedy_scope_replace(self, regions, re_find, replace, greedy_replace, multi):
+    def greedy_scope_replace(self, bfr, regions, re_find, repl, greedy_replace, multi):
         """Greedy scope replace."""
 
         total_replaced = 0
+        changes = []
         try:
             for region in reversed(regions):
                 replaced = 0
-                string = self.view.substr(region)
-                extraction, replaced = self.apply_scope_regex(string, re_find, replace, greedy_replace, multi)
+                string = bfr[region.begin():region.end()]
+                extraction, replaced = self.apply_scope_regex(string, re_find, repl, greedy_replace, multi)
                 if replaced > 0:
                     total_replaced += 1
                     if self.find_only or self.action is not None:
-                        self.target_regions.append(region)
+                        self.target_regions.add_region(region)
                     else:
-                        self.view_replace(region, extraction)
+                        changes.append((region, extraction))
         except Exception as err:
             print(str(traceback.format_exc()))
             error('REGEX ERROR: %s' % str(err))
+            self.write_back(changes)
             return total_replaced
 
+        self.write_back(changes)
         return total_replaced
 
-    def non_greedy_scope_replace(self, regions, re_find, replace, greedy_replace, multi):
+    def non_greedy_scope_replace(self, bfr, regions, re_find, repl, greedy_replace, multi):
         """Non greedy scope replace."""
 
         # Initialize replace
@@ -517,11 +598,11 @@ class FindReplace(object):
         count = 0
         try:
             for region in regions:
-                string = self.view.substr(region)
-                extraction, replaced = self.apply_scope_regex(string, re_find, replace, greedy_replace, multi)
+                string = bfr[region.begin():region.end()]
+                extraction, replaced = self.apply_scope_regex(string, re_find, repl, greedy_replace, multi)
                 if replaced > 0:
                     selected_region = region
-                    selected_extraction = extraction
+                    selected_extraction = first_extraction = extraction
                     break
                 else:
                     count += 1
@@ -538,13 +619,18 @@ class FindReplace(object):
                 for region in reversed(regions):
                     # Make sure we are not checking previously checked regions
                     # And check if region contained after start of selection?
-                    if reverse_count >= count and region.end() - 1 >= pt:
-                        string = self.view.substr(region)
-                        extraction, replaced = self.apply_scope_regex(string, re_find, replace, greedy_replace, multi)
+                    if reverse_count > count and region.end() - 1 >= pt:
+                        string = bfr[region.begin():region.end()]
+                        extraction, replaced = self.apply_scope_regex(string, re_find, repl, greedy_replace, multi)
                         if replaced > 0:
                             selected_region = region
                             selected_extraction = extraction
                         reverse_count -= 1
+                    elif reverse_count == count and region.end() - 1 >= pt:
+                        # Already evaluated in the first sweep
+                        selected_region = region
+                        selected_extraction = first_extraction
+                        break
                     else:
                         break
         except Exception as err:
@@ -559,7 +645,7 @@ class FindReplace(object):
             self.view.show(selected_region.begin())
             if self.find_only or self.action is not None:
                 # If "find only" or replace action is overridden, just track regions
-                self.target_regions.append(selected_region)
+                self.target_regions.add_region(selected_region)
             else:
                 # Apply replace
                 self.view_replace(selected_region, selected_extraction)
@@ -568,10 +654,12 @@ class FindReplace(object):
     def select_scope_regions(self, regions, greedy_scope):
         """Select scope region."""
 
+        # The non-greedy branch only counts up from here
+        replaced = 0
         if greedy_scope:
             # Greedy scope; return all scopes
             replaced = len(regions)
-            self.target_regions += regions
+            self.target_regions.extend(regions)
         else:
             # Non-greedy scope; return first valid scope
             # If cannot find first valid scope after cursor
@@ -600,7 +688,7 @@ class FindReplace(object):
             if selected_region is not None:
                 replaced += 1
                 self.view.show(selected_region.begin())
-                self.target_regions += [selected_region]
+                self.target_regions.add_region(selected_region)
 
         return replaced
 
@@ -623,9 +711,10 @@ class FindReplace(object):
         dotall = bool(pattern['dotall']) if 'dotall' in pattern else False
         self.plugin = pattern.get("plugin", None)
         self.plugin_args = pattern.get("args", {})
+        self.engine = pattern.get("engine", None)
 
         if scope is None or scope == '':
-            return replace
+            return replaced
 
         if self.selection_only:
             sels = self.view.sel()
@@ -635,13 +724,22 @@ class FindReplace(object):
                 sel_start.append(s.begin())
                 sel_size.append(s.size())
 
-        regions = self.view.find_by_selector(scope)
+        start = clock()
+        regions = self.scope_cache.find_by_selector(scope)
 
         if self.selection_only:
             regions = self.filter_by_selection(regions)[0]
+        regions = regions.to_regions()
+        self.stats.add('scope', clock() - start)
+        self.stats.count(matches=len(regions))
 
         # Find supplied?
         if find is not None:
+            mark = self.stats.mark()
+
+            # Take one snapshot of the buffer; scope regions are slices of it
+            bfr = self.buffer() if regions else ''
+
             # Compile regex: Ignore case flag?
             if not literal:
                 try:
@@ -650,10 +748,13 @@ class FindReplace(object):
                         flags |= re.IGNORECASE
                     if dotall:
                         flags |= re.DOTALL
-                    if self.extend:
-                        re_find = bre.compile_search(find, flags)
+                    start = clock()
+                    re_find = RuleTable.compile_search(find, flags, False, self.extend, self.engine)
+                    if self.plugin:
+                        repl = self.on_replace
                     else:
-                        re_find = re.compile(find, flags)
+                        repl = RuleTable.compile_replace(re_find, replace, self.extend).repl()
+                    self.stats.add('compile', clock() - start)
                 except Exception as err:
                     print(str(traceback.format_exc()))
                     error('REGEX ERROR: %s' % str(err))
@@ -661,14 +762,15 @@ class FindReplace(object):
 
                 # Greedy Scope?
                 if greedy_scope:
-                    replaced = self.greedy_scope_replace(regions, re_find, replace, greedy_replace, multi)
+                    replaced = self.greedy_scope_replace(bfr, regions, re_find, repl, greedy_replace, multi)
                 else:
-                    replaced = self.non_greedy_scope_replace(regions, re_find, replace, greedy_replace, multi)
+                    replaced = self.non_greedy_scope_replace(bfr, regions, re_find, repl, greedy_replace, multi)
             else:
                 if greedy_scope:
-                    replaced = self.greedy_scope_literal_replace(regions, find, replace, greedy_replace)
+                    replaced = self.greedy_scope_literal_replace(bfr, regions, find, replace, greedy_replace)
                 else:
-                    replaced = self.non_greedy_scope_literal_replace(regions, find, replace, greedy_replace)
+                    replaced = self.non_greedy_scope_literal_replace(bfr, regions, find, replace, greedy_replace)
+            self.stats.add_since('scan', mark)
         else:
             replaced = self.select_scope_regions(regions, greedy_scope)
 
@@ -686,7 +788,263 @@ class FindReplace(object):
 
         return replaced
 
-    def search(self, pattern, scope=False):
+    def compile_find(self, pattern, flags):
+        """Compile the find pattern of a rule for counting or exporting, or get `None` if it fails."""
+
+        literal = bool(pattern['literal']) if 'literal' in pattern else False
+        if not (bool(pattern['case']) if 'case' in pattern else True):
+            flags |= re.IGNORECASE
+        if bool(pattern['dotall']) if 'dotall' in pattern else False:
+            flags |= re.DOTALL
+        try:
+            start = clock()
+            re_find = RuleTable.compile_search(
+                pattern['find'], flags, literal, self.extend and not literal, pattern.get('engine')
+            )
+            self.stats.add('compile', clock() - start)
+        except Exception as err:
+            print(str(traceback.format_exc()))
+            error('REGEX ERROR: %s' % str(err))
+            return None
+        return re_find
+
+    def rule_matches(self, pattern, re_find):
+        """
+        Generate the (begin, end, match) of every match of a normal rule.
+
+        Selections and scope filters are honored.  Matches are generated as
+        they are found; no regions or extractions are kept.
+        """
+
+        scope_filter = pattern['scope_filter'] if 'scope_filter' in pattern else []
+        bfr = self.buffer()
+        if self.selection_only and not self.full_file:
+            spans = [(s.begin(), s.end()) for s in self.view.sel()]
+        else:
+            spans = [(0, len(bfr))]
+        sel_begins = []
+        sel_ends = []
+        if self.selection_only and self.full_file:
+            for sel in self.view.sel():
+                sel_begins.append(sel.begin())
+                sel_ends.append(sel.end())
+
+        for offset, limit in spans:
+            text = bfr if offset == 0 and limit == len(bfr) else bfr[offset:limit]
+            for m in re_find.finditer(text):
+                begin, end = offset + m.start(0), offset + m.end(0)
+                if sel_begins:
+                    index = bisect_right(sel_begins, begin) - 1
+                    if index < 0 or end > sel_ends[index]:
+                        continue
+                if scope_filter and not self.qualify_by_scope(begin, end, scope_filter):
+                    continue
+                yield begin, end, m
+
+    def scope_regions(self, pattern):
+        """Get the scope regions of a scope rule for counting or exporting."""
+
+        start = clock()
+        regions = self.scope_cache.find_by_selector(pattern['scope'])
+        if self.selection_only:
+            regions = self.filter_by_selection(regions)[0]
+        self.stats.add('scope', clock() - start)
+        return regions
+
+    def scope_rule_matches(self, pattern, regions, re_find, bfr):
+        """
+        Generate the (begin, end, match) of every match of `find` in the scope regions of a scope rule.
+
+        Literal finds are located with string searches and have no match object.
+        """
+
+        find = pattern['find']
+        literal = bool(pattern['literal']) if 'literal' in pattern else False
+        for begin, end in regions:
+            if literal:
+                index = bfr.find(find, begin, end)
+                while index != -1:
+                    yield index, index + len(find), None
+                    index = bfr.find(find, index + (len(find) or 1), end)
+            else:
+                for m in re_find.finditer(bfr[begin:end]):
+                    yield begin + m.start(0), begin + m.end(0), m
+
+    def count_matches(self, pattern):
+        """
+        Count the matches of a normal rule.
+
+        Matches are counted as they are found; no regions or extractions are kept.
+        """
+
+        count = 0
+        re_find = self.compile_find(pattern, re.MULTILINE)
+        if re_find is None:
+            return count
+
+        mark = self.stats.mark()
+        for _ in self.rule_matches(pattern, re_find):
+            count += 1
+        self.stats.add_since('scan', mark)
+        return count
+
+    def count_scope_matches(self, pattern):
+        """
+        Count the matches of a scope rule.
+
+        Without a find pattern, each scope region counts as one match.
+        """
+
+        count = 0
+        scope = pattern['scope']
+        literal = bool(pattern['literal']) if 'literal' in pattern else False
+
+        if scope is None or scope == '':
+            return count
+
+        regions = self.scope_regions(pattern)
+        if pattern.get('find') is None:
+            return len(regions)
+
+        re_find = None
+        if not literal:
+            re_find = self.compile_find(pattern, 0)
+            if re_find is None:
+                return count
+
+        mark = self.stats.mark()
+        bfr = self.buffer() if regions else ''
+        for _ in self.scope_rule_matches(pattern, regions, re_find, bfr):
+            count += 1
+        self.stats.add_since('scan', mark)
+        return count
+
+    def export_matches(self, pattern, name, write):
+        """
+        Write every match of a normal rule, with its proposed replacement, as it is found.
+
+        `write` is called with the rule name, the match offsets, the matched text,
+        and the replacement.  Plugins are run to get their replacements.
+        """
+
+        count = 0
+        re_find = self.compile_find(pattern, re.MULTILINE)
+        if re_find is None:
+            return count
+        replace = pattern['replace'] if 'replace' in pattern else '\\0'
+        literal = bool(pattern['literal']) if 'literal' in pattern else False
+        self.plugin = pattern.get("plugin", None)
+        self.plugin_args = pattern.get("args", {})
+        if self.plugin is None:
+            repl = RuleTable.compile_replace(re_find, replace, self.extend and not literal).expand
+        else:
+            repl = self.on_replace
+
+        mark = self.stats.mark()
+        for begin, end, m in self.rule_matches(pattern, re_find):
+            write(name, begin, end, m.group(0), self.export_replacement(repl, m))
+            count += 1
+        self.stats.add_since('scan', mark)
+        return count
+
+    def export_scope_matches(self, pattern, name, write):
+        """
+        Write every match of a scope rule, with its proposed replacement, as it is found.
+
+        Without a find pattern, each scope region is a match with no replacement.
+        """
+
+        count = 0
+        scope = pattern['scope']
+        literal = bool(pattern['literal']) if 'literal' in pattern else False
+        replace = pattern['replace'] if 'replace' in pattern else '\\0'
+
+        if scope is None or scope == '':
+            return count
+
+        regions = self.scope_regions(pattern)
+        bfr = self.buffer() if regions else ''
+        if pattern.get('find') is None:
+            for begin, end in regions:
+                write(name, begin, end, bfr[begin:end], None)
+            return len(regions)
+
+        re_find = None
+        repl = None
+        if not literal:
+            re_find = self.compile_find(pattern, 0)
+            if re_find is None:
+                return count
+            self.plugin = pattern.get("plugin", None)
+            self.plugin_args = pattern.get("args", {})
+            if self.plugin:
+                repl = self.on_replace
+            else:
+                repl = RuleTable.compile_replace(re_find, replace, self.extend).repl()
+
+        mark = self.stats.mark()
+        for begin, end, m in self.scope_rule_matches(pattern, regions, re_find, bfr):
+            if m is None:
+                write(name, begin, end, bfr[begin:end], replace)
+            else:
+                write(name, begin, end, m.group(0), self.export_replacement(repl, m))
+            count += 1
+        self.stats.add_since('scan', mark)
+        return count
+
+    def export_replacement(self, repl, m):
+        """
+        Get the proposed replacement of a match.
+
+        A template that cannot be expanded is reported once, and its matches are
+        exported without a replacement.
+        """
+
+        if self.export_failed:
+            return None
+        if not callable(repl):
+            return repl
+        try:
+            return repl(m)
+        except Exception as err:
+            print(str(traceback.format_exc()))
+            error('REGEX ERROR: %s' % str(err))
+            self.export_failed = True
+            return None
+
+    def count(self, pattern, scope=False, name=None):
+        """Count the matches of the given pattern without replacing, highlighting, or running plugins."""
+
+        if name is None:
+            name = pattern.get('scope' if scope else 'find', '')
+        self.stats.begin(name, 1, self.view.size())
+        matches = self.count_scope_matches(pattern) if scope else self.count_matches(pattern)
+        self.stats.count(matches=matches)
+        self.stats.end()
+        return matches
+
+    def export(self, pattern, scope=False, name=None, write=None):
+        """Write the matches of the given pattern, with their replacements, without replacing or highlighting."""
+
+        if name is None:
+            name = pattern.get('scope' if scope else 'find', '')
+        self.stats.begin(name, 1, self.view.size())
+        self.export_failed = False
+        if scope:
+            matches = self.export_scope_matches(pattern, name, write)
+        else:
+            matches = self.export_matches(pattern, name, write)
+        self.stats.count(matches=matches)
+        self.stats.end()
+        return matches
+
+    def search(self, pattern, scope=False, name=None, sweep=1):
         """Search with the given patter."""
 
-        return self.scope_apply(pattern) if scope else self.apply(pattern)
+        if name is None:
+            name = pattern.get('scope' if scope else 'find', '')
+        self.stats.begin(name, sweep, self.view.size())
+        replaced = self.scope_apply(pattern) if scope else self.apply(pattern)
+        self.stats.count(replaced=replaced)
+        self.stats.end()
+        return replaced
@@ -0,0 +1,211 @@
+"""
+Reg Replace.
+
+List every match of a find as `line:col: snippet` in a paginated results
+panel, or export them to a JSON lines file.
+
+Rows and columns come from an index of the line starts, built once per
+buffer snapshot, so that placing a match is a binary search instead of a
+call into the view.  Only the page being shown is formatted.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import json
+import re
+from bisect import bisect_right
+from RegReplace.rr_rules import LRUCache
+
+DEFAULT_PAGE_SIZE = 1000
+SNIPPET_LENGTH = 120
+SNIPPET_CONTEXT = 40
+# Title, blank line, file line, blank line
+HEADER_ROWS = 4
+# Most line indexes kept (the index of a large buffer is as big as the list of its lines)
+MAX_LINE_INDEXES = 4
+RE_NEWLINE = re.compile('\n')
+
+
+class LineIndex(object):
+    """Offsets of the line starts of a buffer snapshot."""
+
+    # The last index built for each of the views used most recently: view id -> (change count, index)
+    cache = LRUCache(MAX_LINE_INDEXES)
+
+    def __init__(self, text):
+        """Find the line starts."""
+
+        self.starts = [0]
+        self.starts.extend(m.end() for m in RE_NEWLINE.finditer(text))
+
+    @classmethod
+    def get(cls, view_id, change_count, text):
+        """Get the index of a view's snapshot, building it only if the buffer has changed."""
+
+        cached = cls.cache.get(view_id)
+        if cached is not None and cached[0] == change_count:
+            return cached[1]
+        index = cls(text)
+        cls.cache[view_id] = (change_count, index)
+        return index
+
+    @classmethod
+    def forget(cls, view_id):
+        """Drop the index of a closed view."""
+
+        cls.cache.pop(view_id, None)
+
+    def __len__(self):
+        """Get the number of lines."""
+
+        return len(self.starts)
+
+    def rowcol(self, pt):
+        """Get the zero based row and column of a point."""
+
+        row = bisect_right(self.starts, pt) - 1
+        return row, pt - self.starts[row]
+
+    def line(self, row, size):
+        """Get the (begin, end) offsets of a row, without its newline."""
+
+        begin = self.starts[row]
+        end = self.starts[row + 1] - 1 if row + 1 < len(self.starts) else size
+        return begin, end
+
+
+def snippet(text, begin, end, col):
+    """Get the text of a line, cut down to the part around a column if it is long."""
+
+    if end - begin <= SNIPPET_LENGTH:
+        return text[begin:end]
+    start = max(min(begin + col - SNIPPET_CONTEXT, end - SNIPPET_LENGTH), begin)
+    stop = min(start + SNIPPET_LENGTH, end)
+    return ('...' if start > begin else '') + text[start:stop] + ('...' if stop < end else '')
+
+
+class MatchList(object):
+    """The matches of a find, listed a page at a time."""
+
+    # The list shown in the results panel of each window: window id -> list
+    panels = {}
+
+    def __init__(self, view_id, file_name, change_count, text, regions, page_size=DEFAULT_PAGE_SIZE):
+        """Keep the buffer snapshot and the (sorted) regions found in it."""
+
+        self.view_id = view_id
+        self.file_name = file_name
+        self.change_count = change_count
+        self.text = text
+        self.regions = regions
+        self.lines = LineIndex.get(view_id, change_count, text)
+        self.page_size = max(int(page_size), 1)
+        self.page = 0
+
+    @classmethod
+    def forget(cls, view_id):
+        """Drop the lists of a closed view."""
+
+        for window_id, matches in list(cls.panels.items()):
+            if matches.view_id == view_id:
+                del cls.panels[window_id]
+
+    def __len__(self):
+        """Get the number of matches."""
+
+        return len(self.regions)
+
+    def pages(self):
+        """Get the number of pages."""
+
+        return max((len(self.regions) + self.page_size - 1) // self.page_size, 1)
+
+    def turn(self, page):
+        """
+        Change the current page.
+
+        `page` is `next`, `previous`, `first`, `last`, or a one based page number.
+        Returns whether the page changed.
+        """
+
+        last = self.pages() - 1
+        if page == 'next':
+            target = self.page + 1
+        elif page == 'previous':
+            target = self.page - 1
+        elif page == 'first':
+            target = 0
+        elif page == 'last':
+            target = last
+        else:
+            target = int(page) - 1
+        target = min(max(target, 0), last)
+        changed = target != self.page
+        self.page = target
+        return changed
+
+    def render(self):
+        """Format the current page."""
+
+        count = len(self.regions)
+        lo = self.page * self.page_size
+        hi = min(lo + self.page_size, count)
+        text = self.text
+        size = len(text)
+        rows = [
+            'RegReplace Matches',
+            '',
+            '%s: %d matches; page %d of %d; matches %d-%d;' % (
+                self.file_name or 'untitled', count, self.page + 1, self.pages(), lo + 1 if count else 0, hi
+            ),
+            ''
+        ]
+        for index in range(lo, hi):
+            begin = self.regions[index][0]
+            row, col = self.lines.rowcol(begin)
+            line_begin, line_end = self.lines.line(row, size)
+            rows.append('%6d:%d: %s' % (row + 1, col + 1, snippet(text, line_begin, line_end, col)))
+        return '\n'.join(rows) + '\n'
+
+    def match_at(self, row):
+        """Get the (begin, end) offsets of the match listed on a row of the panel, or `None`."""
+
+        index = self.page * self.page_size + row - HEADER_ROWS
+        if row < HEADER_ROWS or index >= min((self.page + 1) * self.page_size, len(self.regions)):
+            return None
+        return self.regions[index]
+
+
+class MatchExport(object):
+    """Write matches to a JSON lines file as they are found."""
+
+    def __init__(self, path, view_id, file_name, change_count, text):
+        """Open the file and index the lines of the buffer snapshot."""
+
+        self.path = path
+        self.file_name = file_name
+        self.lines = LineIndex.get(view_id, change_count, text)
+        self.count = 0
+        self.file = open(path, 'w', encoding='utf-8', newline='\n')
+
+    def write(self, rule, begin, end, text, replacement):
+        """Write one match."""
+
+        row, col = self.lines.rowcol(begin)
+        record = {
+            'file': self.file_name,
+            'rule': rule,
+            'begin': begin,
+            'end': end,
+            'line': row + 1,
+            'col': col + 1,
+            'text': text,
+            'replacement': replacement
+        }
+        self.file.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n')
+        self.count += 1
+
+    def close(self):
+        """Close the file."""
+
+        self.file.close()
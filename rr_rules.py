@@ -0,0 +1,190 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import re
+import threading
+import traceback
+from collections import OrderedDict
+from RegReplace.rr_template import ReplaceTemplate
+from RegReplace.rr_native import convert_rule
+from RegReplace import rr_engines
+
+
+# Most entries kept in each table of compiled rules
+MAX_ENTRIES = 1000
+
+
+class LRUCache(object):
+    """A mapping that drops the least recently used entries once it is full (safe to share between threads)."""
+
+    def __init__(self, size=MAX_ENTRIES):
+        """Initialize."""
+
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Get the number of entries."""
+
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Get an entry, marking it as recently used."""
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        """Add an entry, dropping the least recently used ones if there are too many."""
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry and get its value."""
+
+        with self.lock:
+            return self.entries.pop(key, default)
+
+
+def search_flags(rule, scope=False):
+    """Get the regex flags for a rule as the engine applies them."""
+
+    flags = 0
+    if not bool(rule.get('case', True)):
+        flags |= re.IGNORECASE
+    if bool(rule.get('dotall', False)):
+        flags |= re.DOTALL
+    if not scope:
+        flags |= re.MULTILINE
+    return flags
+
+
+class RuleTable(object):
+    """
+    Shared table of compiled search patterns and replace templates.
+
+    Entries are keyed by what they are compiled from (not by rule name), so a
+    rule that is edited simply misses the table and is compiled on demand.
+    Each table keeps the `MAX_ENTRIES` most recently used entries, so rules
+    that are edited many times between settings loads do not pile up.
+    """
+
+    lock = threading.Lock()
+    patterns = LRUCache()
+    templates = LRUCache()
+    natives = LRUCache()
+    errors = {}
+    reported = set()
+    generation = 0
+
+    @classmethod
+    def compile_search(cls, find, flags, literal=False, extend=False, engine=None):
+        """Get the compiled search pattern."""
+
+        key = (find, flags, literal, extend, engine)
+        pattern = cls.patterns.get(key)
+        if pattern is None:
+            if literal:
+                find = re.escape(find)
+            pattern = rr_engines.compile_search(find, flags, engine, extend and not literal)
+            cls.patterns[key] = pattern
+        return pattern
+
+    @classmethod
+    def compile_replace(cls, pattern, replace, extend=False):
+        """Get the compiled replace template for a compiled search pattern."""
+
+        key = (id(pattern), replace, extend)
+        entry = cls.templates.get(key)
+        # The pattern is stored along with the template so its id cannot be reused.
+        if entry is None or entry[0] is not pattern:
+            entry = (pattern, ReplaceTemplate(pattern, replace, extend))
+            cls.templates[key] = entry
+        return entry[1]
+
+    @classmethod
+    def compile_native(cls, find, flags, literal, replace):
+        """Get the rule converted for Sublime's `find_all`, or `None` if it is not compatible."""
+
+        key = (find, flags, literal, replace)
+        native = cls.natives.get(key, False)
+        if native is False:
+            pattern = cls.compile_search(find, flags, literal)
+            native = convert_rule(cls.compile_replace(pattern, replace), find, flags, literal)
+            cls.natives[key] = native
+        return native
+
+    @classmethod
+    def compile_rule(cls, rule, extend):
+        """Compile the search and replace of a rule definition."""
+
+        find = rule.get('find')
+        if find is None:
+            return
+        scope = 'scope' in rule
+        literal = bool(rule.get('literal', False))
+        if scope and literal:
+            # Literal scope rules do not use regex
+            return
+        pattern = cls.compile_search(
+            find, search_flags(rule, scope), literal, extend and not literal, rule.get('engine')
+        )
+        if 'plugin' not in rule:
+            cls.compile_replace(pattern, rule.get('replace', '\\0'), extend and not literal)
+
+    @classmethod
+    def warm(cls, replacements, extend, on_done=None):
+        """
+        Compile all rules on a background thread.
+
+        Previously compiled entries are dropped.  When done, `on_done` is called
+        with a dictionary of rule names and errors that have not been reported yet.
+        """
+
+        with cls.lock:
+            cls.generation += 1
+            generation = cls.generation
+            cls.patterns = LRUCache()
+            cls.templates = LRUCache()
+            cls.natives = LRUCache()
+
+        def compile_all():
+            errors = {}
+            for name, rule in replacements.items():
+                if generation != cls.generation:
+                    return
+                try:
+                    cls.compile_rule(rule, extend)
+                except Exception as err:
+                    print(str(traceback.format_exc()))
+                    errors[name] = str(err)
+
+            with cls.lock:
+                if generation != cls.generation:
+                    return
+                cls.errors = errors
+                new_errors = {}
+                for name, err in errors.items():
+                    if (name, err) not in cls.reported:
+                        cls.reported.add((name, err))
+                        new_errors[name] = err
+            if on_done is not None:
+                on_done(new_errors)
+
+        thread = threading.Thread(target=compile_all)
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -4,35 +4,349 @@ Reg Replace.
 Licensed under MIT
 Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
 """
+import time
 
-import sublime
-import sublime_plugin
-import re
-from fnmatch import fnmatch
-from RegReplace.rr_replacer import FindReplace
-from RegReplace.rr_notify import error
+# Taken before the other imports, so that they count towards the load time
+LOAD_START = time.perf_counter()
+
+import sublime  # noqa: E402
+import sublime_plugin  # noqa: E402
+import json  # noqa: E402
+import re  # noqa: E402
+import os  # noqa: E402
+from fnmatch import fnmatch  # noqa: E402
+from RegReplace.rr_regions import RegionSet  # noqa: E402
+from RegReplace.rr_stats import ViewStats  # noqa: E402
+from RegReplace.rr_results import LineIndex, MatchList, MatchExport, DEFAULT_PAGE_SIZE  # noqa: E402
+from RegReplace.rr_preview import Preview, parse_rule, DEFAULT_PREVIEW_DELAY  # noqa: E402
+from RegReplace.rr_trace import TraceLog, trace_record, DEFAULT_MAX_SIZE, DEFAULT_BACKUPS, FLUSH_INTERVAL  # noqa: E402
+from RegReplace.rr_notify import error  # noqa: E402
 
 
 DEFAULT_SHOW_PANEL = False
 DEFAULT_HIGHLIGHT_COLOR = 'invalid'
 DEFAULT_HIGHLIGHT_STYLE = 'outline'
 DEFAULT_MULTI_PASS_MAX_SWEEP = 100
+DEFAULT_LAZY_HIGHLIGHT_MARGIN = 50
+DEFAULT_PROFILE_LIMIT = 20
+LAZY_HIGHLIGHT_POLL = 150
 MODULE_NAME = 'RegReplace'
 
 rrsettings = {}
+load_times = {}
+
+
+def write_panel(window, name, text):
+    """Write text to a read only output panel and show it."""
+
+    # Get/create output panel
+    view = window.get_output_panel(name)
+
+    # Turn off stylings in panel
+    view.settings().set('draw_white_space', 'none')
+    view.settings().set('draw_indent_guides', False)
+    view.settings().set('gutter', 'none')
+    view.settings().set('line_numbers', False)
+    view.set_syntax_file('Packages/Text/Plain text.tmLanguage')
+
+    # Show Results in read only panel and clear selection in panel
+    window.run_command('show_panel', {'panel': 'output.%s' % name})
+    view.set_read_only(False)
+    RegReplaceGlobal.bfr = text
+    RegReplaceGlobal.region = sublime.Region(0, view.size())
+    view.run_command("reg_replace_apply")
+    RegReplaceGlobal.clear()
+    view.set_read_only(True)
+    view.sel().clear()
+    return view
+
+
+def show_matches(window, matches):
+    """Show the current page of a match list in the results panel."""
+
+    view = write_panel(window, 'reg_replace_results', matches.render())
+    view.settings().set('reg_replace_results', True)
+    return view
+
+
+def report_rule_errors(errors):
+    """Report rules that failed to compile."""
+
+    if not errors:
+        return
+    window = sublime.active_window()
+    if window is None:
+        return
+    text = 'RegReplace Rule Errors\n\n'
+    for name in sorted(errors.keys()):
+        text += '%s: %s\n' % (name, errors[name])
+    write_panel(window, 'reg_replace_errors', text)
+
+
+def warm_rules():
+    """Compile all rules in the background."""
+
+    # The engine is only loaded here, after startup, on Sublime's async thread.
+    start = time.perf_counter()
+    from RegReplace.rr_rules import RuleTable
+
+    def on_done(errors):
+        load_times['warm'] = time.perf_counter() - start
+        if rrsettings.get('log_load_time', False):
+            print('RegReplace: rules compiled in %.2fms' % (load_times['warm'] * 1000))
+        sublime.set_timeout(lambda: report_rule_errors(errors), 0)
+
+    RuleTable.warm(
+        rrsettings.get('replacements', {}),
+        bool(rrsettings.get('extended_back_references', False)),
+        on_done
+    )
 
 
 def underline(regions):
     """Convert to empty regions."""
 
-    new_regions = []
-    for region in regions:
-        start = region.begin()
-        end = region.end()
-        while start < end:
-            new_regions.append(sublime.Region(start))
-            start += 1
-    return new_regions
+    return RegionSet((pt, pt) for start, end in regions for pt in range(start, end))
+
+
+class ViewSnapshot(object):
+    """
+    A copy of the buffer of a view, to search in the background.
+
+    The text comes from the copy; anything else (scopes, settings,
+    selections) is read from the view, so a result found on a snapshot is
+    only good while the view's change count is still the snapshot's.
+    """
+
+    def __init__(self, view):
+        """Copy the buffer."""
+
+        self.view = view
+        self.count = view.change_count()
+        self.text = view.substr(sublime.Region(0, view.size()))
+
+    def __getattr__(self, name):
+        """Read anything but the text from the view."""
+
+        return getattr(self.view, name)
+
+    def change_count(self):
+        """Get the change count of the view when the copy was taken."""
+
+        return self.count
+
+    def size(self):
+        """Get the size of the copy."""
+
+        return len(self.text)
+
+    def substr(self, x):
+        """Get the text of a region or the character at a point."""
+
+        if isinstance(x, int):
+            return self.text[x:x + 1]
+        return self.text[x.begin():x.end()]
+
+
+class LazyHighlights(object):
+    """
+    Highlights that are only drawn in and around the visible region of a view.
+
+    The full set of regions is kept in a region set, and only the regions
+    that fall in the viewport (plus a margin of lines) are handed to Sublime.
+
+    Once the buffer is edited, the offsets in the set are out of date.  The
+    regions already drawn are tracked by Sublime, so nothing is done while
+    the viewport stays among them; when it moves past them, the regions are
+    found again with the entry's `refind` (once typing pauses), or the entry
+    is dropped if it has none, leaving what was drawn.  The search runs in
+    the background on a snapshot of the buffer, and what it finds is thrown
+    away if the buffer was edited again in the meantime.
+    """
+
+    views = {}
+    polling = False
+
+    @classmethod
+    def add(cls, view, key, regions, color, style, use_underline, margin, refind=None):
+        """
+        Track the regions of a highlight key and draw the visible ones.
+
+        `refind(snapshot)`, if given, gets the regions of the edited buffer
+        from a `ViewSnapshot` (or `None` to drop the highlight).  It is called
+        in the background.
+        """
+
+        entry = {
+            "regions": regions,
+            "color": color,
+            "style": style,
+            "underline": use_underline,
+            "margin": margin,
+            "drawn": None,
+            "change_count": view.change_count(),
+            "seen": view.change_count(),
+            "searching": None,
+            "refind": refind
+        }
+        cls.views.setdefault(view.id(), {})[key] = entry
+        cls.refresh(view)
+        cls.follow()
+
+    @classmethod
+    def follow(cls):
+        """Start following the viewport of the active view, if not already."""
+
+        if not cls.polling and cls.views:
+            cls.polling = True
+            sublime.set_timeout(cls.poll, LAZY_HIGHLIGHT_POLL)
+
+    @classmethod
+    def remove(cls, view, key):
+        """Stop tracking the highlight key."""
+
+        keys = cls.views.get(view.id(), {})
+        if key in keys:
+            del keys[key]
+        if not keys and view.id() in cls.views:
+            del cls.views[view.id()]
+
+    @classmethod
+    def forget(cls, view_id):
+        """Forget all highlights of a view."""
+
+        if view_id in cls.views:
+            del cls.views[view_id]
+
+    @classmethod
+    def visible_span(cls, view, margin):
+        """Get the visible region of the view extended by the margin (in lines)."""
+
+        visible = view.visible_region()
+        first = view.rowcol(visible.begin())[0]
+        last = view.rowcol(visible.end())[0]
+        begin = view.text_point(max(first - margin, 0), 0)
+        end = min(view.text_point(last + margin + 1, 0), view.size())
+        return visible, begin, end
+
+    @classmethod
+    def covered(cls, view, key, visible):
+        """See if the viewport is still among the drawn regions (as Sublime has tracked them through edits)."""
+
+        drawn = view.get_regions(key)
+        return bool(drawn) and drawn[0].begin() <= visible.begin() and visible.end() <= drawn[-1].end()
+
+    @classmethod
+    def refresh(cls, view):
+        """Draw the regions that are in and around the viewport."""
+
+        keys = cls.views.get(view.id())
+        if not keys:
+            return
+
+        change_count = view.change_count()
+        for key, entry in list(keys.items()):
+            visible, begin, end = cls.visible_span(view, entry["margin"])
+            if entry["change_count"] != change_count:
+                if cls.covered(view, key, visible):
+                    continue
+                if entry["refind"] is None:
+                    cls.remove(view, key)
+                    continue
+                if entry["seen"] != change_count:
+                    # Wait for the edits to pause before searching again
+                    entry["seen"] = change_count
+                elif entry["searching"] != change_count:
+                    entry["searching"] = change_count
+                    cls.search(view, key, entry)
+                continue
+
+            drawn = entry["drawn"]
+            if drawn is not None and drawn[0] <= visible.begin() and visible.end() <= drawn[1]:
+                continue
+
+            regions = entry["regions"]
+            lo, hi = regions.span(begin, end)
+            if entry["underline"]:
+                regions = underline(regions[i] for i in range(lo, hi))
+                lo, hi = 0, len(regions)
+            view.add_regions(key, regions.to_regions(lo, hi), entry["color"], "", entry["style"])
+            entry["drawn"] = (begin, end)
+
+    @classmethod
+    def search(cls, view, key, entry):
+        """Find the regions of an entry again on a snapshot of the buffer, in the background."""
+
+        snapshot = ViewSnapshot(view)
+
+        def find():
+            regions = entry["refind"](snapshot)
+            sublime.set_timeout(lambda: cls.found(view, key, entry, regions, snapshot.count), 0)
+
+        sublime.set_timeout_async(find, 0)
+
+    @classmethod
+    def found(cls, view, key, entry, regions, change_count):
+        """Draw the regions found again, unless the entry is gone or the buffer has changed since the snapshot."""
+
+        if cls.views.get(view.id(), {}).get(key) is not entry or view.change_count() != change_count:
+            return
+        if regions is None:
+            cls.remove(view, key)
+            return
+        entry["regions"] = regions
+        entry["change_count"] = change_count
+        entry["drawn"] = None
+        cls.refresh(view)
+
+    @classmethod
+    def poll(cls):
+        """Follow the viewport of the active view while it has lazy highlights."""
+
+        window = sublime.active_window()
+        view = window.active_view() if window is not None else None
+        if view is None or view.id() not in cls.views:
+            # Activating a view with lazy highlights starts following again
+            cls.polling = False
+            return
+        cls.refresh(view)
+        sublime.set_timeout(cls.poll, LAZY_HIGHLIGHT_POLL)
+
+
+def highlight(view, key, regions, style, color, use_underline=False, lazy=False, refind=None):
+    """
+    Highlight regions with the given style, replacing any earlier highlights of the key.
+
+    Lazy highlights use `refind` to find the regions again after the buffer is edited.
+    """
+
+    # Process highlight style
+    highlight_style = 0
+    if use_underline or style == 'underline':
+        use_underline = True
+        highlight_style = sublime.DRAW_EMPTY_AS_OVERWRITE
+    elif style == 'outline':
+        highlight_style = sublime.DRAW_OUTLINED
+
+    # higlight all of the found regions
+    view.erase_regions(key)
+    LazyHighlights.remove(view, key)
+    if lazy:
+        # Only draw the regions around the viewport
+        LazyHighlights.add(
+            view,
+            key,
+            regions,
+            color,
+            highlight_style,
+            use_underline,
+            rrsettings.get('lazy_highlight_margin', DEFAULT_LAZY_HIGHLIGHT_MARGIN),
+            refind
+        )
+    else:
+        view.add_regions(
+            key, (underline(regions) if use_underline else regions).to_regions(), color, "", highlight_style
+        )
 
 
 class RegReplaceGlobal(object):
@@ -58,6 +372,110 @@ class RegReplaceApplyCommand(sublime_plugin.TextCommand):
         self.view.replace(edit, RegReplaceGlobal.region, RegReplaceGlobal.bfr)
 
 
+class RegReplaceHighlightListenerCommand(sublime_plugin.EventListener):
+    """Keep lazy highlights in sync with the viewport."""
+
+    def on_activated(self, view):
+        """Draw lazy highlights for the newly activated view."""
+
+        if view.id() in LazyHighlights.views:
+            LazyHighlights.refresh(view)
+            LazyHighlights.follow()
+
+    def on_close(self, view):
+        """Forget lazy highlights of a closed view."""
+
+        LazyHighlights.forget(view.id())
+        ViewStats.forget(view.id())
+        LineIndex.forget(view.id())
+        MatchList.forget(view.id())
+
+
+class RegReplaceResultsListenerCommand(sublime_plugin.EventListener):
+    """Go to a match when it is double clicked in the results panel."""
+
+    def on_text_command(self, view, command_name, args):
+        """Follow the double click once the selection has moved to the clicked row."""
+
+        double_click = command_name == 'drag_select' and args is not None and args.get('by') == 'words'
+        if double_click and view.settings().get('reg_replace_results', False):
+            sublime.set_timeout(lambda: view.run_command('reg_replace_results_goto'), 0)
+        return None
+
+
+class RegReplaceResultsPageCommand(sublime_plugin.WindowCommand):
+    """Show another page of the matches listed in the results panel."""
+
+    def run(self, page='next'):
+        """Turn to `next`, `previous`, `first`, `last`, or a page number."""
+
+        matches = MatchList.panels.get(self.window.id())
+        if matches is None:
+            return
+        matches.turn(page)
+        show_matches(self.window, matches)
+
+
+class RegReplaceResultsGotoCommand(sublime_plugin.TextCommand):
+    """Go to the match on the selected row of the results panel."""
+
+    def run(self, edit):
+        """Select the match in its view."""
+
+        window = self.view.window()
+        matches = MatchList.panels.get(window.id()) if window is not None else None
+        if matches is None or len(self.view.sel()) == 0:
+            return
+        region = matches.match_at(self.view.rowcol(self.view.sel()[0].begin())[0])
+        if region is None:
+            return
+        target = None
+        for view in window.views():
+            if view.id() == matches.view_id:
+                target = view
+                break
+        if target is None:
+            sublime.status_message('RegReplace: the view of these matches has been closed')
+            return
+        if target.change_count() != matches.change_count:
+            sublime.status_message('RegReplace: the buffer has changed since these matches were listed')
+        region = sublime.Region(*region)
+        window.focus_view(target)
+        target.sel().clear()
+        target.sel().add(region)
+        target.show(region)
+
+
+def on_save_items(file_name):
+    """Get the `on_save_sequences` entries whose `file_pattern` or `file_regex` matches the file name."""
+
+    matched = []
+    for item in rrsettings.get('on_save_sequences', []):
+        found = False
+        if 'file_pattern' in item:
+            for pattern in item['file_pattern']:
+                if fnmatch(file_name, pattern):
+                    found = True
+                    break
+        if not found and 'file_regex' in item:
+            for regex in item['file_regex']:
+                try:
+                    flags = 0
+                    if 'case' not in item or not bool(item['case']):
+                        flags |= re.IGNORECASE
+                    if 'dotall' in item and bool(item['dotall']):
+                        flags |= re.DOTALL
+                    r = re.compile(regex, flags)
+                    if r.match(file_name) is not None:
+                        found = True
+                        break
+                except Exception:
+                    pass
+        if found:
+            matched.append(item)
+    return matched
+
+
 class RegReplaceListenerCommand(sublime_plugin.EventListener):
     """Event listner command."""
 
@@ -67,7 +485,6 @@ class RegReplaceListenerCommand(sublime_plugin.EventListener):
         match = False
         file_name = view.file_name()
         if file_name is not None and rrsettings.get('on_save', False):
-            replacements = rrsettings.get('on_save_sequences', [])
             scope = rrsettings.get('on_save_highlight_scope', None)
             style = rrsettings.get('on_save_highlight_style', None)
             self.options["key"] = MODULE_NAME
@@ -75,30 +492,9 @@ class RegReplaceListenerCommand(sublime_plugin.EventListener):
                 self.options["scope"] = scope
             if style is not None:
                 self.options["style"] = style
-            for item in replacements:
-                found = False
-                if 'file_pattern' in item:
-                    for pattern in item['file_pattern']:
-                        if fnmatch(file_name, pattern):
-                            found = True
-                            self.select(item)
-                            break
-                if not found and 'file_regex' in item:
-                    for regex in item['file_regex']:
-                        try:
-                            flags = 0
-                            if 'case' not in item or not bool(item['case']):
-                                flags |= re.IGNORECASE
-                            if 'dotall' in item and bool(item['dotall']):
-                                flags |= re.DOTALL
-                            r = re.compile(regex, flags)
-                            if r.match(file_name) is not None:
-                                found = True
-                                self.select(item)
-                                break
-                        except Exception:
-                            pass
-                match |= found
+            for item in on_save_items(file_name):
+                self.select(item)
+                match = True
         return match
 
     def select(self, item):
@@ -140,7 +536,8 @@ class RegReplaceListenerCommand(sublime_plugin.EventListener):
                 'action': action,
                 'options': options,
                 'multi_pass': multi_pass,
-                'no_selection': True
+                'no_selection': True,
+                'trigger': 'on_save'
             }
         )
 
@@ -242,30 +639,44 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
     def set_highlights(self, key, style, color):
         """Mark regions with specified highlight options."""
 
-        # Process highlight style
-        highlight_style = 0
-        if (self.find_only and self.selection_only) or style == 'underline':
-            # Use underline if explicity requested,
-            # or if doing a find only when under a selection only (only underline can be seen through a selection)
-            self.replace_obj.target_regions = underline(self.replace_obj.target_regions)
-            highlight_style = sublime.DRAW_EMPTY_AS_OVERWRITE
-        elif style == 'outline':
-            highlight_style = sublime.DRAW_OUTLINED
-
-        # higlight all of the found regions
-        self.view.erase_regions(key)
-        self.view.add_regions(
-            key,
-            self.replace_obj.target_regions,
-            color,
-            "",
-            highlight_style
+        # Use underline if doing a find only when under a selection only
+        # (only underline can be seen through a selection)
+        highlight(
+            self.view, key, self.replace_obj.target_regions, style, color,
+            self.find_only and self.selection_only, rrsettings.get('lazy_highlights', False), self.refind()
         )
 
+    def refind(self):
+        """Get a function that finds the targets again in the edited buffer, or `None` if they depend on selections."""
+
+        if self.selection_only:
+            return None
+        replacements = list(self.replacements)
+        full_file = self.full_file
+        max_sweeps = self.max_sweeps
+        action = self.action
+
+        def find(snapshot):
+            from RegReplace.rr_replacer import FindReplace
+
+            replace_obj = FindReplace(snapshot, None, True, full_file, False, max_sweeps, action, settings=rrsettings)
+            replace_list = rrsettings.get('replacements', {})
+            try:
+                for replacement in replacements:
+                    if replacement in replace_list:
+                        pattern = replace_list[replacement]
+                        replace_obj.search(pattern, 'scope' in pattern, replacement)
+            finally:
+                replace_obj.close()
+            return replace_obj.target_regions
+
+        return find
+
     def clear_highlights(self, key):
         """Clear all highlighted regions of given key."""
 
         self.view.erase_regions(key)
+        LazyHighlights.remove(self.view, key)
 
     def is_selection_available(self):
         """See if there are selections in document."""
@@ -280,15 +691,15 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
     def ignore_ending_newlines(self, regions):
         """Ignore newlines at the end of the region; newlines okay in the middle of region."""
 
-        new_regions = []
-        for region in regions:
+        new_regions = RegionSet()
+        for begin, end in regions:
             offset = 0
-            size = region.size()
-            if size > offset and self.view.substr(region.end() - 1) == '\n':
+            size = end - begin
+            if size > offset and self.view.substr(end - 1) == '\n':
                 offset += 1
-            if size > offset and self.view.substr(region.end() - offset - 1) == '\r':
+            if size > offset and self.view.substr(end - offset - 1) == '\r':
                 offset += 1
-            new_regions.append(sublime.Region(region.begin(), region.end() - offset))
+            new_regions.add(begin, end - offset)
         return new_regions
 
     def print_results_status_bar(self, text):
@@ -299,26 +710,24 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
     def print_results_panel(self, text):
         """Print find results to an output panel."""
 
-        # Get/create output panel
+        write_panel(self.view.window(), 'reg_replace_results', 'RegReplace Results\n\n' + text)
+
+    def print_matches_panel(self):
+        """List every match found in a paginated output panel."""
+
         window = self.view.window()
-        view = window.get_output_panel('reg_replace_results')
-
-        # Turn off stylings in panel
-        view.settings().set('draw_white_space', 'none')
-        view.settings().set('draw_indent_guides', False)
-        view.settings().set('gutter', 'none')
-        view.settings().set('line_numbers', False)
-        view.set_syntax_file('Packages/Text/Plain text.tmLanguage')
-
-        # Show Results in read only panel and clear selection in panel
-        window.run_command('show_panel', {'panel': 'output.reg_replace_results'})
-        view.set_read_only(False)
-        RegReplaceGlobal.bfr = 'RegReplace Results\n\n' + text
-        RegReplaceGlobal.region = sublime.Region(0, view.size())
-        view.run_command("reg_replace_apply")
-        RegReplaceGlobal.clear()
-        view.set_read_only(True)
-        view.sel().clear()
+        if window is None:
+            return
+        matches = MatchList(
+            self.view.id(),
+            self.view.file_name(),
+            self.view.change_count(),
+            self.view.substr(sublime.Region(0, self.view.size())),
+            self.replace_obj.target_regions,
+            rrsettings.get('results_page_size', DEFAULT_PAGE_SIZE)
+        )
+        MatchList.panels[window.id()] = matches
+        show_matches(window, matches)
 
     def perform_action(self):
         """Perform action on targed text."""
@@ -326,11 +735,11 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
         status = True
         if self.action == 'fold':
             # Fold regions
-            self.view.fold(self.ignore_ending_newlines(self.replace_obj.target_regions))
+            self.view.fold(self.ignore_ending_newlines(self.replace_obj.target_regions).merged().to_regions())
         elif self.action == 'unfold':
             # Unfold regions
             try:
-                self.view.unfold(self.ignore_ending_newlines(self.replace_obj.target_regions))
+                self.view.unfold(self.ignore_ending_newlines(self.replace_obj.target_regions).merged().to_regions())
             except Exception:
                 error("Cannot unfold! Please upgrade to the latest stable beta build to remove this error.")
         elif self.action == 'mark':
@@ -345,12 +754,79 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
                 self.clear_highlights(self.options['key'].strip())
         elif self.action == 'select':
             self.view.sel().clear()
-            self.view.sel().add_all(self.replace_obj.target_regions)
+            self.view.sel().add_all(self.replace_obj.target_regions.to_regions())
+        elif self.action == 'export':
+            # Matches were written to the export file as they were found
+            pass
         else:
             # Not a valid action
             status = False
         return status
 
+    def export_matches(self):
+        """
+        Write every match of the sequence, with its proposed replacement, to a JSON lines file.
+
+        Every rule is matched against the buffer as it is, not as the rules
+        before it would leave it.
+        """
+
+        path = self.options.get('file', '')
+        if path:
+            path = os.path.abspath(os.path.expanduser(path))
+        else:
+            path = os.path.join(sublime.cache_path(), MODULE_NAME, 'export.jsonl')
+        replace_list = rrsettings.get('replacements', {})
+        result_template = '%s: %d matches;\n' if self.panel_display else '%s: %d matches; '
+        results = ''
+        try:
+            folder = os.path.dirname(path)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            export = MatchExport(
+                path,
+                self.view.id(),
+                self.view.file_name(),
+                self.view.change_count(),
+                self.view.substr(sublime.Region(0, self.view.size()))
+            )
+        except (IOError, OSError) as err:
+            error('Cannot write the export file %s: %s' % (path, str(err)))
+            return results
+
+        try:
+            for replacement in self.replacements:
+                if replacement in replace_list:
+                    pattern = replace_list[replacement]
+                    results += result_template % (
+                        replacement, self.replace_obj.export(pattern, 'scope' in pattern, replacement, export.write)
+                    )
+        finally:
+            export.close()
+        results += 'Exported %d matches to %s;' % (export.count, path)
+        if len([name for name in self.replacements if name in replace_list]) > 1:
+            results += ' every rule was matched against the unchanged buffer;'
+        return results
+
+    def buffer_state(self):
+        """
+        Get a hash of the buffer to detect when multi-pass sweeps return to a previous state.
+
+        The copy of the buffer is the one the first search of the next sweep uses.
+        """
+
+        text = self.replace_obj.buffer()
+        return len(text), hash(text)
+
+    def get_cycle(self, first, last):
+        """Describe the cycle of sweeps after sweep `first` up to sweep `last`."""
+
+        rules = []
+        for rule in self.replace_obj.stats.rules:
+            if first < rule.sweep <= last and rule.replaced and rule.name not in rules:
+                rules.append(rule.name)
+        return {'sweep': last, 'length': last - first, 'rules': rules}
+
     def find_and_replace(self):
         """
         Walk the sequence finding the targeted regions in the text.
@@ -361,6 +837,23 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
         replace_list = rrsettings.get('replacements', {})
         result_template = '%s: %d regions;\n' if self.panel_display else '%s: %d regions; '
         results = ''
+        self.max_sweeps_hit = False
+        self.cycle = None
+
+        # Only count matches; nothing is replaced, tracked, or highlighted
+        if self.count_only:
+            result_template = '%s: %d matches;\n' if self.panel_display else '%s: %d matches; '
+            for replacement in self.replacements:
+                if replacement in replace_list:
+                    pattern = replace_list[replacement]
+                    results += result_template % (
+                        replacement, self.replace_obj.count(pattern, 'scope' in pattern, replacement)
+                    )
+            return results
+
+        # Stream matches to the export file; nothing is replaced or tracked
+        if self.action == 'export':
+            return self.export_matches()
 
         # Walk the sequence
         # Multi-pass only if requested and will be occuring
@@ -371,7 +864,9 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
             count = 0
 
             # Sweep file until all instances are found
-            # Avoid infinite loop and break out if sweep threshold is met
+            # Avoid infinite loop and break out if sweep threshold is met,
+            # or if the buffer returns to a previous state (nothing more will change).
+            states = {self.buffer_state(): 0}
             while count < self.max_sweeps:
                 count += 1
                 current_replacements = 0
@@ -380,34 +875,95 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
                     # Is replacement available in the list?
                     if replacement in replace_list:
                         pattern = replace_list[replacement]
-                        current_replacements += self.replace_obj.search(pattern, 'scope' in pattern)
+                        current_replacements += self.replace_obj.search(
+                            pattern, 'scope' in pattern, replacement, count
+                        )
                 total_replacements += current_replacements
 
                 # No more regions found?
                 if current_replacements == 0:
                     break
+
+                state = self.buffer_state()
+                if state in states:
+                    self.cycle = self.get_cycle(states[state], count)
+                    break
+                states[state] = count
+            else:
+                self.max_sweeps_hit = current_replacements > 0
             # Record total regions found
             results += 'Regions Found: %d regions;' % total_replacements
+            if self.cycle is not None:
+                results += (
+                    '\n' if self.panel_display else ' '
+                ) + 'Stopped at sweep %d: cycle of %d sweep(s) (%s);' % (
+                    self.cycle['sweep'], self.cycle['length'], ', '.join(self.cycle['rules'])
+                )
         else:
             for replacement in self.replacements:
                 # Is replacement available in the list?
                 if replacement in replace_list:
                     pattern = replace_list[replacement]
-                    results += result_template % (replacement, self.replace_obj.search(pattern, 'scope' in pattern))
+                    results += result_template % (
+                        replacement, self.replace_obj.search(pattern, 'scope' in pattern, replacement)
+                    )
+
+        # Report scope rules whose multi-pass regex stopped on a cycle
+        cycles = {}
+        for rule in self.replace_obj.stats.rules:
+            if rule.cycle:
+                cycles[rule.name] = max(cycles.get(rule.name, 0), rule.cycle)
+        for name in sorted(cycles.keys()):
+            results += (
+                '\n' if self.panel_display and not results.endswith('\n') else ''
+            ) + '%s: multi_pass_regex stopped on a cycle of %d sweep(s);%s' % (
+                name, cycles[name], '\n' if self.panel_display else ' '
+            )
         return results
 
+    def trace(self):
+        """Write a record of the run to the trace log."""
+
+        TraceLog.write(
+            trace_record(
+                self.replace_obj.stats,
+                self.trigger,
+                self.view.file_name(),
+                self.view.size(),
+                self.replacements,
+                self.max_sweeps_hit,
+                action=self.action,
+                find_only=self.find_only,
+                count_only=self.count_only,
+                multi_pass=self.multi_pass,
+                cycle=self.cycle
+            )
+        )
+        sublime.set_timeout(TraceLog.flush, int(FLUSH_INTERVAL * 1000))
+
     def start_sequence(self):
         """Run the replace sequence."""
 
         # Find targets and replace if applicable
         results = self.find_and_replace()
+        totals = ViewStats.record(self.view.id(), self.replace_obj.stats)
+        if TraceLog.enabled():
+            self.trace()
 
-        if self.find_only:
+        if self.count_only:
+            # Counts leave the view and its highlights untouched
+            self.report_results(results, totals)
+            self.replace_obj.close()
+        elif self.find_only:
             # Higlight regions
             style = rrsettings.get('find_highlight_style', DEFAULT_HIGHLIGHT_STYLE)
             color = rrsettings.get('find_highlight_color', DEFAULT_HIGHLIGHT_COLOR)
             self.set_highlights(MODULE_NAME, style, color)
-            self.replace_prompt()
+            if self.list_matches:
+                self.print_matches_panel()
+                self.replace_obj.close()
+            else:
+                self.replace_prompt()
         else:
             self.clear_highlights(MODULE_NAME)
             # Perform action
@@ -415,18 +971,52 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
                 if not self.perform_action():
                     results = 'Error: %s - Bad Action!' % self.action
 
-            # Report results
-            if self.panel_display:
-                self.print_results_panel(results)
-            else:
-                self.print_results_status_bar(results)
+            self.report_results(results, totals)
             self.replace_obj.close()
 
+    def report_results(self, results, totals):
+        """Report results in the panel or status bar."""
+
+        if self.panel_display:
+            if rrsettings.get('results_timing', False):
+                results = results.rstrip() + '\n\nTiming (ms)\n' + self.replace_obj.stats.format()
+                results += '\nView totals: %d runs; %.2fms\n' % (totals['runs'], totals['total'] * 1000)
+            self.print_results_panel(results)
+        else:
+            self.print_results_status_bar(results)
+
+    def profile_sequence(self):
+        """Run the sequence under the profiler and show the report."""
+
+        from RegReplace.rr_profile import profile_call
+
+        path = rrsettings.get('profile_output', '')
+        if path:
+            path = os.path.expanduser(path)
+        else:
+            path = os.path.join(sublime.cache_path(), MODULE_NAME, 'profile.prof')
+        rules = rrsettings.get('replacements', {})
+        modules = set()
+        for name in self.replacements:
+            plugin = rules.get(name, {}).get('plugin')
+            if plugin is not None:
+                modules.add(plugin)
+
+        report = profile_call(
+            self.start_sequence, path,
+            rrsettings.get('profile_limit', DEFAULT_PROFILE_LIMIT),
+            modules
+        )
+        window = self.view.window()
+        if window is not None:
+            write_panel(window, 'reg_replace_profile', 'RegReplace Profile\n\n' + report)
+
     def run(
         self, edit, replacements=None,
         find_only=False, clear=False, action=None,
         multi_pass=False, no_selection=False, regex_full_file_with_selections=False,
-        options=None
+        options=None, trigger='command', profile=False, count_only=False, selection_only=None,
+        list_matches=False
     ):
         """Kick off sequence."""
 
@@ -435,19 +1025,23 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
         if options is None:
             options = {}
 
-        self.find_only = bool(find_only)
+        self.count_only = bool(count_only)
+        self.list_matches = bool(list_matches) and not self.count_only
+        self.find_only = (bool(find_only) or self.list_matches) and not self.count_only
         self.action = action.strip() if action is not None else action
         self.full_file = bool(regex_full_file_with_selections)
-        if not no_selection and rrsettings.get('selection_only', False) and self.is_selection_available():
-            self.selection_only = True
-        else:
-            self.selection_only = False
+        if selection_only is None:
+            selection_only = not no_selection and rrsettings.get('selection_only', False)
+        self.selection_only = bool(selection_only) and self.is_selection_available()
         self.max_sweeps = rrsettings.get('multi_pass_max_sweeps', DEFAULT_MULTI_PASS_MAX_SWEEP)
         self.replacements = replacements
         self.multi_pass = bool(multi_pass)
         self.panel_display = rrsettings.get('results_in_panel', DEFAULT_SHOW_PANEL)
         self.options = options
         self.clear = clear
+        self.trigger = trigger
+
+        from RegReplace.rr_replacer import FindReplace
 
         self.replace_obj = FindReplace(
             self.view,
@@ -466,13 +1060,169 @@ class RegReplaceCommand(sublime_plugin.TextCommand):
 
         # Is the sequence empty?
         if len(self.replacements) > 0:
-            self.start_sequence()
+            if profile:
+                self.profile_sequence()
+            else:
+                self.start_sequence()
         else:
             self.replace_obj.close()
 
 
+class RegReplacePreviewCommand(sublime_plugin.TextCommand):
+    """Highlight the matches of a rule as it is edited in an input panel."""
+
+    def run(self, edit, rule='/'):
+        """Show the input panel."""
+
+        window = self.view.window()
+        if window is None:
+            return
+        self.preview = Preview(self.view)
+        self.rule = None
+        window.show_input_panel(
+            'Preview rule (/find/replace/flags):', rule, self.on_done, self.on_change, self.on_cancel
+        )
+        self.on_change(rule)
+
+    def on_change(self, text):
+        """Update the preview once typing pauses."""
+
+        self.text = text
+        generation = self.preview.touch()
+        sublime.set_timeout(
+            lambda: self.update(text, generation), rrsettings.get('preview_delay', DEFAULT_PREVIEW_DELAY)
+        )
+
+    def on_done(self, text):
+        """Keep the highlights (a search in progress still finishes) and copy the rule to the clipboard."""
+
+        if self.rule is not None:
+            sublime.set_clipboard(json.dumps(self.rule, ensure_ascii=False))
+            sublime.status_message('RegReplace: rule copied to the clipboard')
+
+    def on_cancel(self):
+        """Remove the highlights."""
+
+        self.preview.touch()
+        self.view.erase_regions(MODULE_NAME)
+        LazyHighlights.remove(self.view, MODULE_NAME)
+
+    def update(self, text, generation):
+        """Highlight the matches near the viewport, and search the rest of the buffer in the background."""
+
+        if generation != self.preview.generation:
+            return
+        try:
+            rule = parse_rule(text)
+            if rule is None:
+                self.on_cancel()
+                self.rule = None
+                return
+            pattern, template = self.preview.compile(rule, rrsettings.get('extended_back_references', False))
+        except Exception as err:
+            # Leave the last good highlights while the rule is incomplete
+            sublime.status_message('RegReplace preview: %s' % str(err))
+            return
+        self.rule = rule
+
+        change_count, bfr = self.preview.text()
+        begin, end = LazyHighlights.visible_span(
+            self.view, rrsettings.get('lazy_highlight_margin', DEFAULT_LAZY_HIGHLIGHT_MARGIN)
+        )[1:]
+        regions = self.preview.find(pattern, bfr, begin, end)
+        self.show(regions, False)
+        sublime.status_message('RegReplace preview: %d matches in view; searching the rest...' % len(regions))
+        sublime.set_timeout_async(lambda: self.search(pattern, template, bfr, change_count, generation), 0)
+
+    def search(self, pattern, template, bfr, change_count, generation):
+        """Find all the matches in the buffer snapshot (in the background)."""
+
+        regions = self.preview.find(pattern, bfr, generation=generation)
+        if regions is not None:
+            sublime.set_timeout(lambda: self.finish(regions, pattern, template, bfr, change_count, generation), 0)
+
+    def finish(self, regions, pattern, template, bfr, change_count, generation):
+        """Highlight all the matches, unless the rule or the buffer has changed since the search started."""
+
+        if generation != self.preview.generation or change_count != self.view.change_count():
+            return
+        self.show(regions, True)
+        message = 'RegReplace preview: %d matches' % len(regions)
+        if len(regions) and template is not None:
+            begin, end = regions[0]
+            try:
+                replacement = template.expand(pattern.match(bfr, begin))
+                message += '; first: %r -> %r' % (bfr[begin:end], replacement)
+            except Exception as err:
+                message += '; replace: %s' % str(err)
+        sublime.status_message(message)
+
+    def show(self, regions, lazy):
+        """Highlight the regions like a find."""
+
+        highlight(
+            self.view, MODULE_NAME, regions,
+            rrsettings.get('find_highlight_style', DEFAULT_HIGHLIGHT_STYLE),
+            rrsettings.get('find_highlight_color', DEFAULT_HIGHLIGHT_COLOR),
+            lazy=lazy,
+            refind=self.refind
+        )
+
+    def refind(self, snapshot):
+        """Search the edited buffer again (through the usual delay) once the lazy highlights are out of date."""
+
+        sublime.set_timeout(lambda: self.on_change(self.text), 0)
+
+
+def warm_rules_async():
+    """Compile all rules in the background without blocking the caller."""
+
+    sublime.set_timeout_async(warm_rules, 0)
+
+
+def configure_trace():
+    """Set up the trace log from the settings."""
+
+    TraceLog.configure(
+        rrsettings.get('trace_log', ''),
+        rrsettings.get('trace_log_max_size', DEFAULT_MAX_SIZE),
+        rrsettings.get('trace_log_backups', DEFAULT_BACKUPS)
+    )
+
+
+def on_settings_change():
+    """Handle settings changes."""
+
+    configure_trace()
+    warm_rules_async()
+
+
 def plugin_loaded():
     """Setup plugin."""
 
     global rrsettings
+    start = time.perf_counter()
     rrsettings = sublime.load_settings('reg_replace.sublime-settings')
+
+    # Compile rules up front and again whenever the settings change
+    rrsettings.clear_on_change('reg_replace_rules')
+    rrsettings.add_on_change('reg_replace_rules', on_settings_change)
+    configure_trace()
+    warm_rules_async()
+
+    load_times['plugin_loaded'] = time.perf_counter() - start
+    if rrsettings.get('log_load_time', False):
+        print(
+            'RegReplace: module load %.2fms; plugin_loaded %.2fms' % (
+                load_times['import'] * 1000, load_times['plugin_loaded'] * 1000
+            )
+        )
+
+
+def plugin_unloaded():
+    """Tear down plugin."""
+
+    TraceLog.flush()
+
+
+load_times['import'] = time.perf_counter() - LOAD_START
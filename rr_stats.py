@@ -0,0 +1,149 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import time
+
+PHASES = ('compile', 'scan', 'scope', 'plugin', 'write')
+
+clock = time.perf_counter
+
+
+class RuleStats(object):
+    """Timing and counts of one rule in one sweep."""
+
+    def __init__(self, name, sweep, size):
+        """Initialize."""
+
+        self.name = name
+        self.sweep = sweep
+        self.size = size
+        self.matches = 0
+        self.replaced = 0
+        self.cycle = 0
+        self.times = dict((phase, 0.0) for phase in PHASES)
+
+    def total(self):
+        """Get the total time spent in the rule."""
+
+        return sum(self.times.values())
+
+
+class RunStats(object):
+    """Collect timing and counts for every rule and sweep of a run."""
+
+    def __init__(self):
+        """Initialize."""
+
+        self.rules = []
+        self.current = None
+
+    def begin(self, name, sweep, size):
+        """Start recording a rule."""
+
+        self.current = RuleStats(name, sweep, size)
+        self.rules.append(self.current)
+        return self.current
+
+    def add(self, phase, seconds):
+        """Add time to a phase of the current rule."""
+
+        if self.current is not None:
+            self.current.times[phase] += seconds
+
+    def count(self, matches=0, replaced=0):
+        """Add to the match and replace counts of the current rule."""
+
+        if self.current is not None:
+            self.current.matches += matches
+            self.current.replaced += replaced
+
+    def cycle(self, length):
+        """Record that a multi-pass scope regex of the current rule stopped on a cycle of the given length."""
+
+        if self.current is not None:
+            self.current.cycle = max(self.current.cycle, length)
+
+    def mark(self):
+        """Get a mark for timing a phase that contains other phases."""
+
+        return clock(), (self.current.total() if self.current is not None else 0.0)
+
+    def add_since(self, phase, mark):
+        """Add the time since the mark to a phase, less the time recorded for other phases since the mark."""
+
+        if self.current is not None:
+            start, recorded = mark
+            self.current.times[phase] += (clock() - start) - (self.current.total() - recorded)
+
+    def end(self):
+        """Stop recording the current rule."""
+
+        self.current = None
+
+    def totals(self):
+        """Get the total time of each phase (and overall) across all rules."""
+
+        totals = dict((phase, 0.0) for phase in PHASES)
+        for rule in self.rules:
+            for phase in PHASES:
+                totals[phase] += rule.times[phase]
+        totals['total'] = sum(totals[phase] for phase in PHASES)
+        return totals
+
+    def sweeps(self):
+        """Get the number of sweeps recorded."""
+
+        return max([rule.sweep for rule in self.rules]) if self.rules else 0
+
+    def format(self):
+        """Format a per rule breakdown for the results panel."""
+
+        lines = [
+            '%-30s %5s %9s %9s %9s %9s %9s %9s %9s %9s' % (
+                'rule', 'sweep', 'compile', 'scan', 'scope', 'plugin', 'write', 'total', 'size', 'matches'
+            )
+        ]
+        for rule in self.rules:
+            lines.append(
+                '%-30s %5d %9.2f %9.2f %9.2f %9.2f %9.2f %9.2f %9d %9d' % (
+                    rule.name, rule.sweep,
+                    rule.times['compile'] * 1000, rule.times['scan'] * 1000, rule.times['scope'] * 1000,
+                    rule.times['plugin'] * 1000, rule.times['write'] * 1000, rule.total() * 1000,
+                    rule.size, rule.matches
+                )
+            )
+        totals = self.totals()
+        lines.append(
+            '%-30s %5d %9.2f %9.2f %9.2f %9.2f %9.2f %9.2f' % (
+                'total', self.sweeps(),
+                totals['compile'] * 1000, totals['scan'] * 1000, totals['scope'] * 1000,
+                totals['plugin'] * 1000, totals['write'] * 1000, totals['total'] * 1000
+            )
+        )
+        return '\n'.join(lines) + '\n'
+
+
+class ViewStats(object):
+    """Running totals of rule timing per view."""
+
+    views = {}
+
+    @classmethod
+    def record(cls, view_id, stats):
+        """Add the totals of a run to the view's running totals."""
+
+        totals = cls.views.setdefault(view_id, dict((phase, 0.0) for phase in PHASES + ('total', 'runs')))
+        for key, value in stats.totals().items():
+            totals[key] += value
+        totals['runs'] += 1
+        return totals
+
+    @classmethod
+    def forget(cls, view_id):
+        """Forget the totals of a view."""
+
+        if view_id in cls.views:
+            del cls.views[view_id]
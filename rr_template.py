@@ -0,0 +1,140 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+DIGITS = '0123456789'
+OCTDIGITS = '01234567'
+ESCAPES = {
+    'a': '\a',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+    '\\': '\\'
+}
+
+
+def parse_template(pattern, replace):
+    r"""
+    Parse a replace template into literal strings and group indexes.
+
+    Only group references (`\\1`, `\\g<1>`, `\\g<name>`) and the simple character
+    escapes are handled.  If anything else is found (octal escapes, unknown
+    escapes, invalid groups), `None` is returned so the caller can fall back
+    to `re`'s own template handling (and its error reporting).
+    """
+
+    parts = []
+    literal = []
+    index = 0
+    length = len(replace)
+    while index < length:
+        c = replace[index]
+        index += 1
+        if c != '\\':
+            literal.append(c)
+            continue
+        if index >= length:
+            return None
+        c = replace[index]
+        index += 1
+        group = None
+        if c == 'g':
+            end = replace.find('>', index)
+            if index >= length or replace[index] != '<' or end == -1:
+                return None
+            name = replace[index + 1:end]
+            index = end + 1
+            if name.isdigit():
+                group = int(name)
+            elif name in pattern.groupindex:
+                group = pattern.groupindex[name]
+            else:
+                return None
+        elif c in DIGITS and c != '0':
+            digits = c
+            if index < length and replace[index] in DIGITS:
+                following = replace[index:index + 2]
+                if c in OCTDIGITS and len(following) == 2 and following[0] in OCTDIGITS and following[1] in OCTDIGITS:
+                    # Octal escape
+                    return None
+                digits += replace[index]
+                index += 1
+            group = int(digits)
+        elif c in ESCAPES:
+            literal.append(ESCAPES[c])
+            continue
+        else:
+            return None
+
+        if group > pattern.groups:
+            return None
+        if literal:
+            parts.append(''.join(literal))
+            literal = []
+        parts.append(group)
+
+    if literal:
+        parts.append(''.join(literal))
+    return parts
+
+
+class ReplaceTemplate(object):
+    """
+    Replace template compiled once per rule.
+
+    Templates without any backslashes are constant and need no expansion at all.
+    Other templates are parsed into literal strings and group indexes, or are
+    compiled with backrefs when extended back references are enabled.
+    """
+
+    def __init__(self, pattern, replace, extend=False):
+        """Compile the template."""
+
+        self.replace = replace
+        self.constant = None
+        self.parts = None
+        self.compiled = None
+        if '\\' not in replace:
+            self.constant = replace
+        elif extend:
+            from backrefs import bre
+            self.compiled = bre.compile_replace(pattern, replace)
+        else:
+            parts = parse_template(pattern, replace)
+            if parts is not None and len(parts) == 1 and not isinstance(parts[0], int):
+                self.constant = parts[0]
+            else:
+                self.parts = parts
+
+    def repl(self):
+        """Get a replacement suitable for `sub` and `subn`."""
+
+        if self.constant is not None and '\\' not in self.constant:
+            return self.constant
+        return self.expand
+
+    def expand(self, m):
+        """Expand the template for the given match."""
+
+        if self.constant is not None:
+            return self.constant
+        if self.compiled is not None:
+            return self.compiled(m)
+        if self.parts is not None:
+            text = []
+            for part in self.parts:
+                if part.__class__ is int:
+                    group = m.group(part)
+                    if group is None:
+                        # Let `re` decide how unmatched groups are handled.
+                        return m.expand(self.replace)
+                    text.append(group)
+                else:
+                    text.append(part)
+            return ''.join(text)
+        return m.expand(self.replace)
@@ -0,0 +1,123 @@
+"""
+Reg Replace.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import json
+import os
+import threading
+import time
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+FLUSH_LINES = 50
+FLUSH_INTERVAL = 5.0
+
+
+def trace_record(stats, trigger, file_name, size, sequence, max_sweeps_hit=False, **extra):
+    """Build a trace record from the stats of a run."""
+
+    totals = stats.totals()
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
+        'trigger': trigger,
+        'file': file_name,
+        'size': size,
+        'sequence': sequence,
+        'sweeps': stats.sweeps(),
+        'max_sweeps_hit': max_sweeps_hit,
+        'total_ms': round(totals['total'] * 1000, 3),
+        'rules': [
+            {
+                'name': rule.name,
+                'sweep': rule.sweep,
+                'size': rule.size,
+                'matches': rule.matches,
+                'replaced': rule.replaced,
+                'cycle': rule.cycle,
+                'ms': dict((phase, round(value * 1000, 3)) for phase, value in rule.times.items())
+            } for rule in stats.rules
+        ]
+    }
+    record.update(extra)
+    return record
+
+
+class TraceLog(object):
+    """
+    Buffered JSON lines log of sequence runs.
+
+    Records are buffered and appended to the log file in batches.
+    When the file grows past the maximum size, it is rotated (`log.1`, `log.2`, etc.).
+    """
+
+    lock = threading.Lock()
+    path = None
+    max_size = DEFAULT_MAX_SIZE
+    backups = DEFAULT_BACKUPS
+    buffer = []
+    last_flush = 0.0
+
+    @classmethod
+    def configure(cls, path, max_size=DEFAULT_MAX_SIZE, backups=DEFAULT_BACKUPS):
+        """Set the log file; an empty path disables tracing."""
+
+        path = os.path.expanduser(path) if path else None
+        if path != cls.path:
+            cls.flush()
+        cls.path = path
+        cls.max_size = max_size
+        cls.backups = backups
+
+    @classmethod
+    def enabled(cls):
+        """See if tracing is enabled."""
+
+        return cls.path is not None
+
+    @classmethod
+    def write(cls, record):
+        """Buffer a record, and flush if enough lines or time have accumulated."""
+
+        if cls.path is None:
+            return
+        with cls.lock:
+            cls.buffer.append(json.dumps(record, sort_keys=True))
+            flush = len(cls.buffer) >= FLUSH_LINES or time.time() - cls.last_flush >= FLUSH_INTERVAL
+        if flush:
+            cls.flush()
+
+    @classmethod
+    def rotate(cls):
+        """Rotate the log files."""
+
+        if cls.backups <= 0:
+            os.remove(cls.path)
+            return
+        for index in range(cls.backups - 1, 0, -1):
+            src = '%s.%d' % (cls.path, index)
+            if os.path.exists(src):
+                os.replace(src, '%s.%d' % (cls.path, index + 1))
+        os.replace(cls.path, cls.path + '.1')
+
+    @classmethod
+    def flush(cls):
+        """Write buffered records to the log file."""
+
+        with cls.lock:
+            lines = cls.buffer
+            cls.buffer = []
+            cls.last_flush = time.time()
+            if not lines or cls.path is None:
+                return
+            try:
+                folder = os.path.dirname(cls.path)
+                if folder and not os.path.exists(folder):
+                    os.makedirs(folder)
+                if os.path.exists(cls.path) and os.path.getsize(cls.path) >= cls.max_size:
+                    cls.rotate()
+                with open(cls.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except Exception as err:
+                print('RegReplace: could not write trace log: %s' % str(err))
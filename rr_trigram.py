@@ -0,0 +1,487 @@
+"""
+Reg Replace.
+
+A trigram index of a folder, so that project-wide searches only open the
+files that can match.
+
+Each rule's pattern is turned into a query of trigrams any match must
+contain (`rule_query`), following Russ Cox's "Regular Expression Matching
+with a Trigram Index" (the approach of Google Code Search).  The index keeps
+the trigrams of every file's case folded text in SQLite, and is updated
+incrementally by comparing file sizes and modification times.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import os
+import re
+import sqlite3
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Sets of strings larger than this are reduced to trigram queries
+MAX_SET = 16
+# Character classes larger than this are treated as any character
+MAX_CLASS = 8
+# Files larger than this are not indexed and are always scanned
+MAX_INDEX_SIZE = 4 * 1024 * 1024
+SKIP_DIRS = frozenset(['.git', '.hg', '.svn', '__pycache__', 'node_modules'])
+BUSY_TIMEOUT = 30
+
+# Queries: `ALL` (every file), a trigram (string of three characters),
+# or ('and', [queries]) / ('or', [queries]).
+ALL = ('all',)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS files '
+    '(id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime INTEGER, size INTEGER, indexed INTEGER)',
+    'CREATE TABLE IF NOT EXISTS grams (gram INTEGER, file INTEGER, PRIMARY KEY (gram, file))',
+    'CREATE INDEX IF NOT EXISTS grams_file ON grams (file)'
+)
+
+
+def fold(text):
+    """Case fold text the way the index does."""
+
+    return text.casefold()
+
+
+def gram_key(gram):
+    """Pack a trigram into an integer (code points are 21 bits)."""
+
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+def text_grams(text):
+    """Get the set of trigrams of (case folded) text."""
+
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def and_query(a, b):
+    """Both queries must match."""
+
+    if a == ALL:
+        return b
+    if b == ALL or a == b:
+        return a
+    parts = []
+    for q in (a, b):
+        for part in (q[1] if isinstance(q, tuple) and q[0] == 'and' else [q]):
+            if part not in parts:
+                parts.append(part)
+    return ('and', parts)
+
+
+def or_query(a, b):
+    """Either query must match."""
+
+    if a == ALL or b == ALL:
+        return ALL
+    if a == b:
+        return a
+    parts = []
+    for q in (a, b):
+        for part in (q[1] if isinstance(q, tuple) and q[0] == 'or' else [q]):
+            if part not in parts:
+                parts.append(part)
+    return ('or', parts)
+
+
+def strings_query(strings):
+    """Build a query that one of the strings matches (`ALL` if one is too short to have trigrams)."""
+
+    query = None
+    for s in sorted(strings):
+        if len(s) < 3:
+            return ALL
+        q = ALL
+        for gram in sorted(text_grams(s)):
+            q = and_query(q, gram)
+        query = q if query is None else or_query(query, q)
+    return ALL if query is None else query
+
+
+def cross(a, b):
+    """Concatenate every string of one set with every string of another."""
+
+    return set(x + y for x in a for y in b)
+
+
+class Info(object):
+    """
+    What is known about the strings a piece of a pattern matches.
+
+    `exact` is the set of all of them (or `None` if unknown or too large),
+    `prefix` and `suffix` are sets they start and end with, and `match` is a
+    query every one of them satisfies.
+    """
+
+    def __init__(self, emptyable, exact=None, prefix=None, suffix=None, match=ALL):
+        """Initialize."""
+
+        self.emptyable = emptyable
+        self.exact = exact
+        self.prefix = prefix if prefix is not None else set([''])
+        self.suffix = suffix if suffix is not None else set([''])
+        self.match = match
+
+    def simplify(self):
+        """Move large sets into the query, keeping only enough of the prefixes and suffixes to join trigrams."""
+
+        if self.exact is not None and len(self.exact) > MAX_SET:
+            self.match = and_query(self.match, strings_query(self.exact))
+            self.prefix = set(self.exact)
+            self.suffix = set(self.exact)
+            self.exact = None
+        if self.exact is None:
+            if len(self.prefix) > MAX_SET or any(len(s) > 2 for s in self.prefix):
+                self.match = and_query(self.match, strings_query(self.prefix))
+                self.prefix = set(s[:2] for s in self.prefix)
+            if len(self.suffix) > MAX_SET or any(len(s) > 2 for s in self.suffix):
+                self.match = and_query(self.match, strings_query(self.suffix))
+                self.suffix = set(s[-2:] for s in self.suffix)
+            if len(self.prefix) > MAX_SET:
+                self.prefix = set([''])
+            if len(self.suffix) > MAX_SET:
+                self.suffix = set([''])
+        return self
+
+    def starts(self):
+        """Get the strings matches start with."""
+
+        return self.exact if self.exact is not None else self.prefix
+
+    def ends(self):
+        """Get the strings matches end with."""
+
+        return self.exact if self.exact is not None else self.suffix
+
+
+def empty_info():
+    """Get the info of a pattern that matches only the empty string."""
+
+    return Info(True, set(['']))
+
+
+def any_char_info():
+    """Get the info of a pattern that matches any one character."""
+
+    return Info(False)
+
+
+def any_info():
+    """Get the info of a pattern that matches anything, including the empty string."""
+
+    return Info(True)
+
+
+def concat(x, y):
+    """Info for `x` followed by `y`."""
+
+    if x.exact is not None and y.exact is not None and len(x.exact) * len(y.exact) <= MAX_SET:
+        return Info(x.emptyable and y.emptyable, cross(x.exact, y.exact), match=and_query(x.match, y.match))
+
+    info = Info(x.emptyable and y.emptyable, match=and_query(x.match, y.match))
+    info.prefix = cross(x.exact, y.prefix) if x.exact is not None else set(x.prefix)
+    if x.emptyable:
+        info.prefix |= y.starts()
+    info.suffix = cross(x.suffix, y.exact) if y.exact is not None else set(y.suffix)
+    if y.emptyable:
+        info.suffix |= x.ends()
+    # Trigrams that span the join
+    joined = cross(x.ends(), y.starts())
+    if len(joined) <= MAX_SET:
+        info.match = and_query(info.match, strings_query(joined))
+    return info.simplify()
+
+
+def alternate(x, y):
+    """Info for `x` or `y`."""
+
+    if x.exact is not None and y.exact is not None and len(x.exact | y.exact) <= MAX_SET:
+        return Info(x.emptyable or y.emptyable, x.exact | y.exact, match=or_query(x.match, y.match))
+    x = Info(x.emptyable, x.exact, x.prefix, x.suffix, x.match)
+    y = Info(y.emptyable, y.exact, y.prefix, y.suffix, y.match)
+    # Fold the exact sets into the queries before they are lost
+    for info in (x, y):
+        if info.exact is not None:
+            info.match = and_query(info.match, strings_query(info.exact))
+    return Info(
+        x.emptyable or y.emptyable, None, x.starts() | y.starts(), x.ends() | y.ends(), or_query(x.match, y.match)
+    ).simplify()
+
+
+def plus(x):
+    """Info for one or more `x`."""
+
+    info = Info(x.emptyable, None, set(x.starts()), set(x.ends()), x.match)
+    if x.exact is not None:
+        info.match = and_query(info.match, strings_query(x.exact))
+    return info.simplify()
+
+
+class QueryBuilder(object):
+    """Analyze a parsed pattern."""
+
+    def __init__(self, flags):
+        """Initialize."""
+
+        self.flags = flags
+
+    def char(self, c, ignorecase):
+        """Info for a literal character."""
+
+        ch = chr(c)
+        if ignorecase:
+            # Unicode case insensitivity relates characters case folding does not (`i`, `I`, `İ`, `ı`)
+            if c >= 128 or ch.lower() == 'i':
+                return any_char_info()
+            return Info(False, set([ch.lower()]))
+        return Info(False, set([fold(ch)]))
+
+    def char_class(self, items, ignorecase):
+        """Info for a character class."""
+
+        chars = set()
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                chars.add(av)
+            elif op is sre_parse.RANGE and av[1] - av[0] < MAX_CLASS:
+                chars.update(range(av[0], av[1] + 1))
+            else:
+                return any_char_info()
+            if len(chars) > MAX_CLASS:
+                return any_char_info()
+        info = None
+        for c in chars:
+            char = self.char(c, ignorecase)
+            info = char if info is None else alternate(info, char)
+        return any_char_info() if info is None else info
+
+    def sequence(self, subpattern, ignorecase):
+        """Info for a sequence of parsed items."""
+
+        info = empty_info()
+        for op, av in subpattern:
+            info = concat(info, self.item(op, av, ignorecase))
+        return info
+
+    def item(self, op, av, ignorecase):
+        """Info for a parsed item."""
+
+        if op is sre_parse.LITERAL:
+            return self.char(av, ignorecase)
+        elif op is sre_parse.IN:
+            return self.char_class(av, ignorecase)
+        elif op in (sre_parse.NOT_LITERAL, sre_parse.ANY):
+            return any_char_info()
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            return empty_info()
+        elif op is sre_parse.BRANCH:
+            info = None
+            for p in av[1]:
+                branch = self.sequence(p, ignorecase)
+                info = branch if info is None else alternate(info, branch)
+            return info
+        elif op is sre_parse.SUBPATTERN:
+            p = av[-1]
+            if len(av) == 4:
+                if av[1] & re.IGNORECASE:
+                    ignorecase = True
+                if av[2] & re.IGNORECASE:
+                    ignorecase = False
+            return self.sequence(p, ignorecase)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or getattr(sre_parse, 'POSSESSIVE_REPEAT', None) is op:
+            low, high, p = av
+            if high == 0:
+                return empty_info()
+            info = self.sequence(p, ignorecase)
+            if low == 0:
+                return alternate(info, empty_info()) if high == 1 else any_info()
+            if low == high and low <= 3:
+                repeated = info
+                for _ in range(low - 1):
+                    repeated = concat(repeated, info)
+                return repeated
+            return plus(info)
+        elif getattr(sre_parse, 'ATOMIC_GROUP', None) is op:
+            return self.sequence(av, ignorecase)
+        # Back references and anything else: could be anything
+        return any_info()
+
+    def query(self, pattern):
+        """Get the trigram query of a pattern."""
+
+        parsed = sre_parse.parse(pattern, self.flags)
+        state = getattr(parsed, 'state', None) or parsed.pattern
+        info = self.sequence(parsed, bool(state.flags & re.IGNORECASE))
+        if info.exact is not None:
+            return and_query(info.match, strings_query(info.exact))
+        return and_query(info.match, and_query(strings_query(info.prefix), strings_query(info.suffix)))
+
+
+def pattern_query(pattern, flags):
+    """Get the trigram query of a regular expression, or `ALL` if it cannot be analyzed."""
+
+    try:
+        return QueryBuilder(flags).query(pattern)
+    except Exception:
+        return ALL
+
+
+def satisfies(query, grams):
+    """See if a set of trigrams satisfies a query."""
+
+    if query == ALL:
+        return True
+    if isinstance(query, str):
+        return query in grams
+    op, parts = query
+    if op == 'and':
+        return all(satisfies(q, grams) for q in parts)
+    return any(satisfies(q, grams) for q in parts)
+
+
+def rule_query(rule):
+    """Get the trigram query of a rule."""
+
+    from RegReplace.rr_rules import search_flags
+
+    find = rule.get('find')
+    if not find:
+        return ALL
+    if rule.get('literal', False):
+        find = re.escape(find)
+    return pattern_query(find, search_flags(rule))
+
+
+class TrigramIndex(object):
+    """Trigram index of the text files in a folder, kept in SQLite."""
+
+    def __init__(self, path):
+        """Open (or create) the index."""
+
+        self.conn = sqlite3.connect(os.path.abspath(os.path.expanduser(path)), timeout=BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+
+    def close(self):
+        """Close the index."""
+
+        self.conn.close()
+
+    def update(self, root, read_text):
+        """
+        Bring the index up to date with the files under the root.
+
+        `read_text(path)` returns a file's text, or `None` if it is not text.
+        Only new and changed files (by size and modification time) are read,
+        but every file under the root is still listed and stat'ed, so an
+        update costs one `stat` per file even when nothing has changed.
+        Folders cannot be skipped by their own modification time: editing a
+        file in place does not change the time of the folder it is in.
+        Returns the number of files (re)indexed.
+        """
+
+        root = os.path.abspath(root)
+        known = dict(
+            (row[0], (row[1], row[2], row[3]))
+            for row in self.conn.execute('SELECT path, id, mtime, size FROM files WHERE path >= ? AND path < ?', (
+                root + os.sep, root + chr(ord(os.sep) + 1)
+            ))
+        )
+        updated = 0
+        with self.conn:
+            for folder, dirs, files in os.walk(root):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+                for name in sorted(files):
+                    path = os.path.join(folder, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entry = known.pop(path, None)
+                    if entry is not None and entry[1:] == (st.st_mtime_ns, st.st_size):
+                        continue
+                    if entry is not None:
+                        self.remove(entry[0])
+                    self.add(path, st, read_text)
+                    updated += 1
+            for file_id, mtime, size in known.values():
+                self.remove(file_id)
+        return updated
+
+    def add(self, path, st, read_text):
+        """Index a file."""
+
+        text = None if st.st_size > MAX_INDEX_SIZE else read_text(path)
+        indexed = 1 if text is not None else (0 if st.st_size > MAX_INDEX_SIZE else -1)
+        cursor = self.conn.execute(
+            'INSERT INTO files (path, mtime, size, indexed) VALUES (?, ?, ?, ?)',
+            (path, st.st_mtime_ns, st.st_size, indexed)
+        )
+        if text is not None:
+            file_id = cursor.lastrowid
+            self.conn.executemany(
+                'INSERT INTO grams VALUES (?, ?)', ((gram_key(g), file_id) for g in text_grams(fold(text)))
+            )
+
+    def remove(self, file_id):
+        """Remove a file from the index."""
+
+        self.conn.execute('DELETE FROM grams WHERE file = ?', (file_id,))
+        self.conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def postings(self, gram, cache):
+        """Get the ids of the files that contain a trigram."""
+
+        if gram not in cache:
+            cache[gram] = set(
+                row[0] for row in self.conn.execute('SELECT file FROM grams WHERE gram = ?', (gram_key(gram),))
+            )
+        return cache[gram]
+
+    def evaluate(self, query, everything, cache):
+        """Get the ids of the indexed files that satisfy a query."""
+
+        if query == ALL:
+            return everything
+        if isinstance(query, str):
+            return self.postings(query, cache)
+        op, parts = query
+        if op == 'and':
+            result = None
+            # Start from the rarest trigrams to keep the intermediate sets small
+            grams = sorted((q for q in parts if isinstance(q, str)), key=lambda q: len(self.postings(q, cache)))
+            for part in grams + [q for q in parts if not isinstance(q, str)]:
+                ids = self.evaluate(part, everything, cache)
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+            return result if result is not None else everything
+        result = set()
+        for part in parts:
+            result |= self.evaluate(part, everything, cache)
+        return result
+
+    def candidates(self, root, queries):
+        """Get the files under the root that may match one of the queries (all of them if it is unindexed)."""
+
+        root = os.path.abspath(root)
+        files = dict(
+            (row[0], (row[1], row[2]))
+            for row in self.conn.execute('SELECT id, path, indexed FROM files WHERE path >= ? AND path < ?', (
+                root + os.sep, root + chr(ord(os.sep) + 1)
+            ))
+        )
+        everything = set(file_id for file_id, (path, indexed) in files.items() if indexed == 1)
+        cache = {}
+        ids = set(file_id for file_id, (path, indexed) in files.items() if indexed == 0)
+        for query in queries:
+            ids |= self.evaluate(query, everything, cache) & everything
+        return sorted(files[file_id][0] for file_id in ids)
@@ -0,0 +1,457 @@
+"""
+Benchmark RegReplace against generated corpora.
+
+Runs `FindReplace` and `RegReplaceCommand` in process against the fake `sublime`
+module in `tests/fake_sublime.py`, and reports time, peak memory, and the number
+of view API calls of each case.  Results are compared against a stored baseline
+(`tests/benchmark_baseline.json`).
+
+    python -m tests.benchmark                 # run and compare against the baseline
+    python -m tests.benchmark --save          # run and store a new baseline
+    python -m tests.benchmark --case json     # only run cases whose name contains "json"
+
+Timing is machine dependent, so time regressions are only reported; a change in a
+case's output or API call counts means the engine's behavior changed and is an error.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+from __future__ import print_function
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+from . import fake_sublime
+from . import validate_json_format
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS_FILE = os.path.join(PACKAGE_PATH, 'reg_replace.sublime-settings')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SCALE = 1
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+
+WORDS = (
+    'alpha', 'beta', 'gamma', 'delta', 'value', 'count', 'index', 'result', 'buffer', 'region',
+    'scope', 'match', 'replace', 'sweep', 'view', 'rule', 'caf\u00e9', 'na\u00efve', '\u00fcber'
+)
+
+# Rules used by the benchmarks in addition to the default rules in `reg_replace.sublime-settings`.
+EXTRA_RULES = {
+    "bench_collapse_spaces": {
+        "find": "  ",
+        "replace": " "
+    },
+    "bench_literal_error": {
+        "find": "ERROR",
+        "replace": "error",
+        "literal": True
+    },
+    "bench_swap_key_value": {
+        "find": "\"(\\w+)\": (\\d+)",
+        "replace": "\"\\2\": \\1",
+        "scope_filter": ["-comment"]
+    },
+    "bench_swap_key_value_linear": {
+        "find": "\"(\\w+)\": (\\d+)",
+        "replace": "\"\\2\": \\1",
+        "engine": "linear"
+    },
+    "bench_trailing_spaces_linear": {
+        "find": "[ \\t]+$",
+        "replace": "",
+        "engine": "linear"
+    },
+    "bench_strip_string_spaces": {
+        "scope": "string",
+        "find": "(\\w) (\\w)",
+        "replace": "\\1_\\2",
+        "multi_pass_regex": True
+    },
+    "bench_comment_upper_todo": {
+        "scope": "comment",
+        "find": "todo",
+        "replace": "TODO",
+        "case": False,
+        "greedy_replace": True
+    },
+    "bench_first_string": {
+        "scope": "string",
+        "greedy_scope": False
+    },
+    "bench_non_ascii": {
+        "find": "[^\\x00-\\x7f]+"
+    },
+    "bench_first_number": {
+        "find": "\\d+",
+        "replace": "N",
+        "greedy": False
+    }
+}
+
+
+def words(rand, count):
+    """Get random words."""
+
+    return ' '.join(rand.choice(WORDS) for _ in range(count))
+
+
+def corpus_json(scale):
+    """Large JSON with comments and dangling commas."""
+
+    rand = random.Random(1)
+    lines = ['{']
+    for index in range(2000 * scale):
+        if index % 10 == 0:
+            lines.append('    // %s todo' % words(rand, 4))
+        lines.append('    "%s_%d": {' % (rand.choice(WORDS), index))
+        lines.append('        "name": "%s, ]",' % words(rand, 3))
+        lines.append('        "count": %d,' % rand.randint(0, 10000))
+        lines.append('        "tags": ["%s", "%s",],' % (rand.choice(WORDS), rand.choice(WORDS)))
+        lines.append('    },')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def corpus_html(scale):
+    """HTML with comments and deprecated type attributes."""
+
+    rand = random.Random(2)
+    lines = ['<html>', '<head>']
+    for index in range(300 * scale):
+        lines.append('<script type="text/javascript" src="%s_%d.js"></script>' % (rand.choice(WORDS), index))
+        lines.append('<style type=\'text/css\' media="screen">.%s { color: red; }</style>' % rand.choice(WORDS))
+    lines.append('</head>')
+    lines.append('<body>')
+    for index in range(2000 * scale):
+        if index % 5 == 0:
+            lines.append('<!-- %s -->' % words(rand, 6))
+        lines.append('<p class="%s">%s</p>   ' % (rand.choice(WORDS), words(rand, 12)))
+    lines.append('</body>')
+    lines.append('</html>')
+    return '\n'.join(lines) + '\n'
+
+
+def corpus_log(scale):
+    """Log file with runs of spaces and non ASCII text."""
+
+    rand = random.Random(3)
+    levels = ('INFO', 'DEBUG', 'WARNING', 'ERROR')
+    lines = []
+    for index in range(10000 * scale):
+        lines.append(
+            '2015-06-%02d 12:%02d:%02d %-7s %s%s' % (
+                index % 28 + 1, index % 60, rand.randint(0, 59), rand.choice(levels),
+                ' ' * rand.randint(1, 6), words(rand, 8)
+            )
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def corpus_code(scale):
+    """Comment heavy code with trailing spaces."""
+
+    rand = random.Random(4)
+    lines = []
+    for index in range(3000 * scale):
+        kind = index % 6
+        if kind == 0:
+            lines.append('/* %s todo */' % words(rand, 10))
+        elif kind == 1:
+            lines.append('// %s    ' % words(rand, 8))
+        elif kind == 2:
+            lines.append('# %s todo %s' % (words(rand, 3), words(rand, 3)))
+        else:
+            lines.append(
+                '    %s = call("%s", %d);%s' % (
+                    rand.choice(WORDS), words(rand, 3), rand.randint(0, 999), ' ' * rand.randint(0, 3)
+                )
+            )
+    return '\n'.join(lines) + '\n'
+
+
+CORPORA = {
+    'json': corpus_json,
+    'html': corpus_html,
+    'log': corpus_log,
+    'code': corpus_code
+}
+
+# Each case runs a sequence against a corpus.
+# - `engine`: run `FindReplace` directly instead of the `reg_replace` command.
+# - `args`: extra `reg_replace` command arguments.
+# - `selections`: select every Nth line and enable `selection_only`.
+CASES = [
+    {'name': 'json_dangling_commas', 'corpus': 'json', 'sequence': ['remove_json_dangling_commas']},
+    {'name': 'json_swap_key_value', 'corpus': 'json', 'sequence': ['bench_swap_key_value'], 'engine': True},
+    {'name': 'json_swap_key_value_linear', 'corpus': 'json', 'sequence': ['bench_swap_key_value_linear']},
+    {'name': 'json_find_strings', 'corpus': 'json', 'sequence': ['bench_first_string'], 'engine': True},
+    {'name': 'html_deprecated_type', 'corpus': 'html', 'sequence': ['html5_remove_deprecated_type_attr']},
+    {'name': 'html_comments', 'corpus': 'html', 'sequence': ['remove_html_comments']},
+    {'name': 'html_trailing_spaces', 'corpus': 'html', 'sequence': ['remove_trailing_spaces']},
+    {'name': 'html_trailing_spaces_native', 'corpus': 'html', 'sequence': ['remove_trailing_spaces'],
+        'find_backend': 'native'},
+    {'name': 'html_trailing_spaces_linear', 'corpus': 'html', 'sequence': ['bench_trailing_spaces_linear']},
+    {'name': 'log_non_ascii_find', 'corpus': 'log', 'sequence': ['non_ascii_chars'], 'args': {'find_only': True}},
+    {'name': 'log_non_ascii_highlight', 'corpus': 'log', 'sequence': ['bench_non_ascii'], 'args': {'find_only': True}},
+    {'name': 'log_collapse_multi_pass', 'corpus': 'log', 'sequence': ['bench_collapse_spaces'],
+        'args': {'multi_pass': True}},
+    {'name': 'log_literal', 'corpus': 'log', 'sequence': ['bench_literal_error']},
+    {'name': 'log_literal_native', 'corpus': 'log', 'sequence': ['bench_literal_error'], 'find_backend': 'native'},
+    {'name': 'log_non_greedy', 'corpus': 'log', 'sequence': ['bench_first_number'], 'engine': True},
+    {'name': 'code_remove_comments', 'corpus': 'code', 'sequence': ['remove_comments']},
+    {'name': 'code_comment_todo', 'corpus': 'code', 'sequence': ['bench_comment_upper_todo']},
+    {'name': 'code_string_multi_pass_regex', 'corpus': 'code', 'sequence': ['bench_strip_string_spaces']},
+    {'name': 'code_default_sequence', 'corpus': 'code',
+        'sequence': ['remove_trailing_spaces', 'remove_json_dangling_commas', 'remove_comments']},
+    {'name': 'code_fold_comments', 'corpus': 'code', 'sequence': ['remove_comments'], 'args': {'action': 'fold'}},
+    {'name': 'code_selection_only', 'corpus': 'code', 'sequence': ['remove_trailing_spaces'], 'selections': 10},
+    {'name': 'code_selection_full_file', 'corpus': 'code', 'sequence': ['remove_trailing_spaces'],
+        'selections': 10, 'args': {'regex_full_file_with_selections': True}},
+    {'name': 'log_count_only', 'corpus': 'log', 'sequence': ['non_ascii_chars', 'bench_literal_error'],
+        'args': {'count_only': True}},
+    {'name': 'code_count_only_scope', 'corpus': 'code', 'sequence': ['remove_comments', 'bench_comment_upper_todo'],
+        'args': {'count_only': True}}
+]
+
+
+def load_rules():
+    """Load the default rules from the settings file and add the benchmark rules."""
+
+    with open(SETTINGS_FILE, 'r') as f:
+        text = f.read()
+    checker = validate_json_format.CheckJsonFormat(False, True)
+    checker.index_lines(text)
+    rules = json.loads(checker.check_comments(text))['replacements']
+    rules.update(EXTRA_RULES)
+    return rules
+
+
+def setup(rules):
+    """Install the fake `sublime` module and load the plugin."""
+
+    sublime = fake_sublime.install(PACKAGE_PATH)
+    settings = sublime.load_settings('reg_replace.sublime-settings')
+    settings.values = {'replacements': rules}
+    from RegReplace import rr_sequencer
+    rr_sequencer.plugin_loaded()
+    del sublime.timeouts[:]
+    return sublime, settings
+
+
+def select_lines(view, step):
+    """Select every `step` line of the view."""
+
+    pt = 0
+    line = 0
+    text = view.text
+    while pt < len(text):
+        end = text.find('\n', pt)
+        if end == -1:
+            end = len(text)
+        if line % step == 0:
+            view.selection.add(fake_sublime.Region(pt, end))
+        pt = end + 1
+        line += 1
+
+
+def run_once(case, text, rules, settings, window):
+    """Run a case once and return the view and the found regions (or the reported counts)."""
+
+    settings.values['selection_only'] = bool(case.get('selections'))
+    settings.values['find_backend'] = case.get('find_backend', 'python')
+    view = window.new_file(text)
+    if case.get('selections'):
+        select_lines(view, case['selections'])
+    regions = None
+    if case.get('engine'):
+        from RegReplace.rr_replacer import FindReplace
+        replace = FindReplace(view, None, False, False, bool(case.get('selections')), 100, None)
+        for name in case['sequence']:
+            rule = rules[name]
+            replace.search(rule, 'scope' in rule, name)
+        regions = list(replace.target_regions)
+        replace.close()
+    else:
+        args = {'replacements': case['sequence']}
+        args.update(case.get('args', {}))
+        view.run_command('reg_replace', args)
+        if args.get('count_only'):
+            # The counts are the outcome
+            regions = fake_sublime.statuses[-1]
+    window.view_list.remove(view)
+    del fake_sublime.timeouts[:]
+    return view, regions
+
+
+def digest(view, regions):
+    """Digest the outcome of a case: the buffer and the found, highlighted, and folded regions."""
+
+    outcome = [view.text]
+    if isinstance(regions, list):
+        outcome.append(repr(sorted(regions)))
+    elif regions is not None:
+        outcome.append(regions)
+    for key in sorted(view.regions.keys()):
+        outcome.append('%s:%r' % (key, sorted((r.begin(), r.end()) for r in view.regions[key])))
+    outcome.append(repr([(r.begin(), r.end()) for r in view.folded]))
+    return hashlib.sha1('\n'.join(outcome).encode('utf-8')).hexdigest()[:16]
+
+
+def run_case(case, scale, repeat, rules, settings, window):
+    """Run a case and report the best time, peak memory, API calls, and a digest of the outcome."""
+
+    text = CORPORA[case['corpus']](scale)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_once(case, text, rules, settings, window)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    # Count calls and measure memory on a separate run, as tracing slows things down.
+    fake_sublime.View.reset_calls()
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+    view, regions = run_once(case, text, rules, settings, window)
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    calls = dict(fake_sublime.View.total_calls)
+
+    return {
+        'size': len(text),
+        'time_ms': round(best * 1000, 3),
+        'peak_kb': round(peak / 1024.0, 1) if peak is not None else None,
+        'calls': calls,
+        'digest': digest(view, regions)
+    }
+
+
+def run(scale=DEFAULT_SCALE, repeat=DEFAULT_REPEAT, names=None):
+    """Run the benchmarks."""
+
+    rules = load_rules()
+    sublime, settings = setup(rules)
+    window = sublime.active_window()
+    results = {}
+    for case in CASES:
+        if names and not any(name in case['name'] for name in names):
+            continue
+        results[case['name']] = run_case(case, scale, repeat, rules, settings, window)
+    return {'scale': scale, 'cases': results}
+
+
+def load_baseline(path=BASELINE_FILE):
+    """Load the stored baseline."""
+
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Store results as the baseline."""
+
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results against the baseline.
+
+    Returns a list of errors (changed outcome or API call counts) and
+    a list of warnings (time regressions past the threshold).
+    """
+
+    errors = []
+    warnings = []
+    if baseline is None:
+        return errors, warnings
+    if baseline.get('scale') != results['scale']:
+        warnings.append('baseline was run at scale %s, not %s' % (baseline.get('scale'), results['scale']))
+        return errors, warnings
+    for name, result in sorted(results['cases'].items()):
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        if result['digest'] != base['digest']:
+            errors.append('%s: outcome changed' % name)
+        if result['calls'] != base['calls']:
+            errors.append('%s: API calls changed from %r to %r' % (name, base['calls'], result['calls']))
+        if base['time_ms'] and result['time_ms'] > base['time_ms'] * (1 + threshold):
+            warnings.append(
+                '%s: %.2fms is %.0f%% slower than the baseline %.2fms' % (
+                    name, result['time_ms'], (result['time_ms'] / base['time_ms'] - 1) * 100, base['time_ms']
+                )
+            )
+    return errors, warnings
+
+
+def report(results, baseline=None):
+    """Format a table of the results."""
+
+    lines = [
+        '%-30s %9s %10s %9s %10s %9s' % ('case', 'size', 'time (ms)', 'baseline', 'peak (kb)', 'API calls')
+    ]
+    for name, result in sorted(results['cases'].items()):
+        base = baseline['cases'].get(name) if baseline is not None else None
+        lines.append(
+            '%-30s %9d %10.2f %9s %10s %9d' % (
+                name, result['size'], result['time_ms'],
+                '%.2f' % base['time_ms'] if base is not None else '-',
+                '%.1f' % result['peak_kb'] if result['peak_kb'] is not None else '-',
+                sum(result['calls'].values())
+            )
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+
+    parser = argparse.ArgumentParser(prog='python -m tests.benchmark', description='Benchmark RegReplace.')
+    parser.add_argument('--scale', type=int, default=DEFAULT_SCALE, help='Corpus size multiplier.')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per case (best is kept).')
+    parser.add_argument('--case', action='append', help='Only run cases whose name contains this.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file.')
+    parser.add_argument('--save', action='store_true', help='Store the results as the new baseline.')
+    parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD, help='Time regression to warn about (0.25 = 25%%).'
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.repeat, args.case)
+    baseline = load_baseline(args.baseline)
+    print(report(results, baseline))
+
+    if args.save:
+        if baseline is not None and args.case:
+            baseline['cases'].update(results['cases'])
+            results = baseline
+        save_baseline(results, args.baseline)
+        print('\nBaseline saved: %s' % args.baseline)
+        return 0
+
+    errors, warnings = compare(results, baseline, args.threshold)
+    for warning in warnings:
+        print('WARNING: %s' % warning)
+    for error in errors:
+        print('ERROR: %s' % error)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,647 @@
+"""
+In-process stand-in for the `sublime` and `sublime_plugin` modules.
+
+Builds on the headless module (`rr_headless`) that runs the engine outside
+of Sublime Text, adding what the tests need on top of it.  Syntax scopes
+are faked with a regex that tags comments and double quoted strings, which
+is enough to exercise scope rules and scope filters.  Every `View` API call
+is counted so that benchmarks can report how chatty the engine is with the
+view.  There are windows and output panels, and callbacks and status
+messages are queued for the tests to inspect.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+import os
+import re
+import sys
+import types
+from bisect import bisect_left, bisect_right
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def register_package(package_path):
+    """Register `package_path` as the `RegReplace` package."""
+
+    if 'RegReplace' not in sys.modules:
+        package = types.ModuleType('RegReplace')
+        package.__path__ = [package_path]
+        sys.modules['RegReplace'] = package
+
+
+register_package(PACKAGE_PATH)
+
+from RegReplace import rr_headless  # noqa: E402
+from RegReplace.rr_headless import (  # noqa: E402,F401
+    DRAW_EMPTY_AS_OVERWRITE, DRAW_OUTLINED, DRAW_NO_FILL, DRAW_NO_OUTLINE, DRAW_SOLID_UNDERLINE,
+    DRAW_SQUIGGLY_UNDERLINE, HIDE_ON_MINIMAP, LITERAL, IGNORECASE,
+    Region, Settings, TextCommand, WindowCommand, ApplicationCommand, EventListener
+)
+
+RE_SCOPES = re.compile(
+    r'''(?x)
+    (?P<comment_line>(?://|\#)[^\n]*) |
+    (?P<comment_block>/\*[\s\S]*?\*/|<!--[\s\S]*?-->) |
+    (?P<string>"(?:\\.|[^"\\\n])*")
+    '''
+)
+RE_NATIVE_MODES = re.compile(r'\(\?([is]*)(?:-([is]+))?\)')
+RE_NATIVE_ESCAPES = re.compile(r'\\x\{([0-9a-fA-F]+)\}|\\g\{(\d+)\}|\\.')
+RE_NATIVE_FORMAT = re.compile(r'\$\{(\d+)\}|\$[&$]|\\.', re.DOTALL)
+RE_OPENERS = re.compile(r'"|/\*|<!--')
+OPENER_CHARS = frozenset('/<!-')
+SCOPE_NAMES = {
+    'comment_line': 'source.fake comment.line',
+    'comment_block': 'source.fake comment.block',
+    'string': 'source.fake string.quoted.double'
+}
+
+settings_store = {}
+resources = {}
+windows = []
+timeouts = []
+statuses = []
+clipboard = ['']
+
+
+def native_regex(pattern, flags=0):
+    r"""
+    Compile a pattern written for Sublime's regex engine with `re`.
+
+    Only the syntax `rr_native` produces that `re` spells differently is
+    translated: leading mode switches, `\x{...}`, `\z`, and `\g{n}`.
+    """
+
+    re_flags = re.MULTILINE
+    if flags & LITERAL:
+        pattern = re.escape(pattern)
+    if flags & IGNORECASE:
+        re_flags |= re.IGNORECASE
+    m = RE_NATIVE_MODES.match(pattern)
+    if m:
+        if 'i' in m.group(1):
+            re_flags |= re.IGNORECASE
+        if 's' in m.group(1):
+            re_flags |= re.DOTALL
+        pattern = pattern[m.end():]
+
+    def translate(m):
+        if m.group(1):
+            return re.escape(chr(int(m.group(1), 16)))
+        if m.group(2):
+            return '(?:\\%s)' % m.group(2)
+        if m.group(0) == '\\z':
+            return '\\Z'
+        return m.group(0)
+
+    return re.compile(RE_NATIVE_ESCAPES.sub(translate, pattern), re_flags)
+
+
+def native_format(fmt, m):
+    """Expand a format string for Sublime's regex engine (`${n}`, `$&`, `$$` and escapes)."""
+
+    def expand(f):
+        if f.group(1) is not None:
+            return m.group(int(f.group(1))) or ''
+        if f.group(0) == '$&':
+            return m.group(0)
+        if f.group(0) == '$$':
+            return '$'
+        c = f.group(0)[1]
+        return {'n': '\n', 't': '\t', 'r': '\r'}.get(c, c)
+
+    return RE_NATIVE_FORMAT.sub(expand, fmt)
+
+
+class Selection(rr_headless.Selection):
+    """
+    View selection.
+
+    How Sublime moves a point that is inside of replaced text is not
+    emulated exactly, so there are two ways to move them (`inside`):
+    `end` moves them to the end of the new text, as the headless view does,
+    and `clamp` keeps their offset from the start of the replaced text,
+    unless the new text is shorter.  The engine must behave the same either
+    way, and the fuzz harness runs cases with both.
+    """
+
+    inside = 'end'
+
+    def __init__(self, view):
+        """Initialize."""
+
+        super().__init__()
+        self.view = view
+
+    def shift(self, begin, end, size):
+        """Adjust the selections after `begin`-`end` is replaced with text of the given size."""
+
+        if self.inside == 'end':
+            super().shift(begin, end, size)
+            return
+
+        delta = size - (end - begin)
+
+        def move(pt):
+            if pt >= end:
+                return pt + delta
+            if pt > begin:
+                return min(pt, begin + size)
+            return pt
+
+        regions = []
+        for r in self.regions:
+            region = Region(move(r.a), move(r.b))
+            if regions and region.begin() <= regions[-1].end():
+                regions[-1] = regions[-1].cover(region)
+            else:
+                regions.append(region)
+        self.regions = regions
+
+
+class View(rr_headless.View):
+    """
+    Text buffer with a fake syntax.
+
+    API calls are counted in `calls` (per view) and `View.total_calls` (all views).
+    """
+
+    next_id = 1
+    total_calls = {}
+
+    def __init__(self, text='', file_name=None, window=None):
+        """Initialize."""
+
+        super().__init__(text, file_name)
+        self.view_id = View.next_id
+        View.next_id += 1
+        self.parent = window
+        self.selection = Selection(self)
+        self.regions = {}
+        self.folded = []
+        self.read_only = False
+        self.calls = {}
+        self.scope_cache = None
+
+    @classmethod
+    def reset_calls(cls):
+        """Reset the API call counts of all views."""
+
+        cls.total_calls = {}
+
+    def count(self, name):
+        """Count an API call."""
+
+        self.calls[name] = self.calls.get(name, 0) + 1
+        View.total_calls[name] = View.total_calls.get(name, 0) + 1
+
+    def scopes(self, pt=None):
+        """
+        Get the begins, ends and names of the fake syntax scopes.
+
+        Like Sublime's incremental parsing, an edit only invalidates the scopes from
+        the edit on, so looking up points before all edits since the last parse
+        (as the engine does when it replaces in reverse) does not re-parse the buffer.
+        """
+
+        if self.scope_cache is None or pt is None or pt >= self.scope_cache[3]:
+            begins = []
+            ends = []
+            names = []
+            for m in RE_SCOPES.finditer(self.text):
+                begins.append(m.start())
+                ends.append(m.end())
+                names.append(SCOPE_NAMES[m.lastgroup])
+            # Openers that did not start a scope (a quote with no closing quote on its line,
+            # an unclosed block comment) could start one after an edit further on.
+            quotes = []
+            unclosed = len(self.text) + 1
+            for m in RE_OPENERS.finditer(self.text):
+                index = bisect_right(begins, m.start()) - 1
+                if index < 0 or m.start() >= ends[index]:
+                    if m.group(0) == '"':
+                        quotes.append(m.start())
+                    elif unclosed > m.start():
+                        unclosed = m.start()
+            self.scope_cache = [begins, ends, names, len(self.text) + 1, quotes, unclosed]
+        return self.scope_cache[:3]
+
+    @staticmethod
+    def matches_selector(name, selector):
+        """See if a scope name matches a (simple, comma separated) selector."""
+
+        parts = name.split(' ')
+        for entry in selector.split(','):
+            entry = entry.strip()
+            if entry == 'source' or entry == 'source.fake':
+                return True
+            for part in parts:
+                if part == entry or part.startswith(entry + '.'):
+                    return True
+        return False
+
+    def window(self):
+        """Get the view's window."""
+
+        return self.parent
+
+    def change_count(self):
+        """Get the change count."""
+
+        self.count('change_count')
+        return super().change_count()
+
+    def size(self):
+        """Get the size of the buffer."""
+
+        self.count('size')
+        return super().size()
+
+    def substr(self, x):
+        """Get the text of a region or the character at a point."""
+
+        self.count('substr')
+        return super().substr(x)
+
+    def replace(self, edit, region, text):
+        """Replace a region."""
+
+        self.count('replace')
+        super().replace(edit, region, text)
+        if self.scope_cache is not None:
+            self.invalidate_scopes(region.begin())
+
+    def invalidate_scopes(self, begin):
+        """Invalidate the scopes that an edit at `begin` could change."""
+
+        begins, ends, names, valid, quotes, unclosed = self.scope_cache
+        # Up to three characters before the edit could be joined with it into an opener (`<!-` + `-`)
+        before = max(begin - 3, 0)
+        valid = min(valid, before if OPENER_CHARS.intersection(self.text[before:begin]) else begin)
+        # A scope the edit is in or touches
+        index = bisect_left(ends, begin)
+        if index < len(begins):
+            valid = min(valid, begins[index])
+        # A quote on the same line or an unclosed block comment before the edit
+        index = bisect_left(quotes, self.text.rfind('\n', 0, begin) + 1)
+        if index < len(quotes) and quotes[index] < begin:
+            valid = min(valid, quotes[index])
+        if unclosed < begin:
+            valid = min(valid, unclosed)
+        self.scope_cache[3] = valid
+
+    def insert(self, edit, pt, text):
+        """Insert text."""
+
+        self.count('insert')
+        return super().insert(edit, pt, text)
+
+    def erase(self, edit, region):
+        """Erase a region."""
+
+        self.count('erase')
+        super().erase(edit, region)
+
+    def sel(self):
+        """Get the selection."""
+
+        self.count('sel')
+        return super().sel()
+
+    def score_selector(self, pt, selector):
+        """Score the selector at a point."""
+
+        self.count('score_selector')
+        begins, ends, names = self.scopes(pt)
+        index = bisect_right(begins, pt) - 1
+        if index >= 0 and pt < ends[index] and self.matches_selector(names[index], selector):
+            return 1
+        return 1 if self.matches_selector('source.fake', selector) else 0
+
+    def scope_name(self, pt):
+        """Get the scope name at a point."""
+
+        self.count('scope_name')
+        begins, ends, names = self.scopes(pt)
+        index = bisect_right(begins, pt) - 1
+        if index >= 0 and pt < ends[index]:
+            return names[index] + ' '
+        return 'source.fake '
+
+    def find_by_selector(self, selector):
+        """Find all regions matching the selector."""
+
+        self.count('find_by_selector')
+        begins, ends, names = self.scopes()
+        return [
+            Region(begin, end) for begin, end, name in zip(begins, ends, names)
+            if self.matches_selector(name, selector)
+        ]
+
+    def find(self, pattern, start_pt, flags=0):
+        """Find the first match of a pattern at or after a point."""
+
+        self.count('find')
+        m = native_regex(pattern, flags).search(self.text, start_pt)
+        return Region(-1, -1) if m is None else Region(m.start(), m.end())
+
+    def find_all(self, pattern, flags=0, fmt=None, extractions=None):
+        """Find all matches of a pattern."""
+
+        self.count('find_all')
+        regions = []
+        for m in native_regex(pattern, flags).finditer(self.text):
+            regions.append(Region(m.start(), m.end()))
+            if fmt is not None and extractions is not None:
+                extractions.append(native_format(fmt, m))
+        return regions
+
+    def full_line(self, x):
+        """Get the full line of a point or region."""
+
+        if isinstance(x, Region):
+            begin, end = x.begin(), x.end()
+        else:
+            begin = end = x
+        begin = self.text.rfind('\n', 0, begin) + 1
+        end = self.text.find('\n', end)
+        return Region(begin, len(self.text) if end == -1 else end + 1)
+
+    def line(self, x):
+        """Get the line of a point or region."""
+
+        region = self.full_line(x)
+        end = region.end()
+        if end > region.begin() and self.text[end - 1:end] == '\n':
+            end -= 1
+        return Region(region.begin(), end)
+
+    def rowcol(self, pt):
+        """Get row and column of a point."""
+
+        self.count('rowcol')
+        return super().rowcol(pt)
+
+    def text_point(self, row, col):
+        """Get the point of a row and column."""
+
+        self.count('text_point')
+        pt = 0
+        for _ in range(row):
+            index = self.text.find('\n', pt)
+            if index == -1:
+                return len(self.text)
+            pt = index + 1
+        return min(pt + col, len(self.text))
+
+    def visible_region(self):
+        """Get the visible region (everything)."""
+
+        self.count('visible_region')
+        return super().visible_region()
+
+    def show(self, x, show_surrounds=True):
+        """Scroll to a point or region."""
+
+        self.count('show')
+
+    def add_regions(self, key, regions, scope='', icon='', flags=0):
+        """Add highlight regions."""
+
+        self.count('add_regions')
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        """Get highlight regions."""
+
+        self.count('get_regions')
+        return list(self.regions.get(key, []))
+
+    def erase_regions(self, key):
+        """Erase highlight regions."""
+
+        self.count('erase_regions')
+        self.regions.pop(key, None)
+
+    def fold(self, regions):
+        """Fold regions."""
+
+        self.count('fold')
+        self.folded = list(regions)
+
+    def unfold(self, regions):
+        """Unfold regions."""
+
+        self.count('unfold')
+
+    def set_syntax_file(self, syntax):
+        """Set the syntax."""
+
+    def set_read_only(self, read_only):
+        """Set read only."""
+
+        self.read_only = read_only
+
+    def is_read_only(self):
+        """See if view is read only."""
+
+        return self.read_only
+
+    def run_command(self, name, args=None):
+        """Run a text command."""
+
+        run_command(self, name, args)
+
+
+class Window(object):
+    """Window with output panels."""
+
+    next_id = 1
+
+    def __init__(self):
+        """Initialize."""
+
+        self.window_id = Window.next_id
+        Window.next_id += 1
+        self.view_list = []
+        self.panels = {}
+        self.input_panels = []
+        self.commands = []
+
+    def id(self):
+        """Get window id."""
+
+        return self.window_id
+
+    def new_file(self, text='', file_name=None):
+        """Create a view in the window."""
+
+        view = View(text, file_name, self)
+        self.view_list.append(view)
+        return view
+
+    def views(self):
+        """Get the views."""
+
+        return list(self.view_list)
+
+    def active_view(self):
+        """Get the active view."""
+
+        return self.view_list[-1] if self.view_list else None
+
+    def focus_view(self, view):
+        """Make a view the active view."""
+
+        self.view_list.remove(view)
+        self.view_list.append(view)
+
+    def get_output_panel(self, name):
+        """Get (or create) an output panel."""
+
+        if name not in self.panels:
+            self.panels[name] = View(window=self)
+        return self.panels[name]
+
+    def create_output_panel(self, name):
+        """Create an output panel."""
+
+        return self.get_output_panel(name)
+
+    def show_input_panel(self, caption, initial, on_done, on_change, on_cancel):
+        """Record an input panel request."""
+
+        self.input_panels.append((caption, initial, on_done, on_change, on_cancel))
+        return View(initial, window=self)
+
+    def run_command(self, name, args=None):
+        """Run a window command."""
+
+        run_command(self, name, args)
+
+
+def run_command(target, name, args=None):
+    """Run a command by instantiating the matching command class of the loaded plugin modules."""
+
+    class_name = ''.join(part.capitalize() for part in name.split('_')) + 'Command'
+    for module_name in sorted(sys.modules.keys()):
+        if not module_name.startswith('RegReplace.'):
+            continue
+        cls = getattr(sys.modules[module_name], class_name, None)
+        if cls is None:
+            continue
+        command = cls(target)
+        if isinstance(target, View):
+            command.run(None, **(args or {}))
+        else:
+            command.run(**(args or {}))
+        return
+    if isinstance(target, Window):
+        target.commands.append((name, args))
+
+
+def load_settings(name):
+    """Load settings."""
+
+    if name not in settings_store:
+        settings_store[name] = Settings()
+    return settings_store[name]
+
+
+def load_resource(name):
+    """Load a resource."""
+
+    return resources[name]
+
+
+def set_timeout(callback, delay=0):
+    """Queue a callback (run them with `run_timeouts`)."""
+
+    timeouts.append(callback)
+
+
+def set_timeout_async(callback, delay=0):
+    """Queue a callback (run them with `run_timeouts`)."""
+
+    timeouts.append(callback)
+
+
+def run_timeouts():
+    """Run the callbacks queued so far (callbacks they queue are left for the next call)."""
+
+    pending = timeouts[:]
+    del timeouts[:]
+    for callback in pending:
+        callback()
+
+
+def active_window():
+    """Get the active window."""
+
+    return windows[-1] if windows else None
+
+
+def platform():
+    """Get the platform."""
+
+    return 'windows' if sys.platform.startswith('win') else 'linux'
+
+
+def packages_path():
+    """Get the packages path."""
+
+    return ''
+
+
+def cache_path():
+    """Get the cache path."""
+
+    return ''
+
+
+def status_message(message):
+    """Show a status message."""
+
+    statuses.append(message)
+
+
+def set_clipboard(text):
+    """Set the clipboard."""
+
+    clipboard[0] = text
+
+
+def get_clipboard():
+    """Get the clipboard."""
+
+    return clipboard[0]
+
+
+def error_message(message):
+    """Show an error message."""
+
+
+def message_dialog(message):
+    """Show a message dialog."""
+
+
+def install(package_path):
+    """
+    Install the fake modules and register `package_path` as the `RegReplace` package.
+
+    Returns the fake `sublime` module.
+    """
+
+    sublime = sys.modules[__name__]
+    sys.modules['sublime'] = sublime
+    plugin = types.ModuleType('sublime_plugin')
+    plugin.TextCommand = TextCommand
+    plugin.WindowCommand = WindowCommand
+    plugin.ApplicationCommand = ApplicationCommand
+    plugin.EventListener = EventListener
+    sys.modules['sublime_plugin'] = plugin
+    register_package(package_path)
+    if not windows:
+        windows.append(Window())
+    return sublime
@@ -0,0 +1,264 @@
+"""
+Differential fuzzing of `FindReplace` against the reference implementation.
+
+Random rules (find, replace, literal, dotall, case, greedy, scope filters, scope
+rules, plugins, engines), find backends, and random buffers and selections are run through
+both the engine in `rr_replacer.py` and the frozen reference in
+`tests/reference_replacer.py` under the fake `sublime` module.  Each case must produce identical buffers,
+target regions, replace counts, and selections.
+
+Each case picks one of the fake view's two ways of moving selections that are
+inside of replaced text, as the engine must not depend on either.  When
+`backrefs` is installed, cases also turn on extended back references at random.
+
+    python -m tests.fuzz_replacer                         # 2000 cases from seed 0
+    python -m tests.fuzz_replacer --seed 100 --count 50   # cases 100 - 149
+
+Target regions are compared as sorted lists: the engine keeps them sorted,
+while the reference keeps them in the order they were found.
+
+Licensed under MIT
+Copyright (c) 2011 - 2015 Isaac Muse <isaacmuse@gmail.com>
+"""
+from __future__ import print_function
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import warnings
+from . import fake_sublime
+try:
+    import backrefs
+except ImportError:
+    backrefs = None
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_COUNT = 2000
+MAX_SWEEPS = 5
+MAX_SIZE = 5000
+
+TEXT_PIECES = (
+    'foo', 'bar', 'Baz', 'QUX', 'o', 'x', 'xx', '123', '7', ' ', '  ', '\t', '\n', '\n', '\n', ',', ']', '}', '(',
+    'é', 'üü', '"str ing"', '"a\\"b"', '""', '// line foo\n', '# hash bar \n', '/* block\nfoo */',
+    '<!-- html -->', '<script type="text/javascript">', '\\'
+)
+
+FIND_ATOMS = (
+    'foo', 'o', 'x', 'x*', 'x?', 'o+?', '[a-z]+', '[A-Z]', '\\w+', '\\w', '\\s+', '\\s*', '[ \\t]+$', '^\\s*', '^',
+    '$', '\\b', '\\d+', '(\\w)(\\w)', '(?P<w>\\w+)', '.', '.+?', '.*', 'o|a', '(x)?y?', '(foo|bar)', ',\\s*(\\]|\\})',
+    '"[^"]*"', '(?:foo|bar)+', '/\\*.*?\\*/', '\\n', '[^\\x00-\\x7f]+', '(', '\\'
+)
+
+LITERAL_FINDS = ('foo', 'o', 'x', ' ', '"', '\\', '.*', '\n', 'FOO', 'é', ', ')
+
+REPLACES = (
+    '', 'X', 'xx', '\\0', '\\1', '\\g<1>', '<\\1>', '\\2\\1', '\\g<w>', '\\n', 'a\\tb', '\\\\', 'é', '[\\g<0>]',
+    '\\', '\\q', '\\12', '\\012', 'foo'
+)
+
+SCOPES = ('comment', 'string', 'comment.line', 'comment, string', 'source', 'keyword')
+
+SCOPE_FILTERS = ('comment', '-comment', '!comment', '-!comment', 'string', '-string', '!string', '-!string', 'keyword')
+
+EXTENDED_FINDS = ('\\Qx.\\E', '\\p{Lu}+', '\\e', '[[:alpha:]]+')
+
+EXTENDED_REPLACES = ('\\c\\1', '\\C\\g<0>\\E!', '\\L\\0\\E', '\\l\\g<w>', '\\C\\1\\E\\2')
+
+PLUGIN_NAME = 'User.rr_fuzz_plugin'
+PLUGIN_SOURCE = '''
+def replace(m, **kwargs):
+    return '<%s:%d>' % (m.group(0).upper(), len(kwargs))
+'''
+
+
+def maybe(rand, key, rule, choices=(True, False)):
+    """Randomly set a rule option."""
+
+    if rand.random() < 0.5:
+        rule[key] = rand.choice(choices)
+
+
+def random_text(rand):
+    """Generate a random buffer."""
+
+    return ''.join(rand.choice(TEXT_PIECES) for _ in range(rand.randint(0, 40)))
+
+
+def random_find(rand, literal):
+    """Generate a random find pattern."""
+
+    if literal:
+        return rand.choice(LITERAL_FINDS)
+    return ''.join(rand.choice(FIND_ATOMS) for _ in range(rand.randint(1, 3)))
+
+
+def random_rule(rand):
+    """Generate a random rule."""
+
+    rule = {}
+    scope = rand.random() < 0.35
+    literal = rand.random() < 0.2
+    if literal:
+        rule['literal'] = True
+    if scope:
+        rule['scope'] = rand.choice(SCOPES)
+        if rand.random() < 0.8:
+            rule['find'] = random_find(rand, literal)
+        maybe(rand, 'greedy_scope', rule)
+        maybe(rand, 'greedy_replace', rule)
+        maybe(rand, 'multi_pass_regex', rule)
+    else:
+        rule['find'] = random_find(rand, literal)
+        maybe(rand, 'greedy', rule)
+        if rand.random() < 0.4:
+            rule['scope_filter'] = rand.sample(SCOPE_FILTERS, rand.randint(1, 2))
+    maybe(rand, 'case', rule)
+    maybe(rand, 'dotall', rule)
+    if rand.random() < 0.1 and not literal:
+        rule['plugin'] = PLUGIN_NAME
+        if rand.random() < 0.5:
+            rule['args'] = {'a': 1}
+    elif rand.random() < 0.85:
+        rule['replace'] = rand.choice(REPLACES)
+    maybe(rand, 'engine', rule, ('re', 'linear'))
+    return rule
+
+
+def random_selections(rand, size):
+    """Generate random selections."""
+
+    selections = []
+    for _ in range(rand.randint(0, 3)):
+        a = rand.randint(0, size)
+        b = rand.randint(a, min(size, a + 20))
+        selections.append((a, b))
+    return selections
+
+
+def random_case(seed):
+    """Generate a random case."""
+
+    rand = random.Random(seed)
+    text = random_text(rand)
+    case = {
+        'seed': seed,
+        'text': text,
+        'rules': [random_rule(rand) for _ in range(rand.randint(1, 3))],
+        'find_only': rand.random() < 0.25,
+        'action': rand.choice((None, None, None, 'mark')),
+        'multi_pass': rand.random() < 0.3,
+        'selections': random_selections(rand, len(text)),
+        'selection_only': rand.random() < 0.3,
+        'full_file': rand.random() < 0.5,
+        'find_backend': rand.choice(('python', 'native')),
+        'inside': rand.choice(('end', 'clamp'))
+    }
+    if backrefs is not None and rand.random() < 0.3:
+        case['extended_back_references'] = True
+        for rule in case['rules']:
+            if rule.get('find') is not None and not rule.get('literal') and rand.random() < 0.3:
+                rule['find'] += rand.choice(EXTENDED_FINDS)
+            if 'replace' in rule and rand.random() < 0.5:
+                rule['replace'] = rand.choice(EXTENDED_REPLACES)
+    return case
+
+
+def setup():
+    """Install the fake `sublime` module and load both engines."""
+
+    sublime = fake_sublime.install(PACKAGE_PATH)
+    sublime.load_settings('reg_replace.sublime-settings').values = {}
+    sublime.resources['Packages/User/rr_fuzz_plugin.py'] = PLUGIN_SOURCE
+    from RegReplace.rr_replacer import FindReplace
+    from .reference_replacer import FindReplace as ReferenceFindReplace
+    return FindReplace, ReferenceFindReplace
+
+
+def execute(engine, case):
+    """Run a case through an engine and return the outcome."""
+
+    settings = fake_sublime.load_settings('reg_replace.sublime-settings')
+    settings.values['find_backend'] = case['find_backend']
+    settings.values['extended_back_references'] = case.get('extended_back_references', False)
+    view = fake_sublime.View(case['text'])
+    view.selection.inside = case.get('inside', 'end')
+    for a, b in case['selections']:
+        view.selection.add(fake_sublime.Region(a, b))
+    selection_only = case['selection_only'] and len(view.selection) > 0
+    replace = engine(view, None, case['find_only'], case['full_file'], selection_only, MAX_SWEEPS, case['action'])
+    counts = []
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        with warnings.catch_warnings():
+            # Errors are printed and some random patterns warn; neither is of interest here.
+            warnings.simplefilter('ignore')
+            for rule in case['rules']:
+                scope = 'scope' in rule
+                sweeps = MAX_SWEEPS if case['multi_pass'] and not case['find_only'] and case['action'] is None else 1
+                states = set([view.text])
+                for _ in range(sweeps):
+                    count = replace.search(rule, scope)
+                    counts.append(count)
+                    # Patterns that match nothing can double the buffer on every sweep.
+                    if not count or len(view.text) > MAX_SIZE or view.text in states:
+                        break
+                    states.add(view.text)
+    finally:
+        sys.stdout = stdout
+    replace.close()
+    return {
+        'text': view.text,
+        'regions': sorted(r if isinstance(r, tuple) else (r.begin(), r.end()) for r in replace.target_regions),
+        'counts': counts,
+        'selections': [(r.a, r.b) for r in view.selection]
+    }
+
+
+def check(seed, engines):
+    """Check a case; return a description of the difference, if any."""
+
+    case = random_case(seed)
+    engine, reference = engines
+    expected = execute(reference, case)
+    result = execute(engine, case)
+    differences = [key for key in ('text', 'regions', 'counts', 'selections') if result[key] != expected[key]]
+    if differences:
+        return {'case': case, 'differences': differences, 'expected': expected, 'result': result}
+    return None
+
+
+def run(seed=0, count=DEFAULT_COUNT):
+    """Run `count` cases starting at `seed` and return the failures."""
+
+    engines = setup()
+    failures = []
+    for index in range(seed, seed + count):
+        failure = check(index, engines)
+        if failure is not None:
+            failures.append(failure)
+    return failures
+
+
+def main(argv=None):
+    """Run the fuzzer from the command line."""
+
+    parser = argparse.ArgumentParser(prog='python -m tests.fuzz_replacer', description='Fuzz FindReplace.')
+    parser.add_argument('--seed', type=int, default=0, help='First case.')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT, help='Number of cases.')
+    parser.add_argument('--show', type=int, default=3, help='Number of failures to show.')
+    args = parser.parse_args(argv)
+
+    failures = run(args.seed, args.count)
+    for failure in failures[:args.show]:
+        print(json.dumps(failure, indent=2, sort_keys=True))
+    print('%d cases, %d failures' % (args.count, len(failures)))
+    if failures:
+        print('Failed seeds: %s' % ' '.join(str(f['case']['seed']) for f in failures))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""Test benchmark outcomes."""
+import unittest
+from . import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    """Test that the benchmarks still produce the baseline outcomes."""
+
+    def test_outcomes(self):
+        """Run each case once and compare outcomes and API calls (not times) with the baseline."""
+
+        baseline = benchmark.load_baseline()
+        self.assertIsNotNone(baseline, "No benchmark baseline!")
+        results = benchmark.run(baseline['scale'], 1)
+        errors = benchmark.compare(results, baseline)[0]
+        self.assertEqual(errors, [], '\n'.join(errors))
@@ -0,0 +1,80 @@
+"""Test counting and exporting matches without replacing."""
+import copy
+import io
+import sys
+import unittest
+import warnings
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestCountOnly(unittest.TestCase):
+    """Test that counts agree with the regions a greedy `find_only` search finds."""
+
+    def setUp(self):
+        """Load the engine and silence the errors of random patterns."""
+
+        self.engine = fuzz_replacer.setup()[0]
+        self.stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        self.warnings = warnings.catch_warnings()
+        self.warnings.__enter__()
+        warnings.simplefilter('ignore')
+
+    def tearDown(self):
+        """Restore output and warnings."""
+
+        self.warnings.__exit__()
+        sys.stdout = self.stdout
+
+    def count_and_find(self, case, rule):
+        """Count the matches of a rule and find its regions in the same buffer."""
+
+        view = fake_sublime.View(case['text'])
+        for a, b in case['selections']:
+            view.selection.add(fake_sublime.Region(a, b))
+        selection_only = case['selection_only'] and len(view.selection) > 0
+        sels = [(r.a, r.b) for r in view.selection]
+
+        counter = self.engine(view, None, False, case['full_file'], selection_only, 1, None)
+        count = counter.count(rule, 'scope' in rule)
+        self.assertEqual(view.text, case['text'])
+        self.assertEqual([(r.a, r.b) for r in view.selection], sels)
+        self.assertEqual(len(counter.target_regions), 0)
+        self.assertEqual(counter.stats.rules[-1].matches, count)
+        counter.close()
+
+        # Exports write the same matches
+        exported = []
+        exporter = self.engine(view, None, False, case['full_file'], selection_only, 1, 'export')
+        exporter.export(rule, 'scope' in rule, 'rule', lambda *args: exported.append(args))
+        exporter.close()
+        self.assertEqual(view.text, case['text'])
+        self.assertEqual(len(exported), count)
+        for name, begin, end, text, replacement in exported:
+            self.assertEqual(view.text[begin:end], text)
+
+        # Counts do not depend on the replace template or plugin
+        greedy = copy.deepcopy(rule)
+        greedy.pop('replace', None)
+        greedy.pop('plugin', None)
+        greedy['greedy'] = True
+        greedy['greedy_scope'] = True
+        greedy['greedy_replace'] = True
+        finder = self.engine(view, None, True, case['full_file'], selection_only, 1, None)
+        found = finder.search(greedy, 'scope' in rule)
+        finder.close()
+        return count, found
+
+    def test_counts(self):
+        """Count random rules and compare with the regions found."""
+
+        for seed in range(1000):
+            case = fuzz_replacer.random_case(seed)
+            for rule in case['rules']:
+                count, found = self.count_and_find(case, rule)
+                if 'scope' in rule and 'find' in rule:
+                    # A search finds the scope regions with matches; the count is of the matches in them.
+                    self.assertTrue(count >= found and bool(count) == bool(found), 'Seed %d: %r' % (seed, rule))
+                else:
+                    self.assertEqual(count, found, 'Seed %d: %r' % (seed, rule))
@@ -0,0 +1,421 @@
+"""Test applying sequences outside of Sublime with `rr_daemon`."""
+import json
+import os
+import shutil
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from . import fake_sublime
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAEMON = os.path.join(PACKAGE_PATH, 'rr_daemon.py')
+
+SETTINGS = {
+    'replacements': {
+        'trim': {'find': '[ \\t]+$', 'replace': '', 'greedy': True},
+        'groups': {'find': '(\\w+)=(\\w+)', 'plugin': 'rr_modules.example', 'greedy': True},
+        'comments': {'find': 'x', 'replace': 'y', 'scope_filter': ['comment']}
+    },
+    'on_save_sequences': [
+        {'file_pattern': ['*.txt'], 'sequence': ['trim']},
+        {'file_pattern': ['*.txt'], 'sequence': ['trim'], 'action': 'mark'}
+    ]
+}
+
+DIFF = """diff --git a/one.txt b/one.txt
+index 1..2 100644
+--- a/one.txt
++++ b/one.txt
+@@ -2 +2,2 @@ context
+-old
++new
++new
+@@ -9,2 +10,0 @@
+-gone
+-gone
+@@ -20,0 +21 @@
++added
+diff --git a/gone.txt b/gone.txt
+deleted file mode 100644
+--- a/gone.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-x
+diff --git "a/caf\\303\\251.txt" "b/caf\\303\\251.txt"
+--- "a/caf\\303\\251.txt"
++++ "b/caf\\303\\251.txt"
+@@ -1 +1 @@
+-a
++b
+diff --git a/old.txt b/new.txt
+similarity index 90%
+rename from old.txt
+rename to new.txt
+--- a/old.txt
++++ b/new.txt
+@@ -3 +3 @@
+-c
++C
+diff --git "a/tab\\there\u00e9" "b/tab\\there\u00e9"
+--- "a/tab\\there\u00e9"
++++ "b/tab\\there\u00e9"
+@@ -0,0 +1 @@
++x
+"""
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs Unix sockets')
+class TestDaemon(unittest.TestCase):
+    """Run the command line and the server in subprocesses, as the headless modules replace `sublime`."""
+
+    def setUp(self):
+        """Create a scratch folder with settings and an empty `Packages` folder."""
+
+        self.folder = tempfile.mkdtemp()
+        self.settings = os.path.join(self.folder, 'test.sublime-settings')
+        with open(self.settings, 'w') as f:
+            json.dump(SETTINGS, f)
+        self.packages = os.path.join(self.folder, 'Packages')
+        os.mkdir(self.packages)
+        self.socket = os.path.join(self.folder, 'rr.sock')
+        self.server = None
+
+    def tearDown(self):
+        """Stop the server and remove the scratch folder."""
+
+        if self.server is not None:
+            self.command('stop')
+            self.server.wait(10)
+        shutil.rmtree(self.folder)
+
+    def command(self, *args, **kwargs):
+        """Run the command line and get the exit code, stdout, and stderr."""
+
+        args = list(args)
+        if args[0] in ('serve', 'run', 'find'):
+            args += ['--packages', self.packages, '--settings', self.settings]
+        if args[0] not in ('run', 'find'):
+            args += ['--socket', self.socket]
+        process = subprocess.Popen(
+            [sys.executable, '-W', 'ignore', DAEMON] + args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=kwargs.get('cwd')
+        )
+        out, err = process.communicate(kwargs.get('stdin', '').encode('utf-8'), 60)
+        return process.returncode, out.decode('utf-8'), err.decode('utf-8')
+
+    def write(self, name, text):
+        """Write a scratch file (without translating line endings)."""
+
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        return path
+
+    def read(self, path):
+        """Read a scratch file."""
+
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def start(self):
+        """Start the server and wait for it to answer."""
+
+        self.server = subprocess.Popen(
+            [
+                sys.executable, '-W', 'ignore', DAEMON, 'serve', '--socket', self.socket,
+                '--packages', self.packages, '--settings', self.settings, '--workers', '3'
+            ]
+        )
+        for _ in range(100):
+            if self.command('ping')[0] == 0:
+                return
+            time.sleep(0.1)
+        self.fail('server did not start')
+
+    def test_run(self):
+        """Files are updated in place, keeping their line endings."""
+
+        first = self.write('a.txt', 'a  \r\nb\t\r\n')
+        second = self.write('b.txt', 'clean\n')
+        code, out, err = self.command('run', '-s', 'trim', first, second)
+        self.assertEqual(code, 0, err)
+        self.assertEqual(self.read(first), 'a\r\nb\r\n')
+        self.assertEqual(self.read(second), 'clean\n')
+        self.assertIn('trim: 2 regions', err)
+
+        code, out, err = self.command('run', '-s', 'trim', '-s', 'groups', stdin='k=v  \n')
+        self.assertEqual(code, 0, err)
+        self.assertEqual(out, 'Here are your groups: (k)(v)\n')
+
+    def test_cache(self):
+        """Files already processed with the same rules and plugins are answered from the cache."""
+
+        cache = os.path.join(self.folder, 'cache', 'results.sqlite')
+        plugins = os.path.join(self.packages, 'mine')
+        os.mkdir(plugins)
+        plugin = os.path.join(plugins, 'upper.py')
+        with open(plugin, 'w') as f:
+            f.write('def replace(m, **kwargs):\n    return m.group(0)\n')
+        with open(self.settings, 'w') as f:
+            json.dump({'replacements': {'upper': {'find': 'x', 'plugin': 'mine.upper'}}}, f)
+        clean = self.write('clean.txt', 'abc\n')
+        dirty = self.write('dirty.txt', 'xyz\n')
+
+        def run(*args):
+            return self.command('run', '-v', '-s', 'upper', '--cache', cache, *args)
+
+        self.assertEqual(run(clean, dirty)[2].count('(cached)'), 0)
+        self.assertEqual(run(clean, dirty)[2].count('(cached)'), 2)
+
+        # A new plugin source is a new key
+        with open(plugin, 'w') as f:
+            f.write('def replace(m, **kwargs):\n    return m.group(0).upper()\n')
+        code, out, err = run('--check', clean, dirty)
+        self.assertEqual((code, err.count('(cached)')), (1, 0))
+        # A known change is reported by --check without processing, but still processed when writing
+        code, out, err = run('--check', clean, dirty)
+        self.assertEqual(code, 1)
+        self.assertIn('dirty.txt: changed', err)
+        self.assertIn('clean.txt: unchanged (cached)', err)
+        code, out, err = run(clean, dirty)
+        self.assertIn('upper: 1 regions', err)
+        self.assertEqual(self.read(dirty), 'Xyz\n')
+        # The rewritten file is known to need no changes
+        code, out, err = run(clean, dirty)
+        self.assertEqual((code, err.count('(cached)')), (0, 2))
+        self.assertEqual(self.read(dirty), 'Xyz\n')
+
+    def test_find(self):
+        """Matches are counted in the files the index finds."""
+
+        tree = os.path.join(self.folder, 'tree')
+        os.mkdir(tree)
+        with open(os.path.join(tree, 'a.txt'), 'w') as f:
+            f.write('a=b\nc=d\n')
+        with open(os.path.join(tree, 'b.txt'), 'w') as f:
+            f.write('nothing\n')
+        index = os.path.join(self.folder, 'index.db')
+        code, out, err = self.command('find', '-v', '-s', 'groups', '--index', index, tree)
+        self.assertEqual(code, 0, err)
+        self.assertEqual(out, '%s: groups: 2 matches;\n' % os.path.join(tree, 'a.txt'))
+        self.assertIn('scanned 2 files (2 indexed)', err)
+        code, out, err = self.command('find', '-l', '-s', 'trim', '--index', index, tree)
+        self.assertEqual((code, out), (1, ''))
+
+    def test_run_errors(self):
+        """Unknown rules and rules that need scopes are refused."""
+
+        code, out, err = self.command('run', '-s', 'missing', stdin='text')
+        self.assertEqual(code, 2)
+        self.assertIn('unknown rules: missing', err)
+        code, out, err = self.command('run', '-s', 'comments', stdin='text')
+        self.assertEqual(code, 2)
+        self.assertIn('rules need a syntax: comments', err)
+
+    @unittest.skipUnless(shutil.which('git'), 'needs git')
+    def test_git_diff(self):
+        """Only the changed lines of files routed by `on_save_sequences` are changed."""
+
+        def git(*args):
+            subprocess.check_call(
+                ['git', '-c', 'user.name=t', '-c', 'user.email=t@t', '-c', 'commit.gpgsign=false'] + list(args),
+                cwd=self.folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+
+        git('init', '-q')
+        path = self.write('a.txt', 'one \ntwo \nthree \n')
+        other = self.write('b.md', 'x \n')
+        self.write('c.txt', 'keep \nold \nkeep \nkeep \n')
+        git('add', 'a.txt', 'b.md', 'c.txt')
+        git('commit', '-q', '-m', 'base')
+        self.write('a.txt', 'one \nTWO \nthree \n')
+        self.write('b.md', 'y \n')
+
+        code, out, err = self.command('run', '--git-diff', '--check', cwd=self.folder)
+        self.assertEqual(code, 1, err)
+        code, out, err = self.command('run', '--git-diff', cwd=self.folder)
+        self.assertEqual(code, 0, err)
+        self.assertEqual(self.read(path), 'one \nTWO\nthree \n')
+        self.assertEqual(self.read(other), 'y \n')
+
+        git('add', 'a.txt')
+        self.write('a.txt', 'one \nTWO\nthree  \n')
+        # A renamed file that was also changed
+        git('mv', 'c.txt', 'd.txt')
+        renamed = self.write('d.txt', 'keep \nnew \nkeep \nkeep \n')
+        git('add', 'd.txt')
+        code, out, err = self.command('run', '--git-diff', '--staged', cwd=self.folder)
+        self.assertEqual(code, 0, err)
+        self.assertIn('skipped', err)
+        self.assertEqual(self.read(path), 'one \nTWO\nthree  \n')
+        self.assertEqual(self.read(renamed), 'keep \nnew\nkeep \nkeep \n')
+
+    def test_server(self):
+        """The server answers the client, and pipelined requests are answered by id."""
+
+        self.start()
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket).st_mode) & 0o077, 0)
+        dirty = self.write('dirty.txt', 'x \n')
+        clean = self.write('clean.txt', 'x\n')
+        code, out, err = self.command('apply', '--check', '-s', 'trim', dirty, clean)
+        self.assertEqual(code, 1, err)
+        self.assertEqual(self.read(dirty), 'x \n')
+        code, out, err = self.command('apply', '-s', 'trim', dirty, clean)
+        self.assertEqual(code, 0, err)
+        self.assertEqual(self.read(dirty), 'x\n')
+        code, out, err = self.command('apply', '-s', 'groups', stdin='a=b c=d')
+        self.assertEqual((code, out), (0, 'Here are your groups: (a)(b) Here are your groups: (c)(d)'))
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket)
+        texts = ['line %d \t\n' % i * (i + 1) for i in range(20)]
+        for index, text in enumerate(texts):
+            sock.sendall((json.dumps({'id': index, 'sequence': ['trim'], 'text': text}) + '\n').encode('utf-8'))
+        sock.sendall(b'not json\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as reader:
+            responses = [json.loads(line.decode('utf-8')) for line in reader]
+        sock.close()
+        self.assertEqual(len(responses), len(texts) + 1)
+        answers = dict((r['id'], r['text']) for r in responses if 'id' in r)
+        self.assertEqual(answers, dict((i, t.replace(' \t', '')) for i, t in enumerate(texts)))
+        self.assertEqual(sum(1 for r in responses if not r['ok']), 1)
+
+    def test_reload(self):
+        """Every worker process picks up changed settings after a reload."""
+
+        self.start()
+        self.assertEqual(self.command('apply', '-s', 'trim', stdin='x ')[1], 'x')
+        settings = json.loads(json.dumps(SETTINGS))
+        settings['replacements']['trim']['replace'] = '!'
+        with open(self.settings, 'w') as f:
+            json.dump(settings, f)
+        self.assertEqual(self.command('reload')[0], 0)
+        # More requests than workers, so each worker answers at least one if the load is spread
+        for _ in range(6):
+            self.assertEqual(self.command('apply', '-s', 'trim', stdin='x ')[1], 'x!')
+
+
+class TestHunks(unittest.TestCase):
+    """Test reading changed lines from `git diff`."""
+
+    def setUp(self):
+        """Load the module."""
+
+        fake_sublime.install(PACKAGE_PATH)
+        from RegReplace import rr_git
+        self.git = rr_git
+
+    def test_parse(self):
+        """Hunks that add lines are kept; removals and deleted files are dropped; quoted names are decoded."""
+
+        self.assertEqual(
+            list(self.git.parse_hunks(DIFF).items()),
+            [
+                ('one.txt', [(2, 2), (21, 1)]), ('caf\u00e9.txt', [(1, 1)]), ('new.txt', [(3, 1)]),
+                ('tab\there\u00e9', [(1, 1)])
+            ]
+        )
+
+    @unittest.skipUnless(shutil.which('git'), 'needs git')
+    def test_changed_lines(self):
+        """Paths are read the same way whatever the diff prefix settings, and non-ASCII names are matched."""
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+
+        def git(*args):
+            subprocess.check_call(
+                ['git', '-c', 'user.name=t', '-c', 'user.email=t@t', '-c', 'commit.gpgsign=false'] + list(args),
+                cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+
+        def write(name, text):
+            with open(os.path.join(folder, name), 'w') as f:
+                f.write(text)
+
+        git('init', '-q')
+        git('config', 'core.quotePath', 'true')
+        os.mkdir(os.path.join(folder, 'b'))
+        write(os.path.join('b', 'x.txt'), 'one\n')
+        write('caf\u00e9.txt', 'one\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'base')
+        write(os.path.join('b', 'x.txt'), 'one\ntwo\n')
+        write('caf\u00e9.txt', 'one\ntwo\n')
+        top = os.path.realpath(folder)
+        expected = [(os.path.join(top, 'b', 'x.txt'), [(2, 1)]), (os.path.join(top, 'caf\u00e9.txt'), [(2, 1)])]
+
+        for key in ('diff.mnemonicPrefix', 'diff.noprefix'):
+            git('config', key, 'true')
+            hunks, skipped = self.git.changed_lines(folder)
+            self.assertEqual(list(hunks.items()), expected, key)
+
+        # A staged file with unstaged changes is recognized, non-ASCII name and all
+        git('add', '.')
+        write('caf\u00e9.txt', 'one\ntwo\nthree\n')
+        hunks, skipped = self.git.changed_lines(folder, staged=True)
+        self.assertEqual(list(hunks.items()), expected[:1])
+        self.assertEqual(skipped, [expected[1][0]])
+
+    def test_line_regions(self):
+        """Line ranges cover whole lines, including the line ending."""
+
+        text = 'a\nbb\nccc'
+        self.assertEqual(self.git.line_regions(text, [(1, 1), (2, 2), (4, 1), (1, 0)]), [(0, 2), (2, 8)])
+
+
+class TestResultCache(unittest.TestCase):
+    """Test the result cache."""
+
+    def setUp(self):
+        """Create a scratch folder."""
+
+        fake_sublime.install(PACKAGE_PATH)
+        from RegReplace.rr_cache import ResultCache
+        self.folder = tempfile.mkdtemp()
+        self.cache = ResultCache
+        self.path = os.path.join(self.folder, 'results.sqlite')
+
+    def tearDown(self):
+        """Remove the scratch folder."""
+
+        shutil.rmtree(self.folder)
+
+    def test_lru(self):
+        """The least recently used entries are evicted."""
+
+        cache = self.cache(self.path, 100)
+        for i in range(100):
+            cache.put('key%d' % i, 'value%d' % i)
+        self.assertEqual(cache.get('key0'), 'value0')
+        for i in range(100, 150):
+            cache.put('key%d' % i, 'value%d' % i)
+        self.assertTrue(len(cache) <= 100)
+        self.assertEqual(cache.get('key0'), 'value0')
+        self.assertEqual(cache.get('key149'), 'value149')
+        self.assertIsNone(cache.get('key1'))
+        cache.close()
+
+    def test_threads(self):
+        """Workers can share a cache."""
+
+        import threading
+
+        cache = self.cache(self.path, 1000)
+
+        def work(n):
+            for i in range(50):
+                cache.put('%d-%d' % (n, i), str(i))
+                self.assertEqual(cache.get('%d-%d' % (n, i)), str(i))
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 400)
@@ -0,0 +1,57 @@
+"""Test FindReplace against the reference implementation."""
+import unittest
+from . import fuzz_replacer
+
+
+class TestFuzzReplacer(unittest.TestCase):
+    """Differential test of random rules and buffers."""
+
+    def test_equivalence(self):
+        """Run random cases and check the outcomes match the reference."""
+
+        failures = fuzz_replacer.run(0, 1000)
+        self.assertEqual(
+            failures, [],
+            'Failed seeds: %s' % ' '.join(str(f['case']['seed']) for f in failures)
+        )
+
+    def test_scope_change(self):
+        """Scopes are looked up again after an edit that changes them (removing a quote ends a string)."""
+
+        engines = fuzz_replacer.setup()
+        case = {
+            'text': '"ab" "cd"',
+            'rules': [
+                {'scope': 'string', 'find': '"a', 'replace': 'a'},
+                {'scope': 'string', 'find': 'c', 'replace': 'X'}
+            ],
+            'find_only': False,
+            'action': None,
+            'multi_pass': False,
+            'selections': [],
+            'selection_only': False,
+            'full_file': False,
+            'find_backend': 'python'
+        }
+        expected = fuzz_replacer.execute(engines[1], case)
+        self.assertEqual(expected['text'], 'ab" "cd"')
+        self.assertEqual(fuzz_replacer.execute(engines[0], case), expected)
+
+    def test_write_back(self):
+        """Each change is replaced on its own, and the text between changes is left alone."""
+
+        fuzz_replacer.setup()
+        from RegReplace.rr_replacer import FindReplace
+        from . import fake_sublime
+        view = fake_sublime.View('a-b-c' + ' ' * 300 + '-d')
+        view.sel().add(fake_sublime.Region(3))
+        replacer = FindReplace(view, None, False, True, False, 1, None, {})
+        changes = [
+            (fake_sublime.Region(begin, begin + 1), view.text[begin].upper() * 2)
+            for begin in (len(view.text) - 1, 4, 2, 0)
+        ]
+        replacer.write_back(changes)
+        self.assertEqual(view.text, 'AA-BB-CC' + ' ' * 300 + '-DD')
+        self.assertEqual(view.calls['replace'], 4)
+        self.assertEqual(view.calls.get('get_regions', 0), 0)
+        self.assertEqual(list(view.sel()), [fake_sublime.Region(5)])
@@ -0,0 +1,121 @@
+"""Test lazy highlighting."""
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestLazyHighlights(unittest.TestCase):
+    """Test that lazy highlights follow the viewport and the edits of a view."""
+
+    def setUp(self):
+        """Load the sequencer with lazy highlights."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer
+        self.sequencer = rr_sequencer
+        rr_sequencer.plugin_loaded()
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {
+            'replacements': {'todo': {'find': 'TODO'}},
+            'lazy_highlights': True,
+            'lazy_highlight_margin': 1
+        }
+        del fake_sublime.timeouts[:]
+        self.window = fake_sublime.Window()
+        fake_sublime.windows.append(self.window)
+        self.view = self.window.new_file('TODO\n' * 100)
+        self.scroll(0)
+
+    def tearDown(self):
+        """Remove the window."""
+
+        fake_sublime.windows.remove(self.window)
+        del fake_sublime.timeouts[:]
+        self.sequencer.LazyHighlights.views.clear()
+        self.sequencer.LazyHighlights.polling = False
+
+    def scroll(self, row):
+        """Show five lines of the view, starting at a row."""
+
+        begin = self.view.text_point(row, 0)
+        end = self.view.text_point(row + 5, 0)
+        self.view.visible_region = lambda: fake_sublime.Region(begin, end)
+
+    def drawn(self):
+        """Get the (begin, end) of the drawn regions."""
+
+        return [(r.a, r.b) for r in self.view.get_regions('RegReplace')]
+
+    def test_refind(self):
+        """The viewport is drawn, and is found again once it moves past what was drawn after an edit."""
+
+        self.view.run_command('reg_replace', {'replacements': ['todo'], 'find_only': True})
+        self.assertEqual(self.drawn(), [(i * 5, i * 5 + 4) for i in range(8)])
+
+        # Sublime tracks what is drawn while the viewport stays among it
+        self.view.insert(None, 0, 'x')
+        fake_sublime.run_timeouts()
+        self.assertEqual(self.drawn(), [(i * 5, i * 5 + 4) for i in range(8)])
+
+        # Past it, the regions are found again in the background once the edits pause
+        self.scroll(50)
+        fake_sublime.run_timeouts()
+        self.assertEqual(len(self.drawn()), 8)
+        self.finish_search()
+        self.assertEqual(self.drawn(), [(i * 5 + 1, i * 5 + 5) for i in range(49, 58)])
+
+    def finish_search(self):
+        """Start the search once the edits have paused, run it, and draw what it found."""
+
+        for _ in range(3):
+            fake_sublime.run_timeouts()
+
+    def test_stale(self):
+        """Regions found on a snapshot are thrown away if the buffer is edited during the search."""
+
+        self.view.run_command('reg_replace', {'replacements': ['todo'], 'find_only': True})
+        entry = self.sequencer.LazyHighlights.views[self.view.id()]['RegReplace']
+        searched = []
+        refind = entry['refind']
+
+        def record(snapshot):
+            searched.append(snapshot.substr(fake_sublime.Region(0, 2)))
+            return refind(snapshot)
+
+        entry['refind'] = record
+        change_count = entry['change_count']
+        self.view.insert(None, 0, 'x')
+        self.scroll(50)
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+
+        # The search has started on a snapshot when the buffer is edited again
+        self.view.insert(None, 0, 'y')
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+        self.assertEqual(searched, ['xT'])
+        self.assertEqual(len(self.drawn()), 8)
+        self.assertEqual(entry['change_count'], change_count)
+
+        # The next search finds the regions of the buffer as it is now
+        self.scroll(50)
+        self.finish_search()
+        self.assertEqual(searched, ['xT', 'yx'])
+        self.assertEqual(self.drawn(), [(i * 5 + 2, i * 5 + 6) for i in range(49, 58)])
+
+    def test_drop(self):
+        """Highlights that cannot be found again are dropped, and polling stops with them."""
+
+        lazy = self.sequencer.LazyHighlights
+        regions = self.sequencer.RegionSet()
+        for i in range(100):
+            regions.add(i * 5, i * 5 + 4)
+        lazy.add(self.view, 'key', regions, 'invalid', 0, False, 1)
+        self.assertTrue(lazy.polling)
+        self.view.insert(None, 0, 'x')
+        self.scroll(50)
+        fake_sublime.run_timeouts()
+        self.assertEqual(lazy.views, {})
+        self.assertEqual(len(self.view.get_regions('key')), 8)
+        fake_sublime.run_timeouts()
+        self.assertFalse(lazy.polling)
+        self.assertEqual(fake_sublime.timeouts, [])
@@ -0,0 +1,103 @@
+"""Test the linear time regex engine."""
+import random
+import re
+import time
+import unittest
+import warnings
+from . import fake_sublime
+from . import fuzz_replacer
+
+ATOMS = (
+    'a', 'b', 'ab', 'a*', 'b+?', '(a|)*', '(a*)*', '(?=a)', '(\\w)\\1', 'a{2,3}', '(a|b){0,2}?', '(?i:A)', '\\B',
+    '\\A', '\\Z', '$', '^', '[^\\W\\d]', '(?:ab|a)(b)?', '(a)|(b)', '.', '\\s', '\n', '(?P<n>a+)', 'é', 'É', 'k',
+    '\u212a', '(a?)+?', 'a??', 'x{0,1}', '(b|ab)*c?'
+) + fuzz_replacer.FIND_ATOMS
+
+TEXT_PIECES = (
+    'a', 'b', 'ab', 'aab', '\n', '  ', 'c', 'é', 'É', 'K', '\u212a', 'k', 'x', '_', '1'
+) + fuzz_replacer.TEXT_PIECES
+
+REPLACES = ('\\2', '<\\g<n>>', '$') + fuzz_replacer.REPLACES
+
+FLAGS = (0, re.I, re.M, re.S, re.I | re.M, re.A, re.A | re.I)
+
+
+def outcome(call):
+    """Get the result of a call, or the type of error it raised."""
+
+    try:
+        return call()
+    except Exception as err:
+        return type(err)
+
+
+class TestLinear(unittest.TestCase):
+    """Test that the linear engine finds what `re` finds."""
+
+    def setUp(self):
+        """Load the engine."""
+
+        fake_sublime.install(fuzz_replacer.PACKAGE_PATH)
+        from RegReplace.rr_linear import LinearPattern
+        from RegReplace.rr_engines import UnsupportedError
+        self.compile = LinearPattern
+        self.unsupported = UnsupportedError
+
+    def test_equivalence(self):
+        """Compare matches and replacements of random patterns with `re`."""
+
+        rand = random.Random(0)
+        supported = 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for _ in range(5000):
+                find = ''.join(rand.choice(ATOMS) for _ in range(rand.randint(1, 4)))
+                flags = rand.choice(FLAGS)
+                text = ''.join(rand.choice(TEXT_PIECES) for _ in range(rand.randint(0, 20)))
+                try:
+                    expected = re.compile(find, flags)
+                    pattern = self.compile(find, flags)
+                except (re.error, self.unsupported):
+                    continue
+                supported += 1
+                self.assertEqual(
+                    [(m.span(), m.groups(), m.groupdict(), m.lastindex, m.lastgroup) for m in pattern.finditer(text)],
+                    [(m.span(), m.groups(), m.groupdict(), m.lastindex, m.lastgroup) for m in expected.finditer(text)],
+                    '%r %r' % (find, text)
+                )
+                replace = rand.choice(REPLACES)
+                count = rand.choice((0, 0, 1, 2))
+                self.assertEqual(
+                    outcome(lambda: pattern.subn(replace, text, count)),
+                    outcome(lambda: expected.subn(replace, text, count)),
+                    '%r %r %r' % (find, replace, text)
+                )
+        self.assertTrue(supported > 2000)
+
+    def test_unsupported(self):
+        """Features that need backtracking are refused."""
+
+        for find in ('(a)\\1', '(?=a)', '(?<!a)b', '(a*)*', '(a|)+', '(?(1)a|b)'):
+            self.assertRaises((re.error, self.unsupported), self.compile, find)
+
+    def test_linear_time(self):
+        """A pattern that makes `re` backtrack exponentially runs in linear time."""
+
+        pattern = self.compile('(x+x+)+y')
+        start = time.time()
+        self.assertEqual(list(pattern.finditer('x' * 5000)), [])
+        self.assertTrue(time.time() - start < 5)
+
+    def test_re2_differences(self):
+        """Constructs that RE2 matches differently from `re` are left to `re`."""
+
+        from RegReplace.rr_engines import re2_difference
+        for find, flags in (
+            ('a\\sb', re.M), ('[\\w-]+', re.M), ('\\bword', re.M), ('end$', 0), ('(?i:x)y', re.M),
+            ('café', re.I | re.M), ('(?:x|[é])', re.I | re.M)
+        ):
+            self.assertIsNotNone(re2_difference(find, flags), find)
+        for find, flags in (
+            ('[ \\t]+$', re.M), ('\\d+', re.A | re.M), ('\\bword\\b', re.A), ('café', re.M), ('(a|b)*c', re.I)
+        ):
+            self.assertIsNone(re2_difference(find, flags), find)
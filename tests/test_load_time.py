@@ -0,0 +1,60 @@
+"""Test logging how long the plugin takes to load."""
+import io
+import re
+import sys
+import time
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestLoadTime(unittest.TestCase):
+    """Test the load times that are recorded, and logged with `log_load_time`."""
+
+    def setUp(self):
+        """Load the sequencer and capture the console."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer
+        self.sequencer = rr_sequencer
+        rr_sequencer.load_times.pop('warm', None)
+        del fake_sublime.timeouts[:]
+        self.stdout = sys.stdout
+        sys.stdout = io.StringIO()
+
+    def tearDown(self):
+        """Restore the console."""
+
+        sys.stdout = self.stdout
+        del fake_sublime.timeouts[:]
+
+    def load(self, log):
+        """Run `plugin_loaded`, then the background rule compile, and get what was printed."""
+
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {
+            'replacements': {'trim': {'find': '[ \\t]+$', 'replace': ''}},
+            'log_load_time': log
+        }
+        self.sequencer.plugin_loaded()
+        fake_sublime.run_timeouts()
+        for _ in range(500):
+            if 'warm' in self.sequencer.load_times:
+                break
+            time.sleep(0.01)
+        return sys.stdout.getvalue()
+
+    def test_logged(self):
+        """The module load, `plugin_loaded`, and the rule compile are timed and printed."""
+
+        output = self.load(True)
+        for key in ('import', 'plugin_loaded', 'warm'):
+            self.assertTrue(self.sequencer.load_times[key] >= 0, key)
+        self.assertRegex(output, r'RegReplace: module load \d+\.\d\dms; plugin_loaded \d+\.\d\dms\n')
+        self.assertRegex(output, r'RegReplace: rules compiled in \d+\.\d\dms\n')
+
+    def test_quiet(self):
+        """The times are recorded, but nothing is printed, unless asked for."""
+
+        output = self.load(False)
+        self.assertIn('warm', self.sequencer.load_times)
+        self.assertIsNone(re.search('RegReplace: ', output))
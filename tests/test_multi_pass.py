@@ -0,0 +1,60 @@
+"""Test that multi-pass sweeps stop when the buffer cycles."""
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+ROTATE = '^(\\w)(\\w)(\\w)$'
+
+
+class TestMultiPass(unittest.TestCase):
+    """Test where multi-pass sweeps stop, and how the cycle is reported."""
+
+    def setUp(self):
+        """Load the sequencer with rules that move the letters of a word around."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer
+        self.sequencer = rr_sequencer
+        rr_sequencer.plugin_loaded()
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {
+            'replacements': {
+                'rotate': {'find': ROTATE, 'replace': '\\2\\3\\1'},
+                'swap_first': {'find': ROTATE, 'replace': '\\2\\1\\3'},
+                'swap_last': {'find': ROTATE, 'replace': '\\1\\3\\2'},
+                'rotate_comment': {
+                    'scope': 'comment', 'find': '(\\w)(\\w)(\\w)', 'replace': '\\2\\3\\1', 'multi_pass_regex': True
+                }
+            },
+            'results_in_panel': False
+        }
+        del fake_sublime.statuses[:]
+
+    def run_sequence(self, text, replacements, multi_pass=True):
+        """Run a sequence and get the text and the status message."""
+
+        view = fake_sublime.View(text)
+        view.run_command('reg_replace', {'replacements': replacements, 'multi_pass': multi_pass})
+        return view.text, fake_sublime.statuses[-1]
+
+    def test_two_rules(self):
+        """Two rules that undo each other every other sweep stop on the second sweep."""
+
+        text, status = self.run_sequence('abc', ['rotate', 'swap_first'])
+        self.assertEqual(text, 'abc')
+        self.assertIn('Regions Found: 4 regions;', status)
+        self.assertIn('Stopped at sweep 2: cycle of 2 sweep(s) (rotate, swap_first);', status)
+
+    def test_three_rules(self):
+        """Three rules that rotate the word each sweep stop on the third sweep."""
+
+        text, status = self.run_sequence('abc', ['rotate', 'swap_first', 'swap_last'])
+        self.assertEqual(text, 'abc')
+        self.assertIn('Regions Found: 9 regions;', status)
+        self.assertIn('Stopped at sweep 3: cycle of 3 sweep(s) (rotate, swap_first, swap_last);', status)
+
+    def test_scope_regex(self):
+        """A multi-pass scope regex stops when the scope cycles, and the cycle is reported."""
+
+        text, status = self.run_sequence('x # abc\n', ['rotate_comment'], False)
+        self.assertEqual(text, 'x # abc\n')
+        self.assertIn('rotate_comment: multi_pass_regex stopped on a cycle of 3 sweep(s);', status)
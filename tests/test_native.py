@@ -0,0 +1,87 @@
+"""Test converting rules for Sublime's `find_all`."""
+import re
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+# Python pattern, flags -> the pattern Sublime is given and the text checks it needs.
+# These are written out by hand: the fake view reads the converted syntax back with
+# `re`, so running them through the fake alone would not catch a wrong conversion.
+SEARCHES = (
+    ('foo', 0, '(?-s)foo', set()),
+    ('a.b', re.DOTALL, '(?s)a.b', set(['lines'])),
+    ('x$', 0, '(?-s)x$', set(['lines'])),
+    ('[a-z_]+\\d', 0, '(?-s)(?:[a-z\\_]){1,}[\\d]', set(['ascii'])),
+    ('[^x\\s]', 0, '(?-s)[^x\\s]', set(['ascii'])),
+    ('(\\w+)=(\\w*)', 0, '(?-s)((?:[\\w]){1,})\\=((?:[\\w]){0,})', set(['ascii'])),
+    ('x+?', 0, '(?-s)(?:x){1,}?', set()),
+    ('a{2,3}', 0, '(?-s)(?:a){2,3}', set()),
+    ('(a)\\1', 0, '(?-s)(a)\\g{1}', set()),
+    ('(?<=a)b(?!c)', 0, '(?-s)(?<=a)b(?!c)', set()),
+    ('foo|bar', re.IGNORECASE, '(?i-s)(?:foo|bar)', set(['ascii'])),
+    ('é\\.', 0, '(?-s)\\x{e9}\\.', set()),
+    ('\\Ab\\Z', 0, '(?-s)\\Ab\\z', set()),
+    ('[\\[:a]', 0, '(?-s)[\\[\\:a]', set())
+)
+
+
+class TestNative(unittest.TestCase):
+    """Test the converted patterns and format strings, and a native find through the fake view."""
+
+    def setUp(self):
+        """Load the converter."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_native
+        from RegReplace.rr_template import ReplaceTemplate
+        self.native = rr_native
+        self.template = ReplaceTemplate
+
+    def convert(self, find, replace, flags=0, literal=False):
+        """Convert a rule."""
+
+        flags |= re.MULTILINE
+        pattern = re.compile(re.escape(find) if literal else find, flags)
+        return self.native.convert_rule(self.template(pattern, replace), find, flags, literal)
+
+    def test_search(self):
+        """Patterns are written in Sublime's syntax."""
+
+        for find, flags, expected, needs in SEARCHES:
+            pattern, required, found = self.native.convert_search(find, flags | re.MULTILINE)
+            self.assertEqual((pattern, found), (expected, needs), find)
+        self.assertEqual(self.native.convert_search('(a)|(b)(c)', re.MULTILINE)[1], set([0]))
+        self.assertEqual(self.native.convert_search('(a)(b)?', re.MULTILINE)[1], set([0, 1]))
+
+    def test_format(self):
+        """Templates become format strings, and rules that cannot be converted are left to Python."""
+
+        self.assertEqual(self.convert('(\\w+)=(\\w+)', '\\2 = \\1').format, '${2} = ${1}')
+        self.assertEqual(self.convert('x', '$(a)?:&\\\\').format, '\\$\\(a\\)\\?\\:\\&\\\\')
+        self.assertEqual(self.convert('x', '\\g<0>\\n').format, '${0}\n')
+        rule = self.convert('a.b', 'c', literal=True)
+        self.assertEqual((rule.pattern, rule.needs), ('(?-s)a\\.b', set()))
+        self.assertIsNone(self.convert('(a)?b', '\\1'))
+        self.assertIsNone(self.convert('x*', ''))
+        self.assertIsNone(self.convert('(?i:x)y', ''))
+
+    def test_find(self):
+        """A native replace gives the fixed result, from the pattern and format written for Sublime."""
+
+        fake_sublime.load_settings('reg_replace.sublime-settings').values['find_backend'] = 'native'
+        from RegReplace.rr_replacer import FindReplace
+        view = fake_sublime.View('key=value\nname = x\nab=cd\n')
+        calls = []
+        find_all = view.find_all
+
+        def record(pattern, flags=0, fmt=None, extractions=None):
+            calls.append((pattern, flags, fmt))
+            return find_all(pattern, flags, fmt, extractions)
+
+        view.find_all = record
+        replace = FindReplace(view, None, False, True, False, 1, None)
+        count = replace.search({'find': '^(\\w+)=(\\w+)$', 'replace': '\\2: \\1', 'greedy': True}, False)
+        replace.close()
+        self.assertEqual(count, 2)
+        self.assertEqual(view.text, 'value: key\nname = x\ncd: ab\n')
+        self.assertIn(('(?-s)^((?:[\\w]){1,})\\=((?:[\\w]){1,})$', 0, '${2}\\: ${1}'), calls)
@@ -0,0 +1,114 @@
+"""Test the live preview of a rule."""
+import json
+import re
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestPreview(unittest.TestCase):
+    """Test parsing preview rules and highlighting their matches."""
+
+    def setUp(self):
+        """Load the sequencer."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer, rr_preview
+        self.preview = rr_preview
+        rr_sequencer.plugin_loaded()
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {}
+        del fake_sublime.timeouts[:]
+        self.window = fake_sublime.Window()
+        fake_sublime.windows.append(self.window)
+
+    def tearDown(self):
+        """Remove the window."""
+
+        fake_sublime.windows.remove(self.window)
+        del fake_sublime.timeouts[:]
+
+    def test_parse(self):
+        """Rules are split on the delimiter, and flags set rule options."""
+
+        parse = self.preview.parse_rule
+        self.assertEqual(parse('/'), None)
+        self.assertEqual(parse('/a'), {'find': 'a'})
+        self.assertEqual(parse('/a/b/is'), {'find': 'a', 'replace': 'b', 'case': False, 'dotall': True})
+        self.assertEqual(parse(r'#a\#b#c#l'), {'find': 'a#b', 'replace': 'c', 'literal': True})
+        self.assertEqual(parse('/a//'), {'find': 'a', 'replace': ''})
+        self.assertRaises(ValueError, parse, '/a/b/x')
+        self.assertRaises(ValueError, parse, '/a/b/i/')
+
+    def test_find(self):
+        """The visible pass stops at the end of its span, and stale searches give up between sparse matches."""
+
+        preview = self.preview.Preview(fake_sublime.View('bb\nbbbb'))
+        pattern = re.compile('b+')
+        self.assertEqual(list(preview.find(pattern, 'bb\nbbbb', 0, 5)), [(0, 2)])
+        self.assertEqual(list(preview.find(pattern, 'bb\nbbbb', 1, 7)), [(1, 2), (3, 7)])
+
+        text = 'b' + ' ' * 10000 + 'b'
+        generation = preview.touch()
+        self.assertEqual(len(preview.find(pattern, text, generation=generation)), 2)
+        preview.touch()
+        self.assertIsNone(preview.find(pattern, text, generation=generation))
+
+    def test_preview(self):
+        """Only the last edit of a burst is searched, and the full search follows the visible one."""
+
+        view = self.window.new_file('foo bar\nFOO\n' * 3)
+        view.run_command('reg_replace_preview', {'rule': '/x'})
+        on_change = self.window.input_panels[-1][3]
+        on_change('/fo')
+        on_change('/(fo+)/\\1d/i')
+
+        # The earlier edits are dropped, the visible span is searched, then the rest in the background
+        fake_sublime.run_timeouts()
+        self.assertEqual(len(view.get_regions('RegReplace')), 6)
+        self.assertIn('in view', fake_sublime.statuses[-1])
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+        self.assertEqual(fake_sublime.statuses[-1], "RegReplace preview: 6 matches; first: 'foo' -> 'food'")
+
+        # Errors leave the highlights alone
+        on_change('/(fo')
+        fake_sublime.run_timeouts()
+        self.assertEqual(len(view.get_regions('RegReplace')), 6)
+        self.assertIn('missing )', fake_sublime.statuses[-1])
+
+        # A search is dropped if the rule changes before it finishes
+        on_change('/o')
+        fake_sublime.run_timeouts()
+        count = len(fake_sublime.statuses)
+        on_change('/FOO')
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+        self.assertEqual(
+            fake_sublime.statuses[count:],
+            ['RegReplace preview: 3 matches in view; searching the rest...', "RegReplace preview: 3 matches"]
+        )
+
+        on_done = self.window.input_panels[-1][2]
+        on_done('/FOO')
+        self.assertEqual(json.loads(fake_sublime.get_clipboard()), {'find': 'FOO'})
+
+        on_cancel = self.window.input_panels[-1][4]
+        on_cancel()
+        self.assertEqual(view.get_regions('RegReplace'), [])
+
+    def test_done_while_searching(self):
+        """Confirming the rule while the rest of the buffer is searched lets the search finish."""
+
+        view = self.window.new_file('foo bar\nFOO\n' * 3)
+        view.run_command('reg_replace_preview', {'rule': '/foo/'})
+        fake_sublime.run_timeouts()
+        self.assertIn('searching the rest', fake_sublime.statuses[-1])
+
+        on_done = self.window.input_panels[-1][2]
+        on_done('/foo/')
+        self.assertEqual(json.loads(fake_sublime.get_clipboard()), {'find': 'foo', 'replace': ''})
+        fake_sublime.run_timeouts()
+        fake_sublime.run_timeouts()
+        self.assertEqual(fake_sublime.statuses[-1], "RegReplace preview: 3 matches; first: 'foo' -> ''")
+        self.assertEqual(len(view.get_regions('RegReplace')), 3)
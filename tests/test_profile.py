@@ -0,0 +1,75 @@
+"""Test profiling a sequence."""
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+UPPER = '''
+def replace(m, **kwargs):
+    """Upper case the match."""
+
+    return upper(m.group(0))
+
+
+def upper(text):
+    """Upper case text."""
+
+    return text.upper()
+'''
+
+REVERSE = '''
+def replace(m, **kwargs):
+    """Reverse the match."""
+
+    return m.group(0)[::-1]
+'''
+
+
+class TestProfile(unittest.TestCase):
+    """Test the profile report of a sequence, and the time of its plugins."""
+
+    def setUp(self):
+        """Load the sequencer with rules that use plugins."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'out', 'profile.prof')
+        fake_sublime.resources['Packages/User/rr_upper.py'] = UPPER
+        fake_sublime.resources['Packages/User/rr_reverse.py'] = REVERSE
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {
+            'replacements': {
+                'upper': {'find': '[a-z]+', 'plugin': 'User.rr_upper'},
+                'reverse': {'find': '[A-Z]+', 'plugin': 'User.rr_reverse'},
+                'trim': {'find': '[ ]+$', 'replace': ''}
+            },
+            'profile_output': self.path
+        }
+        rr_sequencer.plugin_loaded()
+        self.window = fake_sublime.Window()
+        fake_sublime.windows.append(self.window)
+
+    def tearDown(self):
+        """Remove the window and the scratch folder."""
+
+        fake_sublime.windows.remove(self.window)
+        shutil.rmtree(self.folder)
+
+    def test_profile(self):
+        """The sequence still runs, the stats are dumped, and plugin calls are totalled by module."""
+
+        view = self.window.new_file('ab cd \nef\n')
+        view.run_command('reg_replace', {'replacements': ['upper', 'reverse', 'trim'], 'profile': True})
+        self.assertEqual(view.text, 'BA DC\nFE\n')
+        self.assertTrue(pstats.Stats(self.path).total_calls > 0)
+
+        report = self.window.panels['reg_replace_profile'].text
+        self.assertIn('Stats written to: %s' % self.path, report)
+        plugins = report[report.index('Plugins\n'):].splitlines()[3:]
+        totals = dict((line.split()[0], int(line.split()[1])) for line in plugins if line.strip())
+        # Loading each module is one call; then, for the three matches, `replace` and `upper`
+        # in one module and `replace` in the other
+        self.assertEqual(totals, {'User.rr_reverse': 4, 'User.rr_upper': 7})
@@ -0,0 +1,132 @@
+"""Test listing matches in the results panel."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestResults(unittest.TestCase):
+    """Test the match list, its pages, and going to a match."""
+
+    def setUp(self):
+        """Load the sequencer with a small page size."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer, rr_results
+        self.results = rr_results
+        self.settings = fake_sublime.load_settings('reg_replace.sublime-settings')
+        rr_sequencer.plugin_loaded()
+        self.settings.values = {
+            'replacements': {'todo': {'find': 'TODO'}},
+            'results_page_size': 2
+        }
+        self.window = fake_sublime.Window()
+        fake_sublime.windows.append(self.window)
+
+    def tearDown(self):
+        """Remove the window."""
+
+        fake_sublime.windows.remove(self.window)
+        del fake_sublime.timeouts[:]
+
+    def test_line_index(self):
+        """Rows and columns agree with the view."""
+
+        text = 'a\n\nbc\r\nd' + '\n' * 3
+        view = fake_sublime.View(text)
+        index = self.results.LineIndex(text)
+        for pt in range(len(text) + 1):
+            self.assertEqual(index.rowcol(pt), view.rowcol(pt))
+        self.assertEqual(index.line(2, len(text)), (3, 6))
+        self.assertEqual(index.line(6, len(text)), (len(text), len(text)))
+        self.assertEqual(self.results.snippet('x' * 200, 0, 200, 50), '...' + 'x' * 120 + '...')
+        self.assertEqual(self.results.snippet('x' * 200, 0, 200, 190), '...' + 'x' * 120)
+
+    def test_line_index_cache(self):
+        """Indexes are reused while the buffer is unchanged, and only those of the last views used are kept."""
+
+        cache = self.results.LineIndex.cache
+        index = self.results.LineIndex.get(-1, 1, 'a\nb')
+        self.assertIs(self.results.LineIndex.get(-1, 1, 'a\nb'), index)
+        self.assertIsNot(self.results.LineIndex.get(-1, 2, 'a\nb\n'), index)
+        for view_id in range(-2, -2 - self.results.MAX_LINE_INDEXES, -1):
+            self.results.LineIndex.get(view_id, 1, 'x')
+        self.assertEqual(len(cache), self.results.MAX_LINE_INDEXES)
+        self.assertIsNone(cache.get(-1))
+        self.results.LineIndex.forget(-2)
+        self.assertIsNone(cache.get(-2))
+        self.assertEqual(len(cache), self.results.MAX_LINE_INDEXES - 1)
+
+    def test_pages(self):
+        """Matches are listed a page at a time and double clicks go to them."""
+
+        other = self.window.new_file('x')
+        view = self.window.new_file('TODO one\n  TODO two\nnone\nx TODO\nTODO', '/tmp/todo.txt')
+        view.run_command('reg_replace', {'replacements': ['todo'], 'list_matches': True})
+        self.assertEqual(self.window.input_panels, [])
+        self.assertEqual(len(view.get_regions('RegReplace')), 4)
+        panel = self.window.panels['reg_replace_results']
+        self.assertEqual(
+            panel.text,
+            'RegReplace Matches\n\n/tmp/todo.txt: 4 matches; page 1 of 2; matches 1-2;\n\n'
+            '     1:1: TODO one\n     2:3:   TODO two\n'
+        )
+
+        self.window.run_command('reg_replace_results_page', {'page': 'next'})
+        self.assertTrue(panel.text.endswith('     4:3: x TODO\n     5:1: TODO\n'))
+        self.window.run_command('reg_replace_results_page', {'page': 'next'})
+        self.assertIn('page 2 of 2', panel.text)
+
+        # Double click the last row
+        self.window.focus_view(other)
+        panel.sel().add(fake_sublime.Region(panel.text.rindex('5:1')))
+        listener = self.results_listener()
+        listener.on_text_command(panel, 'drag_select', {'by': 'words'})
+        fake_sublime.run_timeouts()
+        self.assertIs(self.window.active_view(), view)
+        self.assertEqual([(r.a, r.b) for r in view.sel()], [(len(view.text) - 4, len(view.text))])
+
+        # The header is not a match, and edits to the buffer are reported
+        panel.sel().clear()
+        panel.sel().add(fake_sublime.Region(0))
+        panel.run_command('reg_replace_results_goto')
+        self.assertEqual([(r.a, r.b) for r in view.sel()], [(len(view.text) - 4, len(view.text))])
+        view.insert(None, 0, '\n')
+        panel.sel().clear()
+        panel.sel().add(fake_sublime.Region(panel.text.rindex('4:3')))
+        panel.run_command('reg_replace_results_goto')
+        self.assertIn('changed', fake_sublime.statuses[-1])
+
+    def test_export(self):
+        """Matches are written with their positions and replacements."""
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, 'out', 'matches.jsonl')
+        self.settings.values['replacements']['comment'] = {'scope': 'comment', 'find': r'(\w+)!', 'replace': r'\1?'}
+        self.settings.values['replacements']['todo']['replace'] = 'DONE'
+        text = 'TODO one\n# x! TODO\n'
+        view = self.window.new_file(text, '/tmp/todo.txt')
+        view.run_command(
+            'reg_replace', {'replacements': ['todo', 'comment'], 'action': 'export', 'options': {'file': path}}
+        )
+        self.assertEqual(view.text, text)
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(r['rule'], r['line'], r['col'], r['text'], r['replacement']) for r in records],
+            [('todo', 1, 1, 'TODO', 'DONE'), ('todo', 2, 6, 'TODO', 'DONE'), ('comment', 2, 3, 'x!', 'x?')]
+        )
+        self.assertEqual(records[1]['begin'], 14)
+        self.assertEqual(records[0]['file'], '/tmp/todo.txt')
+        self.assertIn('Exported 3 matches', fake_sublime.statuses[-1])
+        self.assertIn('every rule was matched against the unchanged buffer', fake_sublime.statuses[-1])
+
+    def results_listener(self):
+        """Get the results panel listener."""
+
+        from RegReplace.rr_sequencer import RegReplaceResultsListenerCommand
+        return RegReplaceResultsListenerCommand()
@@ -0,0 +1,41 @@
+"""Test the shared table of compiled rules."""
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestRuleTable(unittest.TestCase):
+    """Test that compiled rules are reused and the table stays bounded."""
+
+    def setUp(self):
+        """Load the module."""
+
+        fake_sublime.install(fuzz_replacer.PACKAGE_PATH)
+        from RegReplace import rr_rules
+        self.rules = rr_rules
+
+    def test_lru(self):
+        """The least recently used entries are dropped."""
+
+        cache = self.rules.LRUCache(3)
+        for key in 'abc':
+            cache[key] = key.upper()
+        self.assertEqual(cache.get('a'), 'A')
+        cache['d'] = 'D'
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual([cache.get(key) for key in 'acd'], ['A', 'C', 'D'])
+
+    def test_bounded(self):
+        """Compiling many patterns keeps only the most recent ones."""
+
+        table = self.rules.RuleTable
+        table.warm({}, False).join()
+        first = table.compile_search('first', 0)
+        self.assertIs(table.compile_search('first', 0), first)
+        for index in range(self.rules.MAX_ENTRIES):
+            pattern = table.compile_search('p%d' % index, 0)
+            table.compile_replace(pattern, 'x')
+        self.assertEqual(len(table.patterns), self.rules.MAX_ENTRIES)
+        self.assertEqual(len(table.templates), self.rules.MAX_ENTRIES)
+        self.assertIsNot(table.compile_search('first', 0), first)
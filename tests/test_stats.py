@@ -0,0 +1,91 @@
+"""Test the timing and counts collected for each rule of a run."""
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestStats(unittest.TestCase):
+    """Test the per rule counts and timings, their totals, and the formatted breakdown."""
+
+    def setUp(self):
+        """Load the stats module."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_stats
+        self.stats = rr_stats
+        self.clock = rr_stats.clock
+
+    def tearDown(self):
+        """Restore the clock."""
+
+        self.stats.clock = self.clock
+        self.stats.ViewStats.views.clear()
+
+    def test_counts(self):
+        """A search records the matches and replacements of each rule in each sweep."""
+
+        from RegReplace.rr_replacer import FindReplace
+        view = fake_sublime.View('a  \nb \nc\n')
+        replacer = FindReplace(view, None, False, True, False, 2, None, {})
+        replacer.search({'find': '[ ]+$', 'replace': ''}, False, 'trim')
+        replacer.search({'find': '[a-z]', 'replace': 'x', 'greedy': False}, False, 'first', 2)
+        replacer.close()
+        rules = replacer.stats.rules
+        self.assertEqual(
+            [(r.name, r.sweep, r.size, r.matches, r.replaced) for r in rules],
+            [('trim', 1, 9, 2, 2), ('first', 2, 6, 3, 1)]
+        )
+        self.assertEqual(replacer.stats.sweeps(), 2)
+        for rule in rules:
+            self.assertTrue(rule.times['scan'] > 0 and rule.total() >= rule.times['scan'])
+
+    def test_phases(self):
+        """Time in a phase nested in another is only counted once, and the totals add up."""
+
+        now = [0.0]
+        self.stats.clock = lambda: now[0]
+        stats = self.stats.RunStats()
+        stats.add('compile', 1.0)
+        stats.begin('one', 1, 10)
+        stats.add('compile', 0.002)
+        mark = stats.mark()
+        now[0] = 0.010
+        stats.add('plugin', 0.004)
+        stats.add_since('scan', mark)
+        stats.count(3, 2)
+        stats.end()
+        stats.add('write', 1.0)
+        stats.begin('two', 2, 20)
+        stats.add('write', 0.001)
+        stats.end()
+
+        one, two = stats.rules
+        self.assertEqual((one.matches, one.replaced, two.matches), (3, 2, 0))
+        self.assertAlmostEqual(one.times['scan'], 0.006)
+        self.assertAlmostEqual(one.total(), 0.012)
+        totals = stats.totals()
+        self.assertAlmostEqual(totals['write'], 0.001)
+        self.assertAlmostEqual(totals['total'], 0.013)
+        row = '%-30s %5s %9s %9s %9s %9s %9s %9s %9s %9s'
+        self.assertEqual(
+            stats.format().splitlines(),
+            [
+                row % ('rule', 'sweep', 'compile', 'scan', 'scope', 'plugin', 'write', 'total', 'size', 'matches'),
+                row % ('one', 1, '2.00', '6.00', '0.00', '4.00', '0.00', '12.00', 10, 3),
+                row % ('two', 2, '0.00', '0.00', '0.00', '0.00', '1.00', '1.00', 20, 0),
+                row[:-8] % ('total', 2, '2.00', '6.00', '0.00', '4.00', '1.00', '13.00')
+            ]
+        )
+
+    def test_view_totals(self):
+        """The totals of each run are added up per view until the view is forgotten."""
+
+        stats = self.stats.RunStats()
+        stats.begin('one', 1, 10)
+        stats.add('scan', 0.5)
+        self.stats.ViewStats.record(1, stats)
+        totals = self.stats.ViewStats.record(1, stats)
+        self.assertEqual((totals['runs'], totals['scan'], totals['total']), (2, 1.0, 1.0))
+        self.assertEqual(self.stats.ViewStats.record(2, stats)['runs'], 1)
+        self.stats.ViewStats.forget(1)
+        self.assertEqual(list(self.stats.ViewStats.views.keys()), [2])
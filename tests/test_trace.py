@@ -0,0 +1,81 @@
+"""Test the trace log of sequence runs."""
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from . import fake_sublime
+from . import fuzz_replacer
+
+
+class TestTraceLog(unittest.TestCase):
+    """Test the JSON lines written, rotation at the size limit, and the flush on unload."""
+
+    def setUp(self):
+        """Load the sequencer and log to a scratch folder."""
+
+        fuzz_replacer.setup()
+        from RegReplace import rr_sequencer, rr_trace
+        self.sequencer = rr_sequencer
+        self.trace = rr_trace
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'logs', 'trace.jsonl')
+        fake_sublime.load_settings('reg_replace.sublime-settings').values = {
+            'replacements': {'trim': {'find': '[ \\t]+$', 'replace': ''}},
+            'trace_log': self.path
+        }
+        rr_sequencer.plugin_loaded()
+        del fake_sublime.timeouts[:]
+
+    def tearDown(self):
+        """Stop logging and remove the scratch folder."""
+
+        self.trace.TraceLog.configure('')
+        del fake_sublime.timeouts[:]
+        shutil.rmtree(self.folder)
+
+    def read(self, path):
+        """Read the records of a log file."""
+
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_run(self):
+        """A run is buffered, then written as one JSON line when the plugin is unloaded."""
+
+        log = self.trace.TraceLog
+        log.last_flush = time.time()
+        view = fake_sublime.View('a \nb\n')
+        view.run_command('reg_replace', {'replacements': ['trim']})
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(len(log.buffer), 1)
+
+        self.sequencer.plugin_unloaded()
+        records = self.read(self.path)
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(
+            (record['trigger'], record['size'], record['sequence'], record['sweeps'], record['max_sweeps_hit']),
+            ('command', 4, ['trim'], 1, False)
+        )
+        self.assertEqual([(r['name'], r['matches'], r['replaced']) for r in record['rules']], [('trim', 1, 1)])
+        self.assertEqual(log.buffer, [])
+
+    def test_rotate(self):
+        """A log past the size limit is rotated before the next batch, keeping the given number of backups."""
+
+        log = self.trace.TraceLog
+        log.configure(self.path, 200, 2)
+        for batch in range(5):
+            for index in range(self.trace.FLUSH_LINES):
+                log.last_flush = time.time()
+                log.write({'batch': batch, 'index': index})
+            # A full batch is written without waiting for the flush interval
+            self.assertEqual(log.buffer, [])
+
+        files = sorted(os.listdir(os.path.dirname(self.path)))
+        self.assertEqual(files, ['trace.jsonl', 'trace.jsonl.1', 'trace.jsonl.2'])
+        for suffix, batch in (('', 4), ('.1', 3), ('.2', 2)):
+            records = self.read(self.path + suffix)
+            self.assertEqual(records, [{'batch': batch, 'index': i} for i in range(self.trace.FLUSH_LINES)])
@@ -0,0 +1,121 @@
+"""Test the trigram index."""
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+from . import fake_sublime
+from . import fuzz_replacer
+from .test_linear import ATOMS, TEXT_PIECES, FLAGS
+
+QUERY_ATOMS = ATOMS + (
+    'abc', 'hello', 'wor(ld|k)', 'x{3}', '(foo|bar)baz', '[ab]cd', 'i', 'İ', 'ß', 'SS', '(?i)abc',
+    '(?i:ki)s', 'a.c', 'abc|de', 'ab+c', 'q(?=rs)rst'
+)
+
+QUERY_TEXT = TEXT_PIECES + (
+    'abc', 'hello', 'world', 'work', 'foo', 'barbaz', 'bcd', 'acd', 'xxx', 'İ', 'ı', 'ß', 'ss', 'SS',
+    'KIS', 'ﬃ', 'rst', 'qrs'
+)
+
+
+class TestTrigram(unittest.TestCase):
+    """Test trigram queries and the index."""
+
+    def setUp(self):
+        """Load the module."""
+
+        fake_sublime.install(fuzz_replacer.PACKAGE_PATH)
+        from RegReplace import rr_trigram
+        self.trigram = rr_trigram
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch folder."""
+
+        shutil.rmtree(self.folder)
+
+    def test_soundness(self):
+        """Text a pattern matches always satisfies the pattern's query."""
+
+        t = self.trigram
+        rand = random.Random(0)
+        narrowed = 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for _ in range(5000):
+                find = ''.join(rand.choice(QUERY_ATOMS) for _ in range(rand.randint(1, 5)))
+                flags = rand.choice(FLAGS) | re.M
+                try:
+                    pattern = re.compile(find, flags)
+                except re.error:
+                    continue
+                query = t.pattern_query(find, flags)
+                if query != t.ALL:
+                    narrowed += 1
+                for _ in range(5):
+                    text = ''.join(rand.choice(QUERY_TEXT) for _ in range(rand.randint(0, 12)))
+                    if pattern.search(text):
+                        self.assertTrue(t.satisfies(query, t.text_grams(t.fold(text))), '%r %r' % (find, text))
+        self.assertTrue(narrowed > 1000)
+
+    def test_queries(self):
+        """Literals, alternations, and repeats give useful queries."""
+
+        t = self.trigram
+        self.assertEqual(t.pattern_query('hello', 0), ('and', ['ell', 'hel', 'llo']))
+        self.assertEqual(t.pattern_query('(?i)ABCD', 0), ('and', ['abc', 'bcd']))
+        self.assertEqual(
+            t.pattern_query('(foo|bar)baz', 0),
+            ('or', [('and', ['arb', 'bar', 'baz', 'rba']), ('and', ['baz', 'foo', 'oba', 'oob'])])
+        )
+        self.assertEqual(t.pattern_query('a+bcd', 0), ('and', ['abc', 'bcd']))
+        self.assertEqual(t.pattern_query('ab.*', 0), t.ALL)
+        self.assertEqual(t.pattern_query('[ \\t]+$', re.M), t.ALL)
+        self.assertEqual(t.rule_query({'find': 'a.b', 'literal': True}), 'a.b')
+
+    def write(self, name, text):
+        """Write a file under the scratch folder."""
+
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(text)
+        return path
+
+    def test_index(self):
+        """Only files that can match are candidates, and the index follows changes to the tree."""
+
+        t = self.trigram
+        root = os.path.join(self.folder, 'tree')
+        todo = self.write('tree/a/todo.py', b'# TODO: later\n')
+        self.write('tree/a/clean.py', b'pass\n')
+        self.write('tree/.git/todo', b'TODO\n')
+        self.write('tree/binary.dat', b'TODO\0')
+
+        def read_text(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            return None if b'\0' in data else data.decode('utf-8')
+
+        index = t.TrigramIndex(os.path.join(self.folder, 'index.db'))
+        query = t.pattern_query('TODO|FIXME', re.M)
+        self.assertEqual(index.update(root, read_text), 3)
+        self.assertEqual(index.candidates(root, [query]), [todo])
+        self.assertEqual(len(index.candidates(root, [t.ALL])), 2)
+        self.assertEqual(index.update(root, read_text), 0)
+
+        fixme = self.write('tree/fixme.txt', b'fixme\n')
+        os.remove(todo)
+        self.assertEqual(index.update(root, read_text), 1)
+        self.assertEqual(index.candidates(root, [query]), [fixme])
+        # Modification times can be coarse; a change of size is always seen
+        time.sleep(0.01)
+        self.write('tree/fixme.txt', b'done\n\n')
+        self.assertEqual(index.update(root, read_text), 1)
+        self.assertEqual(index.candidates(root, [query]), [])
+        index.close()